@@ -2,12 +2,17 @@
 
 import time
 import traceback
-from google.oauth2 import service_account
-from googleapiclient.discovery import build
+import random
+import atexit
+import threading
+import sqlite3
+import hashlib
+from collections import namedtuple
 import os
 from dotenv import load_dotenv
 import json
 # import pandas as pd # 如果你计划用 pandas 处理数据，可以取消注释
+# google.oauth2 / googleapiclient 在第一次创建服务时才导入 (见 get_sheets_service)，导入本模块不再加载它们
 
 load_dotenv() # 从项目根目录的 .env 文件加载环境变量
 
@@ -28,10 +33,79 @@ except json.JSONDecodeError as e: # 注意：这里应该是 json.JSONDecodeErro
 DEFAULT_SERVICE_ACCOUNT_FILE = os.getenv('GOOGLE_SHEETS_SERVICE_ACCOUNT_FILENAME', 'your_service_account_key.json') # Fallback
 # 从 config.json 获取 scopes
 DEFAULT_SCOPES = config_data.get('GoogleSheets', {}).get('default_scopes', ['https://www.googleapis.com/auth/spreadsheets'])
+# 可选: 本地的 Sheets v4 discovery 文档 (JSON)；未配置时使用 google-api-python-client 自带的静态文档
+SHEETS_DISCOVERY_DOCUMENT_PATH = config_data.get('GoogleSheets', {}).get('discovery_document_path')
+DEFAULT_DRIVE_SCOPES = config_data.get('GoogleSheets', {}).get('drive_scopes', ['https://www.googleapis.com/auth/drive.metadata.readonly'])
+_mirror_config = config_data.get('GoogleSheets', {}).get('mirror', {})
+DEFAULT_MIRROR_DB_PATH = _mirror_config.get('db_path', 'sheet_mirror.sqlite3')
+DEFAULT_MIRROR_MAX_AGE_SECONDS = _mirror_config.get('max_age_seconds', 0)
+DEFAULT_READ_CHUNK_ROWS = config_data.get('GoogleSheets', {}).get('read_chunk_rows', 1000)
+_append_buffer_config = config_data.get('GoogleSheets', {}).get('append_buffer', {})
+DEFAULT_APPEND_BUFFER_MAX_ROWS = _append_buffer_config.get('max_rows', 500)
+DEFAULT_APPEND_BUFFER_MAX_DELAY_SECONDS = _append_buffer_config.get('max_delay_seconds', 2.0)
+DEFAULT_APPEND_BUFFER_BACKOFF_BASE_SECONDS = _append_buffer_config.get('backoff_base_seconds', 2.0)
+DEFAULT_APPEND_BUFFER_BACKOFF_MAX_SECONDS = _append_buffer_config.get('backoff_max_seconds', 60.0)
+DEFAULT_APPEND_BUFFER_MAX_ATTEMPTS = _append_buffer_config.get('max_attempts', 8)
 
-def get_sheets_service(service_account_file_path=None, scopes_list=None):
+# --- 服务对象缓存 ---
+# 凭证和解析后的 discovery 文档按 (API, 服务账户文件, scopes) 在进程内只加载一次；
+# 服务对象底层的 httplib2.Http 不是线程安全的，因此每个线程各自从缓存的文档构建一次服务对象。
+_sheets_service_cache = {} # (api, version, sa_file_path, scopes) -> (credentials, discovery_document)
+_sheets_service_cache_lock = threading.Lock()
+_thread_services = threading.local()
+
+
+def _load_discovery_document(api='sheets', version='v4'):
+    """返回解析后的 discovery 文档；没有可用的静态文档时返回 None。"""
+    if api == 'sheets' and SHEETS_DISCOVERY_DOCUMENT_PATH:
+        with open(SHEETS_DISCOVERY_DOCUMENT_PATH, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    try:
+        from googleapiclient.discovery_cache import get_static_doc
+    except ImportError: # google-api-python-client < 2.0 没有自带静态文档
+        return None
+    document = get_static_doc(api, version)
+    return json.loads(document) if document else None
+
+
+def _get_credentials_and_document(sa_file_path, scopes, api='sheets', version='v4'):
+    key = (api, version, os.path.abspath(sa_file_path), tuple(scopes))
+    cached = _sheets_service_cache.get(key)
+    if cached is None:
+        with _sheets_service_cache_lock:
+            cached = _sheets_service_cache.get(key)
+            if cached is None:
+                from google.oauth2 import service_account
+                creds = service_account.Credentials.from_service_account_file(sa_file_path, scopes=scopes)
+                cached = (creds, _load_discovery_document(api, version))
+                _sheets_service_cache[key] = cached
+                print(f"INFO: Google {api.capitalize()} service initialized successfully using '{sa_file_path}'.")
+    return key, cached
+
+
+def _get_thread_service(sa_file_path, scopes, api='sheets', version='v4'):
+    """返回当前线程缓存的服务对象，第一次调用时从缓存的凭证和 discovery 文档构建。"""
+    key, (creds, document) = _get_credentials_and_document(sa_file_path, scopes, api, version)
+    services = getattr(_thread_services, 'services', None)
+    if services is None:
+        services = _thread_services.services = {}
+    service_creds, service = services.get(key, (None, None))
+    if service is None or service_creds is not creds: # 缓存被清空后凭证对象会变化
+        from googleapiclient.discovery import build, build_from_document
+        if document is not None:
+            service = build_from_document(document, credentials=creds)
+        else:
+            service = build(api, version, credentials=creds, cache_discovery=False)
+        services[key] = (creds, service)
+    return service
+
+
+def get_sheets_service(service_account_file_path=None, scopes_list=None, use_cache=True):
     """
     使用服务账户凭证创建并返回 Google Sheets API 服务对象。
+
+    凭证和 discovery 文档在进程内按 (服务账户文件, scopes) 缓存，每个线程复用自己的服务对象，
+    重复调用几乎没有开销；use_cache=False 时每次都重新加载并构建。
     """
     sa_file_path = service_account_file_path if service_account_file_path is not None else DEFAULT_SERVICE_ACCOUNT_FILE
     scopes = scopes_list if scopes_list is not None else DEFAULT_SCOPES
@@ -43,10 +117,15 @@ def get_sheets_service(service_account_file_path=None, scopes_list=None):
         pass # 当前 DEFAULT_SERVICE_ACCOUNT_FILE 应该就是文件名，期望在同目录
 
     try:
-        creds = service_account.Credentials.from_service_account_file(sa_file_path, scopes=scopes)
-        service = build('sheets', 'v4', credentials=creds)
-        print(f"INFO: Google Sheets service initialized successfully using '{sa_file_path}'.")
-        return service
+        if not use_cache:
+            from google.oauth2 import service_account
+            from googleapiclient.discovery import build
+            creds = service_account.Credentials.from_service_account_file(sa_file_path, scopes=scopes)
+            service = build('sheets', 'v4', credentials=creds, cache_discovery=False)
+            print(f"INFO: Google Sheets service initialized successfully using '{sa_file_path}'.")
+            return service
+
+        return _get_thread_service(sa_file_path, scopes)
     except FileNotFoundError:
         print(f"ERROR: Service account file not found at '{sa_file_path}'.")
         print("       Please ensure the GOOGLE_SHEETS_SERVICE_ACCOUNT_FILENAME in .env is correct and the file exists, or provide a full path.")
@@ -56,6 +135,30 @@ def get_sheets_service(service_account_file_path=None, scopes_list=None):
         traceback.print_exc()
         return None
 
+
+def get_drive_service(service_account_file_path=None, scopes_list=None):
+    """
+    返回 Google Drive v3 服务对象 (与 get_sheets_service 相同的缓存方式)，用于读取表格文件的版本等元数据。
+    服务账户需要 drive.metadata.readonly 权限，默认 scopes 为 config.json 中的 GoogleSheets.drive_scopes。
+    """
+    sa_file_path = service_account_file_path if service_account_file_path is not None else DEFAULT_SERVICE_ACCOUNT_FILE
+    scopes = scopes_list if scopes_list is not None else DEFAULT_DRIVE_SCOPES
+    try:
+        return _get_thread_service(sa_file_path, scopes, 'drive', 'v3')
+    except FileNotFoundError:
+        print(f"ERROR: Service account file not found at '{sa_file_path}'.")
+        return None
+    except Exception as e:
+        print(f"ERROR: Could not initialize Google Drive service: {e}")
+        traceback.print_exc()
+        return None
+
+
+def clear_sheets_service_cache():
+    """清空缓存的凭证和 discovery 文档 (例如替换了服务账户文件之后)。各线程已有的服务对象会在下次调用时重建。"""
+    with _sheets_service_cache_lock:
+        _sheets_service_cache.clear()
+
 def read_sheet_data(spreadsheet_id, range_name, service_obj=None):
     """
     从 Google Sheet 的指定范围读取数据。
@@ -89,9 +192,478 @@ def read_sheet_data(spreadsheet_id, range_name, service_obj=None):
         traceback.print_exc()
         return None
 
+def _quote_sheet_name(sheet_name):
+    """工作表名包含空格或特殊字符时按 A1 表示法加单引号。"""
+    if sheet_name.replace('_', '').isalnum():
+        return sheet_name
+    return "'" + sheet_name.replace("'", "''") + "'"
+
+
+def _column_letter(index):
+    """把从 1 开始的列号转换为 A1 列字母 (1 -> 'A', 27 -> 'AA', 703 -> 'AAA')。"""
+    letters = ''
+    while index > 0:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+
+def _column_index(letters):
+    """把 A1 列字母转换为从 1 开始的列号。"""
+    index = 0
+    for ch in letters.upper():
+        index = index * 26 + ord(ch) - ord('A') + 1
+    return index
+
+
+def _parse_start_cell(start_cell_range):
+    """把 'Sheet1!C5' 解析为 ('Sheet1', 3, 5)；没有单元格部分时从 A1 开始。"""
+    sheet_part, _, cell = start_cell_range.rpartition('!')
+    if not sheet_part:
+        sheet_part, cell = cell, ''
+    if len(sheet_part) >= 2 and sheet_part[0] == sheet_part[-1] == "'":
+        sheet_part = sheet_part[1:-1].replace("''", "'")
+    cell = cell.split(':', 1)[0]
+    column = ''.join(ch for ch in cell if ch.isalpha())
+    row = ''.join(ch for ch in cell if ch.isdigit())
+    return sheet_part, _column_index(column) if column else 1, int(row) if row else 1
+
+
+def make_record_type(headers, type_name='SheetRecord'):
+    """
+    根据表头创建紧凑的记录类型 (namedtuple)。非法或重复的表头会被重命名为 _0, _1 等。
+
+    Returns:
+        type: namedtuple 类型，字段顺序与表头一致。
+    """
+    return namedtuple(type_name, [str(h).strip() for h in headers], rename=True)
+
+
+def rows_to_records(rows, headers=None, record_type=None):
+    """
+    把行数据转换为记录对象列表。headers 为 None 时使用 rows 的第一行作为表头。
+    行会按表头长度补齐空字符串或截断。
+
+    Returns:
+        list: 记录对象 (namedtuple) 列表。
+    """
+    rows = list(rows)
+    if headers is None and record_type is None:
+        if not rows:
+            return []
+        headers, rows = rows[0], rows[1:]
+    record_type = record_type or make_record_type(headers)
+    return [_make_record(record_type, row) for row in rows]
+
+
+def _make_record(record_type, row):
+    width = len(record_type._fields)
+    return record_type._make((list(row) + [''] * width)[:width])
+
+
+def read_sheet_ranges(spreadsheet_id, ranges, service_obj=None, records=False, value_render_option='FORMATTED_VALUE'):
+    """
+    用一次 values().batchGet 请求读取同一表格中的多个范围。
+
+    Args:
+        spreadsheet_id (str): Google Sheet 的 ID。
+        ranges (list of str): 要读取的范围，例如 ['Sheet1!A1:C10', 'Config!B2:B5']。
+        service_obj (Resource, optional): 已初始化的 Google Sheets 服务对象。
+        records (bool, optional): 为 True 时把每个范围的第一行作为表头，返回记录对象 (namedtuple) 列表。
+        value_render_option (str, optional): 'FORMATTED_VALUE', 'UNFORMATTED_VALUE' 或 'FORMULA'。
+
+    Returns:
+        dict or None: 请求的范围字符串 -> 表格数据 (list of lists，或 records=True 时的记录列表)，
+                      顺序与 ranges 一致；如果读取失败则返回 None。
+    """
+    ranges = list(ranges)
+    if not ranges:
+        return {}
+    if not service_obj:
+        service_obj = get_sheets_service()
+        if not service_obj:
+            return None
+    try:
+        result = service_obj.spreadsheets().values().batchGet(
+            spreadsheetId=spreadsheet_id, ranges=ranges, valueRenderOption=value_render_option).execute()
+        value_ranges = result.get('valueRanges', [])
+        data = {}
+        # 响应中的 range 是规范化后的写法，按请求顺序对应
+        for i, range_name in enumerate(ranges):
+            values = value_ranges[i].get('values', []) if i < len(value_ranges) else []
+            data[range_name] = rows_to_records(values) if records else values
+        print(f"INFO: Successfully read {len(ranges)} ranges from Google Sheet ID '{spreadsheet_id}' in one request.")
+        return data
+    except Exception as e:
+        print(f"ERROR: Could not batch read ranges {ranges} from Google Sheet ID '{spreadsheet_id}': {e}")
+        traceback.print_exc()
+        return None
+
+
+def _get_sheet_properties(service_obj, spreadsheet_id, sheet_name):
+    """读取工作表的 properties (sheetId, title, gridProperties)；找不到工作表时返回 None。"""
+    result = service_obj.spreadsheets().get(
+        spreadsheetId=spreadsheet_id,
+        fields='sheets(properties(sheetId,title,gridProperties(rowCount,columnCount)))').execute()
+    for sheet in result.get('sheets', []):
+        properties = sheet.get('properties', {})
+        if properties.get('title') == sheet_name:
+            return properties
+    return None
+
+
+def iter_sheet_rows(spreadsheet_id, sheet_name, chunk_size=DEFAULT_READ_CHUNK_ROWS, start_row=1, columns=None,
+                    service_obj=None, records=False, skip_empty=True):
+    """
+    按固定行数分块读取大工作表，流式返回行，内存占用只与 chunk_size 有关。
+
+    先用一次 spreadsheets.get 读取工作表的行数作为上界，再每次读取 chunk_size 行。
+
+    Args:
+        spreadsheet_id (str): Google Sheet 的 ID。
+        sheet_name (str): 工作表名称。
+        chunk_size (int, optional): 每次请求读取的行数。
+        start_row (int, optional): 起始行号 (从 1 开始)；records=True 时该行为表头。
+        columns (str, optional): 列范围，例如 'A:F'；为 None 时读取整行。
+        service_obj (Resource, optional): 已初始化的 Google Sheets 服务对象。
+        records (bool, optional): 为 True 时把第一行作为表头，返回记录对象 (namedtuple)。
+        skip_empty (bool, optional): 是否跳过空行。
+
+    Yields:
+        list or namedtuple: 每一行的数据。读取失败时打印错误并停止。
+    """
+    if not service_obj:
+        service_obj = get_sheets_service()
+        if not service_obj:
+            return
+    quoted = _quote_sheet_name(sheet_name)
+    first_column, last_column = columns.split(':', 1) if columns else ('', '')
+    record_type = None
+    try:
+        properties = _get_sheet_properties(service_obj, spreadsheet_id, sheet_name)
+        if properties is None:
+            print(f"ERROR: Sheet '{sheet_name}' not found in Google Sheet ID '{spreadsheet_id}'.")
+            return
+        row_count = properties.get('gridProperties', {}).get('rowCount', 0)
+        values_api = service_obj.spreadsheets().values()
+        for chunk_start in range(start_row, row_count + 1, chunk_size):
+            chunk_end = min(chunk_start + chunk_size - 1, row_count)
+            range_name = f"{quoted}!{first_column}{chunk_start}:{last_column}{chunk_end}"
+            values = values_api.get(spreadsheetId=spreadsheet_id, range=range_name).execute().get('values', [])
+            for row in values:
+                if records and record_type is None:
+                    record_type = make_record_type(row)
+                    continue
+                if skip_empty and not any(str(cell).strip() for cell in row):
+                    continue
+                yield _make_record(record_type, row) if records else row
+    except Exception as e:
+        print(f"ERROR: Could not read rows from Google Sheet ID '{spreadsheet_id}', Sheet '{sheet_name}': {e}")
+        traceback.print_exc()
+
+
+class SheetMirror:
+    """
+    选定表格范围的本地 SQLite 镜像，增量同步。
+
+    每次 sync/read 先用一次 Drive files.get 读取表格文件的 version (任何修改都会使其递增)，
+    与本地记录的版本相同时直接读本地数据，不读取表格内容；版本变化时用一次 batchGet 重新读取这些范围，
+    按行哈希比较，只更新变化的行。max_age_seconds 内刚同步过的范围连版本检查也跳过。
+    读取 Drive 元数据失败时 (例如服务账户缺少 drive.metadata.readonly 权限) 退化为每次读取内容并按行哈希更新。
+
+    Args:
+        db_path (str, optional): SQLite 文件路径。
+        service_obj (Resource, optional): Google Sheets 服务对象，默认使用 get_sheets_service()。
+        drive_service (Resource, optional): Google Drive v3 服务对象，默认使用 get_drive_service()。
+        max_age_seconds (float, optional): 在此时间内同步过的范围直接使用本地数据。
+        value_render_option (str, optional): 读取内容时的 valueRenderOption。镜像要作为
+                                             write_sheet_data(diff=True) 的 current_data 时应使用 'FORMULA'。
+                                             以其他模式同步过的范围视为过期。
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS mirrored_ranges (
+            spreadsheet_id TEXT NOT NULL,
+            range_name TEXT NOT NULL,
+            version TEXT,
+            modified_time TEXT,
+            synced_at REAL NOT NULL,
+            row_count INTEGER NOT NULL,
+            render_option TEXT,
+            PRIMARY KEY (spreadsheet_id, range_name)
+        );
+        CREATE TABLE IF NOT EXISTS mirrored_rows (
+            spreadsheet_id TEXT NOT NULL,
+            range_name TEXT NOT NULL,
+            row_index INTEGER NOT NULL,
+            row_hash TEXT NOT NULL,
+            row_json TEXT NOT NULL,
+            PRIMARY KEY (spreadsheet_id, range_name, row_index)
+        );
+    """
+
+    def __init__(self, db_path=DEFAULT_MIRROR_DB_PATH, service_obj=None, drive_service=None,
+                 max_age_seconds=DEFAULT_MIRROR_MAX_AGE_SECONDS, value_render_option='FORMATTED_VALUE'):
+        self.db_path = db_path
+        self.service_obj = service_obj
+        self.drive_service = drive_service
+        self.max_age_seconds = max_age_seconds
+        self.value_render_option = value_render_option
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(self._SCHEMA)
+            columns = [row[1] for row in self._conn.execute('PRAGMA table_info(mirrored_ranges)')]
+            if 'render_option' not in columns:
+                # 旧版本创建的镜像没有这一列，旧数据的渲染模式未知，按过期处理
+                self._conn.execute('ALTER TABLE mirrored_ranges ADD COLUMN render_option TEXT')
+        self._stats = {'syncs': 0, 'local_hits': 0, 'version_checks': 0, 'fetched_ranges': 0,
+                       'changed_rows': 0, 'deleted_rows': 0, 'failed_syncs': 0, 'stale_reads': 0}
+
+    def _count(self, **deltas):
+        with self._lock:
+            for name, delta in deltas.items():
+                self._stats[name] += delta
+
+    def _get_remote_version(self, spreadsheet_id):
+        """返回 (version, modifiedTime)；无法读取时返回 None。"""
+        if self.drive_service is None:
+            self.drive_service = get_drive_service()
+            if self.drive_service is None:
+                return None
+        try:
+            meta = self.drive_service.files().get(
+                fileId=spreadsheet_id, fields='version,modifiedTime', supportsAllDrives=True).execute()
+            self._count(version_checks=1)
+            return meta.get('version'), meta.get('modifiedTime')
+        except Exception as e:
+            print(f"WARNING: Could not read Drive metadata for Google Sheet ID '{spreadsheet_id}': {e}. "
+                  f"Falling back to row hashing.")
+            return None
+
+    def _local_state(self, spreadsheet_id, range_name):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT version, synced_at, render_option FROM mirrored_ranges '
+                'WHERE spreadsheet_id = ? AND range_name = ?',
+                (spreadsheet_id, range_name)).fetchone()
+        if row is None or row[2] != self.value_render_option:
+            return None
+        return {'version': row[0], 'synced_at': row[1]}
+
+    def _store(self, spreadsheet_id, range_name, values, version, modified_time):
+        """按行哈希写入变化的行，删除多出的旧行；返回变化的行号列表和删除的行数。"""
+        changed = []
+        with self._lock, self._conn:
+            existing = dict(self._conn.execute(
+                'SELECT row_index, row_hash FROM mirrored_rows WHERE spreadsheet_id = ? AND range_name = ?',
+                (spreadsheet_id, range_name)))
+            updates = []
+            for index, row in enumerate(values):
+                row_json = json.dumps(row, ensure_ascii=False, separators=(',', ':'))
+                row_hash = hashlib.sha1(row_json.encode('utf-8')).hexdigest()
+                if existing.get(index) != row_hash:
+                    changed.append(index)
+                    updates.append((spreadsheet_id, range_name, index, row_hash, row_json))
+            self._conn.executemany('INSERT OR REPLACE INTO mirrored_rows VALUES (?, ?, ?, ?, ?)', updates)
+            deleted = self._conn.execute(
+                'DELETE FROM mirrored_rows WHERE spreadsheet_id = ? AND range_name = ? AND row_index >= ?',
+                (spreadsheet_id, range_name, len(values))).rowcount
+            self._conn.execute(
+                'INSERT OR REPLACE INTO mirrored_ranges '
+                '(spreadsheet_id, range_name, version, modified_time, synced_at, row_count, render_option) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (spreadsheet_id, range_name, version, modified_time, time.time(), len(values),
+                 self.value_render_option))
+        return changed, deleted
+
+    def _touch(self, spreadsheet_id, range_names):
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'UPDATE mirrored_ranges SET synced_at = ? WHERE spreadsheet_id = ? AND range_name = ?',
+                [(time.time(), spreadsheet_id, range_name) for range_name in range_names])
+
+    def sync(self, spreadsheet_id, ranges, force=False):
+        """
+        同步若干范围到本地。
+
+        Args:
+            spreadsheet_id (str): Google Sheet 的 ID。
+            ranges (list of str): 要镜像的范围，例如 ['Accounts!A1:F'].
+            force (bool, optional): 为 True 时忽略版本和 max_age_seconds，重新读取内容。
+
+        Returns:
+            dict or None: 范围 -> {'fetched' (bool), 'changed_rows' (变化的行号列表), 'deleted_rows' (int)}；
+                          读取表格内容失败时返回 None (本地已有的数据保持不变)。
+        """
+        ranges = list(dict.fromkeys(ranges))
+        self._count(syncs=1)
+        report = {range_name: {'fetched': False, 'changed_rows': [], 'deleted_rows': 0} for range_name in ranges}
+        states = {range_name: self._local_state(spreadsheet_id, range_name) for range_name in ranges}
+        now = time.time()
+        if not force and all(state and now - state['synced_at'] < self.max_age_seconds for state in states.values()):
+            self._count(local_hits=1)
+            return report
+
+        remote = None if force else self._get_remote_version(spreadsheet_id)
+        version, modified_time = remote if remote else (None, None)
+        stale = [range_name for range_name in ranges
+                 if force or remote is None or states[range_name] is None or states[range_name]['version'] != version]
+        fresh = [range_name for range_name in ranges if range_name not in stale]
+        if fresh:
+            self._touch(spreadsheet_id, fresh)
+        if not stale:
+            self._count(local_hits=1)
+            return report
+
+        if self.service_obj is None:
+            self.service_obj = get_sheets_service()
+        data = read_sheet_ranges(spreadsheet_id, stale, service_obj=self.service_obj,
+                                 value_render_option=self.value_render_option)
+        if data is None:
+            self._count(failed_syncs=1)
+            return None
+        self._count(fetched_ranges=len(stale))
+        for range_name in stale:
+            changed, deleted = self._store(spreadsheet_id, range_name, data[range_name], version, modified_time)
+            report[range_name] = {'fetched': True, 'changed_rows': changed, 'deleted_rows': deleted}
+            self._count(changed_rows=len(changed), deleted_rows=deleted)
+        print(f"INFO: Mirrored {len(stale)} ranges of Google Sheet ID '{spreadsheet_id}' "
+              f"({sum(len(report[r]['changed_rows']) for r in stale)} rows changed).")
+        return report
+
+    def read(self, spreadsheet_id, range_name, sync=True, records=False, allow_stale=True):
+        """
+        从本地镜像读取范围数据 (默认先调用 sync)。
+
+        sync 失败时打印 WARNING 并计入 stats()['stale_reads']；allow_stale=True 时返回本地已有的 (可能过期的) 数据，
+        为 False 时返回 None。
+
+        Returns:
+            list of lists or None: 表格数据 (records=True 时为记录对象列表)；范围从未以当前 value_render_option 同步成功过时返回 None。
+        """
+        if sync and self.sync(spreadsheet_id, [range_name]) is None:
+            state = self._local_state(spreadsheet_id, range_name)
+            if state is None:
+                return None
+            self._count(stale_reads=1)
+            age = time.time() - state['synced_at']
+            print(f"WARNING: Sync of range '{range_name}' in Google Sheet ID '{spreadsheet_id}' failed; "
+                  f"local mirror is {age:.0f}s old{'' if allow_stale else ', not returning it'}.")
+            if not allow_stale:
+                return None
+        with self._lock:
+            synced = self._conn.execute(
+                'SELECT 1 FROM mirrored_ranges WHERE spreadsheet_id = ? AND range_name = ? AND render_option = ?',
+                (spreadsheet_id, range_name, self.value_render_option)).fetchone()
+            if synced is None:
+                return None
+            rows = [json.loads(row_json) for (row_json,) in self._conn.execute(
+                'SELECT row_json FROM mirrored_rows WHERE spreadsheet_id = ? AND range_name = ? ORDER BY row_index',
+                (spreadsheet_id, range_name))]
+        return rows_to_records(rows) if records else rows
+
+    def stats(self):
+        """
+        返回同步统计: {'syncs', 'local_hits', 'version_checks', 'fetched_ranges', 'changed_rows', 'deleted_rows',
+        'failed_syncs', 'stale_reads'}。
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+def _normalize_cell(value):
+    """用于比较新旧单元格的规范化字符串 (None 视为空，整数值的浮点数按整数比较)。"""
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return 'TRUE' if value else 'FALSE'
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def _diff_write_sheet_data(data_to_write, spreadsheet_id, start_cell_range, service_obj, value_input_option,
+                           current_data=None):
+    """
+    write_sheet_data(diff=True) 的实现: 与当前内容比较，把每段连续变化的单元格和需要清除的旧单元格
+    作为各自的 range 放进一次 values.batchUpdate，值的解析 (公式、数字、日期、百分比等) 交给 valueInputOption。
+    """
+    sheet_name, start_col, start_row = _parse_start_cell(start_cell_range)
+    quoted_name = _quote_sheet_name(sheet_name)
+
+    if current_data is None:
+        # 读取整张表 (API 只返回有数据的区域)，FORMULA 模式下公式单元格返回公式本身，便于和新数据比较
+        values = service_obj.spreadsheets().values().get(
+            spreadsheetId=spreadsheet_id, range=quoted_name,
+            valueRenderOption='FORMULA').execute().get('values', [])
+        current_data = [row[start_col - 1:] for row in values[start_row - 1:]]
+
+    def a1_range(row_offset, col_offset, height, width):
+        first_col = start_col + col_offset
+        first_row = start_row + row_offset
+        return (f"{quoted_name}!{_column_letter(first_col)}{first_row}:"
+                f"{_column_letter(first_col + width - 1)}{first_row + height - 1}")
+
+    data = []
+    updated_cells = cleared_cells = 0
+    for r, new_row in enumerate(data_to_write):
+        old_row = current_data[r] if r < len(current_data) else []
+        width = max(len(new_row), len(old_row))
+        run_start, run_values = None, []
+        # 末尾多迭代一列作为哨兵，用来结束最后一段连续变化
+        for c in range(width + 1):
+            new_value = new_row[c] if c < len(new_row) else None
+            old_value = old_row[c] if c < len(old_row) else None
+            if c < width and _normalize_cell(new_value) != _normalize_cell(old_value):
+                if run_start is None:
+                    run_start = c
+                # 空字符串会清空该单元格
+                run_values.append('' if new_value is None else new_value)
+                if _normalize_cell(new_value):
+                    updated_cells += 1
+                else:
+                    cleared_cells += 1
+            elif run_start is not None:
+                # 连续变化的单元格合并为一个 range
+                data.append({'range': a1_range(r, run_start, 1, len(run_values)), 'values': [run_values]})
+                run_start, run_values = None, []
+
+    trailing_rows = current_data[len(data_to_write):]
+    trailing_width = max((len(row) for row in trailing_rows if any(_normalize_cell(v) for v in row)), default=0)
+    if trailing_width:
+        # 用空字符串覆盖新数据下方残留的旧行，和其余 range 一起提交
+        data.append({'range': a1_range(len(data_to_write), 0, len(trailing_rows), trailing_width),
+                     'values': [[''] * trailing_width for _ in trailing_rows]})
+        cleared_cells += sum(1 for row in trailing_rows for v in row if _normalize_cell(v))
+
+    if not data:
+        print(f"INFO: No changes to write to Google Sheet ID '{spreadsheet_id}' at '{start_cell_range}'.")
+        return {'spreadsheetId': spreadsheet_id, 'updatedCells': 0, 'clearedCells': 0, 'responses': []}
+    result = service_obj.spreadsheets().values().batchUpdate(
+        spreadsheetId=spreadsheet_id,
+        body={'valueInputOption': value_input_option, 'data': data}).execute()
+    result['updatedCells'] = updated_cells
+    result['clearedCells'] = cleared_cells
+    print(f"INFO: Diff-wrote {updated_cells} cells and cleared {cleared_cells} cells in Google Sheet ID "
+          f"'{spreadsheet_id}' starting at '{start_cell_range}' ({len(data)} ranges in one values.batchUpdate).")
+    return result
+
+
 def write_sheet_data(data_to_write, spreadsheet_id, start_cell_range, service_obj=None,
                        value_input_option='USER_ENTERED', clear_before_write=False,
-                       sheet_name_for_clearing=None):
+                       sheet_name_for_clearing=None, diff=False, current_data=None):
     """
     将数据写入 Google Sheet 的指定起始单元格。
 
@@ -103,6 +675,12 @@ def write_sheet_data(data_to_write, spreadsheet_id, start_cell_range, service_ob
         value_input_option (str, optional): 'USER_ENTERED' 或 'RAW'.
         clear_before_write (bool, optional): 是否在写入前清除目标范围。
         sheet_name_for_clearing (str, optional): 如果 clear_before_write 为 True，则需提供工作表名。
+        diff (bool, optional): 为 True 时与当前内容比较，只写入变化的单元格，并精确清除新数据下方和右侧残留的旧值，
+                               全部放在一次 values.batchUpdate 中 (此时忽略 clear_before_write)。
+        current_data (list of lists, optional): diff 模式下作为"当前内容"的数据 (从 start_cell_range 开始)，
+                                                必须是 FORMULA 渲染的值，例如
+                                                SheetMirror(value_render_option='FORMULA').read() 的结果；
+                                                为 None 时以 FORMULA 模式读取工作表。
 
     Returns:
         dict or None: API 响应，如果成功，通常包含更新的单元格数量等信息。
@@ -125,6 +703,9 @@ def write_sheet_data(data_to_write, spreadsheet_id, start_cell_range, service_ob
     body = {'values': processed_data}
 
     try:
+        if diff:
+            return _diff_write_sheet_data(processed_data, spreadsheet_id, start_cell_range, service_obj,
+                                          value_input_option, current_data)
         sheet_api = service_obj.spreadsheets()
         if clear_before_write:
             if not sheet_name_for_clearing:
@@ -145,17 +726,12 @@ def write_sheet_data(data_to_write, spreadsheet_id, start_cell_range, service_ob
 
             # 估算清除范围
             num_rows_to_clear = max(1000, len(data_to_write) + 200) # 清除足够多的行，至少1000行
-            num_cols_to_write = 0
-            if data_to_write and data_to_write[0]:
-                num_cols_to_write = len(data_to_write[0])
-            
-            end_col_letter = 'Z' # 默认清除到 Z 列
-            if 0 < num_cols_to_write <= 26:
-                end_col_letter = chr(ord('A') + num_cols_to_write - 1)
-            elif num_cols_to_write > 26:
-                # 对于超过26列的简单处理，可以固定一个更大的列，例如 'AZ'
-                # 精确计算会更复杂，这里为了通用性，使用 'ZZ' 作为较大范围的上限
-                end_col_letter = 'ZZ' 
+            num_cols_to_write = max((len(row) for row in data_to_write), default=0)
+            _, start_col, _ = _parse_start_cell(start_cell_range)
+
+            end_col_letter = 'Z' # 没有数据时默认清除到 Z 列
+            if num_cols_to_write > 0:
+                end_col_letter = _column_letter(start_col + num_cols_to_write - 1)
             
             range_to_clear_str = f"{sheet_name_for_clearing}!{actual_start_cell_for_clear}:{end_col_letter}{num_rows_to_clear}"
             print(f"INFO: Clearing range '{range_to_clear_str}' before writing...")
@@ -235,6 +811,280 @@ def append_rows_to_sheet(data_to_append, spreadsheet_id, sheet_name, service_obj
         traceback.print_exc()
         return None
 
+
+def _http_error_status(error):
+    """返回 googleapiclient HttpError 的 HTTP 状态码；其他异常返回 None。"""
+    status = getattr(error, 'status_code', None)
+    if status is None:
+        status = getattr(getattr(error, 'resp', None), 'status', None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_retryable_status(status):
+    """408/429 和 5xx 可以重试；其他 4xx (例如 400 数据或范围错误、403 无权限、404 表格不存在) 重试也不会成功。"""
+    return status is None or status in (408, 429) or status >= 500
+
+
+class SheetAppendBuffer:
+    """
+    合并追加写入的后台缓冲区。
+
+    add() 只把行放进按 (spreadsheet_id, sheet_name) 分组的队列并立即返回；后台线程在某个队列达到 max_rows 行
+    或最早的一行等待超过 max_delay 秒时，把整组行用一次 append_rows_to_sheet (values.append) 发出。
+    写入失败 (如 429 配额错误) 时行会放回队列头部，按指数退避稍后重试；同一组行连续失败 max_attempts 次，
+    或返回不可重试的 4xx 错误 (如 400) 时，这组行从队列中移除并交给 on_drop。close() 和进程退出时会写出剩余的行。
+
+    Args:
+        service_obj (Resource, optional): Google Sheets 服务对象 (也可以是实现了相同调用链的进程内假对象)。
+                                         如果为 None，则在第一次写入时使用 get_sheets_service() 初始化。
+        max_rows (int, optional): 单个队列达到该行数时立即写出。
+        max_delay (float, optional): 行在队列中的最长等待时间（秒）。
+        value_input_option (str, optional): 'USER_ENTERED' 或 'RAW'.
+        backoff_base (float, optional): 写入失败后的首次重试间隔（秒），之后每次翻倍。
+        backoff_max (float, optional): 重试间隔上限（秒）。
+        max_attempts (int, optional): 同一组行最多尝试写入的次数。
+        on_drop (callable, optional): 被放弃的行的回调 on_drop(spreadsheet_id, sheet_name, rows, error)，
+                                      在后台线程中调用；为 None 时只打印错误并计入 stats()['dropped_rows']。
+    """
+
+    def __init__(self, service_obj=None, max_rows=DEFAULT_APPEND_BUFFER_MAX_ROWS,
+                 max_delay=DEFAULT_APPEND_BUFFER_MAX_DELAY_SECONDS, value_input_option='USER_ENTERED',
+                 backoff_base=DEFAULT_APPEND_BUFFER_BACKOFF_BASE_SECONDS,
+                 backoff_max=DEFAULT_APPEND_BUFFER_BACKOFF_MAX_SECONDS,
+                 max_attempts=DEFAULT_APPEND_BUFFER_MAX_ATTEMPTS, on_drop=None):
+        self.service_obj = service_obj
+        self.max_rows = max(1, int(max_rows))
+        self.max_delay = max_delay
+        self.value_input_option = value_input_option
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_attempts = max(1, int(max_attempts))
+        self.on_drop = on_drop
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._queues = {} # (spreadsheet_id, sheet_name) -> {'rows', 'since', 'retry_at', 'failures'}
+        self._closed = False
+        self._stats = {'added_rows': 0, 'flushes': 0, 'flushed_rows': 0, 'failed_flushes': 0, 'dropped_rows': 0,
+                       'flush_seconds_total': 0.0, 'flush_seconds_max': 0.0, 'last_error': None}
+        self._thread = threading.Thread(target=self._run, name='sheet-append-buffer', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def add(self, spreadsheet_id, sheet_name, rows):
+        """
+        把若干行加入缓冲区。
+
+        Args:
+            spreadsheet_id (str): Google Sheet 的 ID。
+            sheet_name (str): 工作表名称。
+            rows (list of lists): 要追加的数据行。
+
+        Returns:
+            bool: 是否已加入 (缓冲区关闭后或数据格式错误时为 False)。
+        """
+        if not isinstance(rows, list) or (rows and not isinstance(rows[0], list)):
+            print("ERROR: rows must be a list of lists for appending.")
+            return False
+        if not rows:
+            return True
+        with self._cond:
+            if self._closed:
+                print(f"ERROR: SheetAppendBuffer is closed; {len(rows)} rows for sheet '{sheet_name}' were not queued.")
+                return False
+            entry = self._queues.setdefault((spreadsheet_id, sheet_name),
+                                            {'rows': [], 'since': None, 'retry_at': 0.0, 'failures': 0})
+            if not entry['rows']:
+                entry['since'] = time.monotonic()
+            entry['rows'].extend(rows)
+            self._stats['added_rows'] += len(rows)
+            self._cond.notify()
+        return True
+
+    def add_row(self, spreadsheet_id, sheet_name, row):
+        """把一行加入缓冲区。"""
+        return self.add(spreadsheet_id, sheet_name, [row])
+
+    def _due_keys_locked(self, now):
+        due = []
+        next_wake = None
+        for key, entry in self._queues.items():
+            if not entry['rows']:
+                continue
+            ready_at = entry['since'] + self.max_delay
+            if len(entry['rows']) >= self.max_rows:
+                ready_at = now
+            ready_at = max(ready_at, entry['retry_at'])
+            if ready_at <= now:
+                due.append(key)
+            elif next_wake is None or ready_at < next_wake:
+                next_wake = ready_at
+        return due, (None if next_wake is None else next_wake - now)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if self._closed:
+                        return
+                    due, timeout = self._due_keys_locked(time.monotonic())
+                    if due:
+                        break
+                    self._cond.wait(timeout)
+            for key in due:
+                self._flush_key(key)
+
+    def _get_service(self):
+        if self.service_obj is None:
+            self.service_obj = get_sheets_service()
+        return self.service_obj
+
+    def _append(self, key, rows):
+        """执行一次 values.append；失败时抛出异常，由 _flush_key 区分是否可以重试。"""
+        service_obj = self._get_service()
+        if service_obj is None:
+            raise RuntimeError('Google Sheets service is not available')
+        return service_obj.spreadsheets().values().append(
+            spreadsheetId=key[0], range=f"{key[1]}!A1", valueInputOption=self.value_input_option,
+            insertDataOption='INSERT_ROWS',
+            body={'values': [["" if cell is None else cell for cell in row] for row in rows]}).execute()
+
+    def _flush_key(self, key):
+        with self._flush_lock:
+            with self._cond:
+                entry = self._queues.get(key)
+                if not entry or not entry['rows']:
+                    return True
+                rows, since = entry['rows'], entry['since']
+                entry['rows'], entry['since'] = [], None
+            start = time.perf_counter()
+            error = None
+            try:
+                self._append(key, rows)
+            except Exception as e:
+                error = e
+            seconds = time.perf_counter() - start
+            with self._cond:
+                if error is not None:
+                    entry['failures'] += 1
+                    self._stats['failed_flushes'] += 1
+                    status = _http_error_status(error)
+                    if not _is_retryable_status(status) or entry['failures'] >= self.max_attempts:
+                        # 不可重试的错误或重试次数用完: 放弃这组行，避免永远占住队列
+                        entry['failures'], entry['retry_at'] = 0, 0.0
+                        if not entry['rows']:
+                            del self._queues[key]
+                        self._stats['dropped_rows'] += len(rows)
+                        message = (f"append to sheet '{key[1]}' failed ({len(rows)} rows dropped, "
+                                   f"status {status}): {error}")
+                        self._stats['last_error'] = message
+                    else:
+                        entry['rows'][:0] = rows # 放回队列头部，保持行的顺序
+                        entry['since'] = since
+                        delay = min(self.backoff_max, self.backoff_base * (2 ** (entry['failures'] - 1)))
+                        entry['retry_at'] = time.monotonic() + delay * random.uniform(0.5, 1.0)
+                        self._stats['last_error'] = (f"append to sheet '{key[1]}' failed ({len(rows)} rows, "
+                                                     f"status {status}), retry in {delay:.1f}s: {error}")
+                        print(f"WARNING: {self._stats['last_error']}")
+                        return False
+                else:
+                    entry['failures'], entry['retry_at'] = 0, 0.0
+                    if not entry['rows']:
+                        del self._queues[key]
+                    self._stats['flushes'] += 1
+                    self._stats['flushed_rows'] += len(rows)
+                    self._stats['flush_seconds_total'] += seconds
+                    self._stats['flush_seconds_max'] = max(self._stats['flush_seconds_max'], seconds)
+                    self._cond.notify()
+                    return True
+            print(f"ERROR: {message}")
+            if self.on_drop is not None:
+                try:
+                    self.on_drop(key[0], key[1], rows, error)
+                except Exception as e:
+                    print(f"ERROR: SheetAppendBuffer on_drop callback failed: {e}")
+            return False
+
+    def flush(self):
+        """
+        立即写出所有队列 (忽略退避时间)，在调用线程中执行。
+
+        Returns:
+            bool: 所有队列是否都写入成功。
+        """
+        with self._cond:
+            keys = [key for key, entry in self._queues.items() if entry['rows']]
+        return all([self._flush_key(key) for key in keys])
+
+    def close(self):
+        """停止后台线程并写出剩余的行。可以重复调用。"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        atexit.unregister(self.close)
+        if not self.flush():
+            print(f"ERROR: SheetAppendBuffer closed with {self.queue_depth()} rows that could not be appended.")
+
+    def queue_depth(self):
+        """返回缓冲区中尚未写出的总行数。"""
+        with self._cond:
+            return sum(len(entry['rows']) for entry in self._queues.values())
+
+    def stats(self):
+        """
+        返回缓冲区统计。
+
+        Returns:
+            dict: {'queued_rows', 'queues', 'added_rows', 'flushes', 'flushed_rows', 'failed_flushes', 'dropped_rows',
+                   'avg_flush_seconds', 'max_flush_seconds', 'last_error'}，queues 为 (spreadsheet_id, sheet_name) -> 行数。
+        """
+        with self._cond:
+            stats = dict(self._stats)
+            queues = {key: len(entry['rows']) for key, entry in self._queues.items() if entry['rows']}
+        return {
+            'queued_rows': sum(queues.values()),
+            'queues': queues,
+            'added_rows': stats['added_rows'],
+            'flushes': stats['flushes'],
+            'flushed_rows': stats['flushed_rows'],
+            'failed_flushes': stats['failed_flushes'],
+            'dropped_rows': stats['dropped_rows'],
+            'avg_flush_seconds': stats['flush_seconds_total'] / stats['flushes'] if stats['flushes'] else None,
+            'max_flush_seconds': stats['flush_seconds_max'],
+            'last_error': stats['last_error'],
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+_default_append_buffer = None
+_default_append_buffer_lock = threading.Lock()
+
+
+def get_append_buffer(service_obj=None, on_drop=None):
+    """
+    返回进程内共享的 SheetAppendBuffer (第一次调用时创建)，供多个 worker 线程共同使用。
+
+    Args:
+        service_obj (Resource, optional): 创建缓冲区时使用的 Google Sheets 服务对象。
+        on_drop (callable, optional): 创建缓冲区时使用的放弃行回调，见 SheetAppendBuffer。
+    """
+    global _default_append_buffer
+    with _default_append_buffer_lock:
+        if _default_append_buffer is None or _default_append_buffer._closed:
+            _default_append_buffer = SheetAppendBuffer(service_obj=service_obj, on_drop=on_drop)
+        return _default_append_buffer
+
+
 def ensure_sheet_headers(spreadsheet_id, sheet_name, expected_headers, service_obj=None):
     """确保工作表有正确的表头，如果没有或不匹配则写入。"""
     if not service_obj:
@@ -242,7 +1092,7 @@ def ensure_sheet_headers(spreadsheet_id, sheet_name, expected_headers, service_o
         if not service_obj: return False
     
     try:
-        current_headers_raw = read_sheet_data(spreadsheet_id, f"{sheet_name}!A1:{chr(ord('A') + len(expected_headers) - 1)}1", service_obj=service_obj)
+        current_headers_raw = read_sheet_data(spreadsheet_id, f"{sheet_name}!A1:{_column_letter(len(expected_headers))}1", service_obj=service_obj)
         needs_write = True
         if current_headers_raw and current_headers_raw[0]:
             current_headers = [str(h).strip() for h in current_headers_raw[0]]
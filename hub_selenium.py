@@ -6,17 +6,34 @@ import traceback
 import random
 import json as json_lib # 重命名以避免与 config_data 中的 json 混淆
 import decimal
+import codecs
+import hashlib
+import sqlite3
+import mmap
+import struct
 import os
+import asyncio
+import base64
+import atexit
+import threading
+import weakref
+from array import array
+from collections import deque
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
 from dotenv import load_dotenv
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
 from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import Select
 from selenium.webdriver.chrome.service import Service
+from selenium.webdriver.chromium.remote_connection import ChromiumRemoteConnection
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.remote.command import Command
 
+from eth_abi import encode as abi_encode, decode as abi_decode
 from eth_account import Account
 from web3 import Web3
 from web3.exceptions import TransactionNotFound, ContractLogicError, TimeExhausted
@@ -42,15 +59,56 @@ _hubstudio_config = config_data.get('HubStudio', {})
 DEFAULT_EXTENSION_PATH = _hubstudio_config.get('default_extension_path', r'C:\Default\Path\Not\Set\extension.crx')
 DEFAULT_CHROMEDRIVER_PATH = _hubstudio_config.get('default_chromedriver_path', r'C:\Default\Path\Not\Set\chromedriver.exe')
 HUBSTUDIO_BASE_URL = _hubstudio_config.get('base_api_url', "http://127.0.0.1:6873/api/v1")
+DEFAULT_FLEET_MAX_WORKERS = _hubstudio_config.get('fleet_max_workers', 5)
+HUBSTUDIO_CONNECT_TIMEOUT_SECONDS = _hubstudio_config.get('connect_timeout_seconds', 3)
+HUBSTUDIO_READ_TIMEOUT_SECONDS = _hubstudio_config.get('read_timeout_seconds', 30)
+HUBSTUDIO_POOL_MAXSIZE = _hubstudio_config.get('pool_maxsize', 20)
+HUBSTUDIO_ENDPOINT_POLICIES = _hubstudio_config.get('endpoint_policies', {})
+DEFAULT_ENV_CACHE_TTL_SECONDS = _hubstudio_config.get('env_cache_ttl_seconds', 60)
+DEFAULT_ENV_LIST_PAGE_SIZE = _hubstudio_config.get('env_list_page_size', 200)
+DEFAULT_ENV_REFRESH_RETRY_SECONDS = _hubstudio_config.get('env_refresh_retry_seconds', 5)
+DEFAULT_CLOSE_MAX_ATTEMPTS = _hubstudio_config.get('close_max_attempts', 3)
+DEFAULT_CLOSE_BACKOFF_BASE_SECONDS = _hubstudio_config.get('close_backoff_base_seconds', 1)
+DEFAULT_CLOSE_BACKOFF_MAX_SECONDS = _hubstudio_config.get('close_backoff_max_seconds', 10)
+DEFAULT_CLOSE_MAX_WORKERS = _hubstudio_config.get('close_max_workers', 20)
+DEFAULT_CLOSE_STATUS_TIMEOUT_SECONDS = _hubstudio_config.get('close_status_timeout_seconds', 15)
+CLOSE_STATUS_POLL_INITIAL_SECONDS = 0.25
+CLOSE_STATUS_POLL_MAX_SECONDS = 2.0
 
 # EVM
 _evm_config = config_data.get('EVM', {})
 INFURA_PROJECT_ID = os.getenv('INFURA_PROJECT_ID') # 从.env获取
 DEFAULT_EVM_RPC_URL_TEMPLATE = _evm_config.get('default_rpc_url_template', "https://sepolia.infura.io/v3/{INFURA_PROJECT_ID}")
-DEFAULT_EVM_RPC_URL = DEFAULT_EVM_RPC_URL_TEMPLATE.replace("{INFURA_PROJECT_ID}", INFURA_PROJECT_ID) # 动态构建
+DEFAULT_EVM_RPC_URL = DEFAULT_EVM_RPC_URL_TEMPLATE.replace("{INFURA_PROJECT_ID}", INFURA_PROJECT_ID or '') # 动态构建
 print(f"DEBUG (hub_selenium.py): Effective DEFAULT_EVM_RPC_URL = {DEFAULT_EVM_RPC_URL}") # 添加调试打印
+# 多个 RPC 端点 (同样支持 {INFURA_PROJECT_ID} 占位符)；配置了多个时，EVM 函数默认经由 RpcRouter 路由
+DEFAULT_EVM_RPC_URLS = tuple(url.replace("{INFURA_PROJECT_ID}", INFURA_PROJECT_ID or '')
+                             for url in _evm_config.get('rpc_urls', [])) or (DEFAULT_EVM_RPC_URL,)
+DEFAULT_EVM_RPC_TARGET = DEFAULT_EVM_RPC_URLS if len(DEFAULT_EVM_RPC_URLS) > 1 else DEFAULT_EVM_RPC_URLS[0]
 DEFAULT_EVM_CHAIN_ID = _evm_config.get('default_chain_id', 11155111)
 DEFAULT_EVM_REQUEST_TIMEOUT_SECONDS = _evm_config.get('default_request_timeout_seconds', 30)
+EVM_RPC_POOL_MAXSIZE = _evm_config.get('rpc_pool_maxsize', 20)
+DEFAULT_EVM_BATCH_SIZE = _evm_config.get('balance_batch_size', 100)
+DEFAULT_EVM_MAX_CONCURRENCY = _evm_config.get('balance_max_concurrency', 4)
+DEFAULT_EVM_REQUESTS_PER_SECOND = _evm_config.get('balance_requests_per_second', 10)
+MULTICALL3_ADDRESS = _evm_config.get('multicall3_address', '0xcA11bde05977b3631167028862bE2a173976CA11')
+DEFAULT_MULTICALL_GAS_LIMIT = _evm_config.get('multicall_gas_limit', 20000000)
+DEFAULT_MULTICALL_GAS_PER_CALL = _evm_config.get('multicall_gas_per_call', 40000)
+DEFAULT_HD_PATH_TEMPLATE = _evm_config.get('hd_derivation_path_template', "m/44'/60'/0'/0/{index}")
+DEFAULT_WALLET_CHUNK_SIZE = _evm_config.get('wallet_chunk_size', 500)
+DEFAULT_TX_MAX_WORKERS = _evm_config.get('tx_max_workers', 16)
+DEFAULT_TX_NONCE_RETRIES = _evm_config.get('tx_nonce_retries', 3)
+DEFAULT_RECEIPT_POLL_INTERVAL_SECONDS = _evm_config.get('receipt_poll_interval_seconds', 2)
+DEFAULT_RECEIPT_TIMEOUT_SECONDS = _evm_config.get('receipt_timeout_seconds', 180)
+_rpc_router_config = _evm_config.get('rpc_router', {})
+RPC_ROUTER_WINDOW = _rpc_router_config.get('window', 50)
+RPC_ROUTER_HEDGE = _rpc_router_config.get('hedge', False)
+RPC_ROUTER_HEDGE_PERCENTILE = _rpc_router_config.get('hedge_percentile', 90)
+RPC_ROUTER_DEFAULT_HEDGE_DELAY_SECONDS = _rpc_router_config.get('default_hedge_delay_seconds', 0.5)
+RPC_ROUTER_ERROR_RATE_THRESHOLD = _rpc_router_config.get('error_rate_threshold', 0.5)
+RPC_ROUTER_COOLDOWN_SECONDS = _rpc_router_config.get('cooldown_seconds', 30)
+CHAIN_CACHE_HEAD_TTL_SECONDS = _evm_config.get('chain_cache_head_ttl_seconds', 1.0)
+CHAIN_CACHE_BALANCES = _evm_config.get('chain_cache_balances', False)
 
 # External APIs
 _external_apis_config = config_data.get('ExternalAPIs', {})
@@ -59,100 +117,250 @@ GET_CODE_API_URL_DEFAULT = _external_apis_config.get('get_code_api_url_default',
 # File Paths
 _file_paths_config = config_data.get('FilePaths', {})
 DEFAULT_NAMES_FILE = _file_paths_config.get('default_names_file', 'names.txt')
+FALLBACK_ENCODING = _file_paths_config.get('fallback_encoding', 'gb18030') # 非 UTF-8 文件的编码 (gb18030 兼容 gbk)
+ENCODING_SAMPLE_BYTES = _file_paths_config.get('encoding_sample_bytes', 65536)
+
+# Jobs
+_jobs_config = config_data.get('Jobs', {})
+DEFAULT_JOB_DB_PATH = _jobs_config.get('db_path', 'account_jobs.sqlite3')
+DEFAULT_JOB_MAX_ATTEMPTS = _jobs_config.get('max_attempts', 3)
+DEFAULT_JOB_RETRY_DELAY_SECONDS = _jobs_config.get('retry_delay_seconds', 30)
 
 # Selenium
 _selenium_config = config_data.get('Selenium', {})
 DEFAULT_IMPLICIT_WAIT = _selenium_config.get('default_implicit_wait', 10)
 DEFAULT_EXPLICIT_WAIT_TIMEOUT = _selenium_config.get('default_explicit_wait_timeout', 10)
+WAIT_FALLBACK_POLL_MS = _selenium_config.get('wait_fallback_poll_ms', 100)
+SCRIPT_TIMEOUT_MARGIN_SECONDS = _selenium_config.get('script_timeout_margin_seconds', 5)
+DEFAULT_LOAD_PROFILE = _selenium_config.get('default_load_profile', 'full')
+LOAD_PROFILES = _selenium_config.get('load_profiles', {
+    'full': {'page_load_strategy': 'normal', 'block_resource_types': [], 'block_url_patterns': []},
+})
+COLLECT_LOAD_STATS = _selenium_config.get('collect_load_stats', True)
+DEFAULT_TAB_POOL_SIZE = _selenium_config.get('tab_pool_size', 3)
 
 
 # --- 文件读取函数 ---
-# def get_name_info_from_file(filepath='names.txt', delimiter='	'):
-# 修改为使用配置的默认文件名
-def get_name_info_from_file(filepath=None, delimiter='	'):
+class CompactRow(Mapping):
+    """
+    紧凑的只读行记录。
+
+    同一文件中字段相同的行共享一个表头 (字段名 -> 下标)，每行只保存一个值元组，
+    比为每行创建一个 dict 节省数倍内存；用法与只读 dict 相同 (row['email'], row.get(...), dict(row))。
+    """
+    __slots__ = ('_header', '_values')
+
+    def __init__(self, header, values):
+        self._header = header
+        self._values = values
+
+    def __getitem__(self, key):
+        try:
+            return self._values[self._header[key]]
+        except IndexError:
+            raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._header)
+
+    def __len__(self):
+        return len(self._header)
+
+    def __repr__(self):
+        return f"CompactRow({dict(self)!r})"
+
+    @property
+    def values_tuple(self):
+        return self._values
+
+    def to_dict(self):
+        return dict(zip(self._header, self._values))
+
+
+def _make_row_header(fields):
+    return {field: i for i, field in enumerate(fields)}
+
+
+_generic_row_headers = {}
+
+
+def _generic_row_header(length):
+    """返回 field_0 ... field_{length-1} 的共享表头。"""
+    header = _generic_row_headers.get(length)
+    if header is None:
+        header = _generic_row_headers.setdefault(length, _make_row_header(f'field_{i}' for i in range(length)))
+    return header
+
+
+def detect_file_encoding(filepath, sample_size=ENCODING_SAMPLE_BYTES):
+    """
+    检测文本文件的编码: 先看 BOM，再校验整个文件是否为合法的 UTF-8，否则使用 FALLBACK_ENCODING (默认 gb18030，兼容 gbk)。
+    只看文件开头会把前面全是 ASCII 的 gbk 文件误判为 UTF-8，因此按 sample_size 分块校验到文件末尾。
+
+    Returns:
+        str: 可直接传给 open() 的编码名。
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    with open(filepath, 'rb') as f:
+        chunk = f.read(sample_size)
+        if chunk.startswith(codecs.BOM_UTF8):
+            return 'utf-8-sig'
+        if chunk.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            return 'utf-16'
+        try:
+            while chunk:
+                decoder.decode(chunk) # 分块边界上被截断的多字节字符由增量解码器保留到下一块
+                chunk = f.read(sample_size)
+            decoder.decode(b'', final=True)
+        except UnicodeDecodeError:
+            return FALLBACK_ENCODING
+    return 'utf-8'
+
+
+def _open_text(filepath, encoding=None):
+    return open(filepath, 'r', encoding=encoding or detect_file_encoding(filepath))
+
+
+def iter_name_info_from_file(filepath=None, delimiter='	', encoding=None):
+    """
+    逐行读取名称文件，流式返回 CompactRow (字段 'first_name', 'last_name')。
+
+    Args:
+        filepath (str, optional): 文件路径，默认为配置中的 default_names_file。
+        delimiter (str): 分隔符。
+        encoding (str, optional): 文件编码，默认自动检测。
+    """
     actual_filepath = filepath if filepath is not None else DEFAULT_NAMES_FILE
-    # ... (函数其余部分不变，只是使用 actual_filepath) ...
-    names_info_list = []
+    header = _make_row_header(('first_name', 'last_name'))
     try:
-        with open(actual_filepath, "r", encoding='utf-8') as f:
+        with _open_text(actual_filepath, encoding) as f:
             for line in f:
                 line = line.strip()
                 if not line:
                     continue
                 parts = line.split(delimiter)
                 if len(parts) > 1:
-                    name_info = {
-                        'first_name': parts[0],
-                        'last_name': parts[1]
-                    }
-                    names_info_list.append(name_info)
+                    yield CompactRow(header, (parts[0], parts[1]))
     except FileNotFoundError:
         print(f"错误: 文件未找到 {actual_filepath}")
+    except UnicodeDecodeError as e:
+        # 不能把已经读出的部分行当作完整结果，交给调用方处理
+        print(f"读取名称文件 {actual_filepath} 时出错 (编码不匹配): {e}")
+        raise
     except Exception as e:
         print(f"读取名称文件 {actual_filepath} 时出错: {e}")
-    return names_info_list
 
 
-def get_accounts_from_file(filepath, delimiter='	', skip_header=True, expected_fields=None):
+# def get_name_info_from_file(filepath='names.txt', delimiter='	'):
+# 修改为使用配置的默认文件名
+def get_name_info_from_file(filepath=None, delimiter='	', encoding=None, compact=False):
     """
-    从制表符分隔的文件中读取账户信息。
+    读取名称文件。compact=True 时返回 CompactRow 列表，否则返回 dict 列表；需要边读边处理时使用 iter_name_info_from_file。
+    """
+    try:
+        rows = list(iter_name_info_from_file(filepath, delimiter, encoding))
+    except UnicodeDecodeError:
+        return []
+    return rows if compact else [row.to_dict() for row in rows]
+
+
+def iter_accounts_from_file(filepath, delimiter='	', skip_header=True, expected_fields=None, encoding=None):
+    """
+    逐行读取制表符分隔的账户文件，流式返回 CompactRow，文件读完之前即可开始处理。
     参数:
         filepath (str): 账户信息文件的路径。
         delimiter (str): 分隔符字符串。默认为制表符。
         skip_header (bool): 是否跳过第一行（表头）。
-        expected_fields (list, optional): 账户字典的键列表。
-                                          如果为 None，则使用通用的 'field_0', 'field_1' 等。
+        expected_fields (list, optional): 字段名列表。如果为 None，则使用通用的 'field_0', 'field_1' 等。
+        encoding (str, optional): 文件编码，默认自动检测 (UTF-8 或 gbk/gb18030，检测时会先顺序扫描一遍文件)。
     返回:
-        list: 字典列表，每个字典代表一个账户。
+        generator: 每项为一个 CompactRow，字段相同的行共享表头。文件内容与编码不符时抛出 UnicodeDecodeError。
     """
-    accounts_info = []
+    header = _make_row_header(expected_fields) if expected_fields else None
     try:
-        with open(filepath, "r", encoding='gbk') as f: # 保留了原始的 gbk，但可以考虑 utf-8
+        with _open_text(filepath, encoding) as f:
             if skip_header:
                 f.readline()  # 跳过表头行
-            
+
             for line_number, lines in enumerate(f, start=1 if skip_header else 0):
                 if not lines.strip():
                     continue
-                line_list = lines.strip('\n').split(delimiter)
-                acc_info = {}
-                if expected_fields:
-                    if len(line_list) >= len(expected_fields):
-                        for i, field_name in enumerate(expected_fields):
-                            acc_info[field_name] = line_list[i]
-                    else:
+                line_list = lines.strip('\r\n').split(delimiter)
+                if header is not None:
+                    if len(line_list) < len(header):
                         print(f"警告: 文件 {filepath} 中的第 {line_number+1} 行字段数少于预期。已跳过。")
                         continue
+                    yield CompactRow(header, tuple(line_list[:len(header)]))
                 else:
-                    for i, item in enumerate(line_list):
-                        acc_info[f'field_{i}'] = item
-                accounts_info.append(acc_info)
+                    yield CompactRow(_generic_row_header(len(line_list)), tuple(line_list))
     except FileNotFoundError:
         print(f"错误: 文件未找到 {filepath}")
+    except UnicodeDecodeError as e:
+        # 不能把已经读出的部分行当作完整结果，交给调用方处理
+        print(f"读取账户文件 {filepath} 时出错 (编码不匹配): {e}")
+        raise
     except Exception as e:
         print(f"读取账户文件 {filepath} 时出错: {e}")
-    return accounts_info
 
 
-def get_text_content(filename):
+def get_accounts_from_file(filepath, delimiter='	', skip_header=True, expected_fields=None, encoding=None,
+                           compact=False):
     """
-    从文本文件中读取行到列表中，并去除空白。
+    从制表符分隔的文件中读取账户信息。
     参数:
-        filename (str): 文本文件的路径。
+        filepath (str): 账户信息文件的路径。
+        delimiter (str): 分隔符字符串。默认为制表符。
+        skip_header (bool): 是否跳过第一行（表头）。
+        expected_fields (list, optional): 账户字典的键列表。
+                                          如果为 None，则使用通用的 'field_0', 'field_1' 等。
+        encoding (str, optional): 文件编码，默认自动检测 (UTF-8 或 gbk/gb18030)。
+        compact (bool): 为 True 时返回共享表头的 CompactRow 列表，大文件可节省数倍内存。
     返回:
-        list: 字符串列表，每项是文件中的一个非空行。
+        list: 字典列表，每个字典代表一个账户。读取失败 (包括编码不匹配) 时返回空列表，不返回读到一半的数据。
     """
-    text_content = []
     try:
-        with open(filename, 'r', encoding='utf-8') as f:
+        rows = list(iter_accounts_from_file(filepath, delimiter, skip_header, expected_fields, encoding))
+    except UnicodeDecodeError:
+        return [] # 编码错误时不返回读到一半的数据
+    return rows if compact else [row.to_dict() for row in rows]
+
+
+def iter_text_content(filename, encoding=None):
+    """
+    逐行读取文本文件，流式返回去除空白后的非空行。
+    参数:
+        filename (str): 文本文件的路径。
+        encoding (str, optional): 文件编码，默认自动检测。
+    """
+    try:
+        with _open_text(filename, encoding) as f:
             for line in f:
-                if line.strip(): # 忽略空行
-                    text_content.append(line.strip())
+                line = line.strip()
+                if line: # 忽略空行
+                    yield line
     except FileNotFoundError:
         print(f"错误: 文件未找到 {filename}")
+    except UnicodeDecodeError as e:
+        # 不能把已经读出的部分行当作完整结果，交给调用方处理
+        print(f"读取文本文件 {filename} 时出错 (编码不匹配): {e}")
+        raise
     except Exception as e:
         print(f"读取文本文件 {filename} 时出错: {e}")
-    return text_content
+
+
+def get_text_content(filename, encoding=None):
+    """
+    从文本文件中读取行到列表中，并去除空白。
+    参数:
+        filename (str): 文本文件的路径。
+        encoding (str, optional): 文件编码，默认自动检测。
+    返回:
+        list: 字符串列表，每项是文件中的一个非空行。
+    """
+    try:
+        return list(iter_text_content(filename, encoding))
+    except UnicodeDecodeError:
+        return []
 
 # --- 工具函数 ---
 def random_input_from_list(elements, min_selected, max_selected=None):
@@ -183,51 +391,745 @@ def random_input_from_list(elements, min_selected, max_selected=None):
     selected_elements = random.sample(elements, num_elements_to_select)
     return ' '.join(selected_elements)
 
+# --- 大文件随机抽样 ---
+_LINE_INDEX_MAGIC = b'LINEIDX1'
+_LINE_INDEX_HEADER = struct.Struct('<8sQQ') # magic, 源文件大小, 源文件 mtime_ns
+
+
+class LineIndex:
+    """
+    文本文件的行偏移索引，用于 O(1) 随机读取任意一行。
+
+    第一次使用时扫描文件，把每个非空行的起始字节偏移写入同目录下的 <文件名>.lineidx (记录源文件大小和修改时间，
+    文件变化后自动重建)；之后源文件和索引都通过 mmap 读取，不把整个文件加载到内存，多个进程共享操作系统的页缓存。
+    只支持换行符为单字节 '\\n' 的编码 (UTF-8、gbk/gb18030 等)。线程安全。
+
+    Args:
+        filepath (str): 文本文件路径。
+        encoding (str, optional): 文件编码，默认自动检测。
+        rebuild (bool): 为 True 时忽略已有的索引文件重新构建。
+    """
+
+    def __init__(self, filepath, encoding=None, rebuild=False):
+        self.filepath = filepath
+        self.encoding = encoding or detect_file_encoding(filepath)
+        if self.encoding.lower().replace('_', '-').startswith('utf-16'):
+            raise ValueError(f"LineIndex does not support {self.encoding} files: {filepath}")
+        self.index_path = filepath + '.lineidx'
+        self._data_file = self._data = None
+        self._index_file = self._index_mm = self._offsets = None
+        stat = os.stat(filepath)
+        if rebuild or not self._index_is_current(stat):
+            self._build(stat)
+        self._open(stat)
+
+    def _index_is_current(self, stat):
+        try:
+            with open(self.index_path, 'rb') as f:
+                header = f.read(_LINE_INDEX_HEADER.size)
+        except OSError:
+            return False
+        if len(header) != _LINE_INDEX_HEADER.size:
+            return False
+        magic, size, mtime_ns = _LINE_INDEX_HEADER.unpack(header)
+        return magic == _LINE_INDEX_MAGIC and size == stat.st_size and mtime_ns == stat.st_mtime_ns
+
+    def _build(self, stat):
+        start = len(codecs.BOM_UTF8) if self.encoding.lower().replace('_', '-') == 'utf-8-sig' else 0
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        count = 0
+        with open(self.filepath, 'rb') as src, open(tmp_path, 'wb') as dst:
+            dst.write(_LINE_INDEX_HEADER.pack(_LINE_INDEX_MAGIC, stat.st_size, stat.st_mtime_ns))
+            src.seek(start)
+            offsets = array('Q')
+            position = start
+            for raw in src:
+                if raw.strip():
+                    offsets.append(position)
+                    if len(offsets) >= 65536:
+                        offsets.tofile(dst)
+                        count += len(offsets)
+                        offsets = array('Q')
+                position += len(raw)
+            offsets.tofile(dst)
+            count += len(offsets)
+        os.replace(tmp_path, self.index_path) # 原子替换，并发构建时读者不会看到半个索引
+        print(f"INFO: Built line index for {self.filepath} ({count} lines) -> {self.index_path}")
+
+    def _open(self, stat):
+        if stat.st_size > 0:
+            self._data_file = open(self.filepath, 'rb')
+            self._data = mmap.mmap(self._data_file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._index_file = open(self.index_path, 'rb')
+        if os.fstat(self._index_file.fileno()).st_size > _LINE_INDEX_HEADER.size:
+            self._index_mm = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._offsets = memoryview(self._index_mm)[_LINE_INDEX_HEADER.size:].cast('Q')
+
+    def is_stale(self):
+        """源文件在索引建立之后是否被修改过。"""
+        return not self._index_is_current(os.stat(self.filepath))
+
+    def __len__(self):
+        return len(self._offsets) if self._offsets is not None else 0
+
+    def __getitem__(self, i):
+        return self.line(i)
+
+    def line(self, i):
+        """返回第 i 个非空行 (去除首尾空白)。"""
+        if self._offsets is None:
+            raise IndexError("line index out of range")
+        start = self._offsets[i]
+        end = self._data.find(b'\n', start)
+        if end < 0:
+            end = len(self._data)
+        return self._data[start:end].decode(self.encoding, errors='replace').strip()
+
+    def sample(self, k, rng=None):
+        """不放回地随机取 k 行 (k 大于行数时取全部)。"""
+        rng = rng or random
+        return [self.line(i) for i in rng.sample(range(len(self)), min(k, len(self)))]
+
+    def sampler(self, seed=None, worker_id=None):
+        """返回该索引上的 LineSampler；给定 seed 时，同一 (seed, worker_id) 的抽取序列可复现。"""
+        return LineSampler(self, seed=seed, worker_id=worker_id)
+
+    def close(self):
+        if self._offsets is not None:
+            self._offsets.release()
+            self._offsets = None
+        for handle in (self._index_mm, self._index_file, self._data, self._data_file):
+            if handle is not None:
+                handle.close()
+        self._index_mm = self._index_file = self._data = self._data_file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+
+class LineSampler:
+    """
+    单个 worker 的不放回抽样器。
+
+    用稀疏的 Fisher-Yates 洗牌逐个抽取行号，内存只与已抽取的数量成正比；
+    所有行都抽过一轮之后开始新的一轮。
+
+    Args:
+        index (LineIndex): 行索引。
+        seed (optional): 随机种子；与 worker_id 一起决定抽取序列。
+        worker_id (optional): worker 标识，不同 worker 使用同一 seed 时得到不同的序列。
+    """
+
+    def __init__(self, index, seed=None, worker_id=None):
+        self.index = index
+        self._rng = random.Random(f"{seed}:{worker_id}" if seed is not None else None)
+        self._swaps = {}
+        self._drawn = 0
+        self._lock = threading.Lock()
+
+    def _next_position(self):
+        n = len(self.index)
+        if n == 0:
+            raise IndexError(f"No lines to sample in {self.index.filepath}")
+        with self._lock:
+            if self._drawn >= n:
+                self._swaps.clear()
+                self._drawn = 0
+            i = self._drawn
+            j = self._rng.randrange(i, n)
+            picked = self._swaps.get(j, j)
+            current = self._swaps.pop(i, i)
+            if j != i:
+                self._swaps[j] = current
+            self._drawn += 1
+            return picked
+
+    def draw(self, k=1):
+        """抽取 k 行 (同一轮内不重复)。"""
+        return [self.index.line(self._next_position()) for _ in range(min(k, len(self.index)))]
+
+    def random_input(self, min_selected, max_selected=None):
+        """与 random_input_from_list 相同的规则选取若干行，并以空格连接。"""
+        total = len(self.index)
+        if total == 0:
+            return ""
+        min_selected = min(max(1, min_selected), total)
+        max_selected = total if max_selected is None else min(max_selected, total)
+        min_selected = min(min_selected, max_selected)
+        return ' '.join(self.draw(self._rng.randint(min_selected, max_selected)))
+
+    def draw_name_info(self, delimiter='	'):
+        """抽取一行名称，返回 {'first_name', 'last_name'}；跳过字段不足的行，一轮内都不满足时返回 None。"""
+        for _ in range(len(self.index)):
+            parts = self.index.line(self._next_position()).split(delimiter)
+            if len(parts) > 1:
+                return {'first_name': parts[0], 'last_name': parts[1]}
+        return None
+
+
+_line_indexes = {}
+_line_indexes_lock = threading.Lock()
+_line_samplers = {} # (绝对路径, seed, worker_id, encoding) -> LineSampler，供 random_input_from_file 复用
+
+
+def get_line_index(filepath=None, encoding=None):
+    """
+    返回文件共享的 LineIndex (进程内按绝对路径缓存，源文件变化后重新建立)。
+
+    Args:
+        filepath (str, optional): 文本文件路径，默认为配置中的 default_names_file。
+        encoding (str, optional): 文件编码，默认自动检测。
+    """
+    path = os.path.abspath(filepath if filepath is not None else DEFAULT_NAMES_FILE)
+    with _line_indexes_lock:
+        index = _line_indexes.get(path)
+        if index is None or index.is_stale():
+            if index is not None:
+                index.close()
+            index = LineIndex(path, encoding=encoding)
+            _line_indexes[path] = index
+        return index
+
+
+def get_line_sampler(filepath=None, seed=None, worker_id=None, encoding=None):
+    """返回文件的 LineSampler，供每个 worker 各自不放回地抽取行。"""
+    return get_line_index(filepath, encoding).sampler(seed=seed, worker_id=worker_id)
+
+
+def _shared_line_sampler(filepath, seed, worker_id, encoding):
+    """返回按 (路径, seed, worker_id, encoding) 复用的 LineSampler；文件变化、索引重建后重新创建。"""
+    index = get_line_index(filepath, encoding)
+    key = (index.filepath, seed, worker_id, encoding)
+    with _line_indexes_lock:
+        sampler = _line_samplers.get(key)
+        if sampler is None or sampler.index is not index:
+            sampler = index.sampler(seed=seed, worker_id=worker_id)
+            _line_samplers[key] = sampler
+        return sampler
+
+
+def random_input_from_file(filepath, min_selected, max_selected=None, seed=None, worker_id=None, encoding=None):
+    """
+    从大文本文件中随机选取若干行并以空格连接，效果同 random_input_from_list(get_text_content(filepath), ...)，
+    但只通过行索引读取被选中的行。
+
+    同一 (filepath, seed, worker_id, encoding) 的多次调用共用一个 LineSampler，
+    因此给定 seed 时连续调用得到可复现的不同结果，而不是每次重复同一组行。
+    """
+    try:
+        return _shared_line_sampler(filepath, seed, worker_id, encoding).random_input(min_selected, max_selected)
+    except FileNotFoundError:
+        print(f"错误: 文件未找到 {filepath}")
+    except Exception as e:
+        print(f"读取文本文件 {filepath} 时出错: {e}")
+    return ""
+
 # --- HubStudio API 函数 ---
-HUBSTUDIO_BASE_URL = "http://127.0.0.1:6873/api/v1"
+# 各端点的默认超时与重试策略，可在 config.json 的 HubStudio.endpoint_policies 中按端点覆盖。
+# /browser/start 在读超时后不重试，避免同一容器被重复启动。
+_DEFAULT_ENDPOINT_POLICIES = {
+    '/env/list': {'read_timeout_seconds': 30, 'retries': 3, 'backoff_factor': 0.5, 'retry_on_read': True,
+                  'retry_on_status': True},
+    # /browser/start 不是幂等的: 请求发出后的读取超时或 502/503/504 都可能意味着浏览器已在启动，只重试连接失败
+    '/browser/start': {'read_timeout_seconds': 120, 'retries': 2, 'backoff_factor': 1.0, 'retry_on_read': False,
+                       'retry_on_status': False},
+    '/browser/stop': {'read_timeout_seconds': 30, 'retries': 3, 'backoff_factor': 0.5, 'retry_on_read': True,
+                      'retry_on_status': True},
+    '/browser/all-browser-status': {'read_timeout_seconds': 15, 'retries': 2, 'backoff_factor': 0.3,
+                                    'retry_on_read': True, 'retry_on_status': True},
+}
+# 按端点策略重试的网关错误状态码
+_RETRY_STATUS_CODES = (502, 503, 504)
+
+# /browser/all-browser-status 返回的容器状态码
+BROWSER_STATUS_OPEN = 0
+BROWSER_STATUS_STARTING = 1
+BROWSER_STATUS_CLOSING = 2
+BROWSER_STATUS_CLOSED = 3
+
+
+class HubStudioClient:
+    """
+    HubStudio 本地 API 客户端。
+
+    所有请求共享一个 requests.Session 和同一个连接池 (长连接)，每个请求都带有连接/读取超时。
+    重试按端点策略在 request() 中进行: 连接失败总是重试，读取失败和 502/503/504 分别由
+    retry_on_read 和 retry_on_status 决定。该类是线程安全的，可在多个工作线程间共享。
+    参数:
+        base_url (str): HubStudio API 根地址，例如 'http://127.0.0.1:6873/api/v1'。
+        connect_timeout (float): 建立连接的超时时间（秒）。
+        read_timeout (float): 默认读取超时时间（秒），端点策略中的 read_timeout_seconds 优先。
+        pool_maxsize (int): 连接池的最大连接数，应不小于并发工作线程数。
+        endpoint_policies (dict, optional): 端点路径 -> 策略字典，覆盖默认策略中的同名字段。
+    """
+
+    def __init__(self, base_url=HUBSTUDIO_BASE_URL, connect_timeout=HUBSTUDIO_CONNECT_TIMEOUT_SECONDS,
+                 read_timeout=HUBSTUDIO_READ_TIMEOUT_SECONDS, pool_maxsize=HUBSTUDIO_POOL_MAXSIZE,
+                 endpoint_policies=None):
+        self.base_url = base_url.rstrip('/')
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.policies = {}
+        for endpoint, policy in _DEFAULT_ENDPOINT_POLICIES.items():
+            self.policies[endpoint] = dict(policy)
+        for endpoint, policy in (endpoint_policies or {}).items():
+            self.policies.setdefault(endpoint, {}).update(policy)
+
+        self.session = requests.Session()
+        self.session.mount(self.base_url, HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize))
+
+    @staticmethod
+    def _is_connect_error(error):
+        """连接阶段的失败 (请求还没有发出)，对任何端点重试都是安全的。"""
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            return True
+        reason = getattr(error.args[0], 'reason', None) if error.args else None
+        return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+    def _timeout(self, endpoint):
+        policy = self.policies.get(endpoint, {})
+        return (self.connect_timeout, policy.get('read_timeout_seconds', self.read_timeout))
+
+    def request(self, method, endpoint, **kwargs):
+        """
+        向 HubStudio API 发送请求并返回解析后的 JSON。
+        参数:
+            method (str): 'GET' 或 'POST'。
+            endpoint (str): 端点路径，例如 '/env/list'。
+            **kwargs: 透传给 requests.Session.request 的参数 (json, params 等)。
+        返回:
+            dict: API 的 JSON 响应。
+        异常:
+            requests.exceptions.RequestException: 网络错误、超时 (重试用完后) 或响应不是合法 JSON。
+        """
+        policy = self.policies.get(endpoint, {})
+        retries = max(0, int(policy.get('retries', 0)))
+        kwargs.setdefault('timeout', self._timeout(endpoint))
+        attempt = 0
+        while True:
+            try:
+                response = self.session.request(method, self.base_url + endpoint, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                retryable = self._is_connect_error(e) or policy.get('retry_on_read', True)
+                if not retryable or attempt >= retries:
+                    raise
+            else:
+                if (response.status_code not in _RETRY_STATUS_CODES or not policy.get('retry_on_status', True)
+                        or attempt >= retries):
+                    return response.json()
+                response.close()
+            attempt += 1
+            time.sleep(policy.get('backoff_factor', 0.5) * (2 ** (attempt - 1)))
+
+    def list_envs(self, **filters):
+        """调用 /env/list，filters 作为请求体 (例如 current, size, containerCodes)。"""
+        return self.request('POST', '/env/list', json=filters)
+
+    def start_browser(self, container_id, **extra):
+        """调用 /browser/start 启动指定容器的浏览器。"""
+        payload = {"containerCode": container_id}
+        payload.update(extra)
+        return self.request('POST', '/browser/start', json=payload)
+
+    def stop_browser(self, container_id):
+        """调用 /browser/stop 关闭指定容器的浏览器。"""
+        return self.request('GET', '/browser/stop', params={'containerCode': container_id})
+
+    def browser_status(self, container_ids):
+        """调用 /browser/all-browser-status 查询一组容器的浏览器状态。"""
+        return self.request('POST', '/browser/all-browser-status', json={"containerCodes": list(container_ids)})
+
+    def close(self):
+        """关闭底层 Session 及其连接池。"""
+        self.session.close()
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_hubstudio_client():
+    """
+    返回模块级共享的 HubStudioClient (首次调用时按 config.json 创建)。
+    返回:
+        HubStudioClient: 共享客户端实例。
+    """
+    global _default_client
+    if _default_client is None:
+        with _default_client_lock:
+            if _default_client is None:
+                _default_client = HubStudioClient(endpoint_policies=HUBSTUDIO_ENDPOINT_POLICIES)
+    return _default_client
+
+
+def set_hubstudio_client(client):
+    """
+    替换模块级共享的 HubStudioClient (例如指向本地的模拟 HubStudio 服务)。
+    参数:
+        client (HubStudioClient): 新的客户端实例。
+    返回:
+        HubStudioClient or None: 被替换的旧客户端。
+    """
+    global _default_client
+    with _default_client_lock:
+        previous, _default_client = _default_client, client
+    return previous
+
 
-def get_containers_list():
+def get_containers_list(client=None):
     """
     检索 HubStudio 环境列表。
+    参数:
+        client (HubStudioClient, optional): 使用的 API 客户端，默认为共享客户端。
     返回:
         dict: API 的 JSON 响应，如果失败则为 None。
     """
-    url = f'{HUBSTUDIO_BASE_URL}/env/list'
+    client = client if client is not None else get_hubstudio_client()
     try:
-        res = requests.post(url, json={}).json()
-        return res
+        return client.list_envs()
     except requests.exceptions.RequestException as e:
         print(f"获取容器列表时出错: {e}")
         return None
 
-def open_container(container_id, extension_path=DEFAULT_EXTENSION_PATH, chromedriver_executable_path=DEFAULT_CHROMEDRIVER_PATH):
+class EnvironmentRegistry:
+    """
+    带 TTL 缓存和内存索引的 HubStudio 环境列表。
+
+    首次访问或缓存过期时分页拉取 /env/list，并按 containerCode、containerName、tagName 建立索引，
+    之后的查找为 O(1) 字典访问，不再需要 API 往返和线性扫描。刷新失败时保留上一次的数据。
+    缓存过期时只有一个线程执行刷新 (持有刷新锁)，其他线程等待其结果；刷新失败后 retry_seconds 内不再自动刷新。
+    参数:
+        client (HubStudioClient, optional): 使用的 API 客户端，默认为共享客户端。
+        ttl_seconds (float): 缓存有效期（秒）。为 None 时永不过期，只能通过 invalidate()/refresh() 更新。
+        page_size (int): 每次分页请求的环境数量。
+        retry_seconds (float): 刷新失败后，自动刷新的最短重试间隔（秒）。
+    """
+
+    def __init__(self, client=None, ttl_seconds=DEFAULT_ENV_CACHE_TTL_SECONDS, page_size=DEFAULT_ENV_LIST_PAGE_SIZE,
+                 retry_seconds=DEFAULT_ENV_REFRESH_RETRY_SECONDS):
+        self._client = client
+        self.ttl_seconds = ttl_seconds
+        self.page_size = max(1, int(page_size))
+        self.retry_seconds = retry_seconds
+        self._refresh_lock = threading.Lock()
+        self._envs = []
+        self._by_code = {}
+        self._by_name = {}
+        self._by_tag = {}
+        self._loaded_at = None
+        self._failed_at = None
+
+    def _fetch_all(self):
+        client = self._client if self._client is not None else get_hubstudio_client()
+        envs = []
+        current = 1
+        while True:
+            res = client.list_envs(current=current, size=self.page_size)
+            if res.get('code') != 0:
+                raise RuntimeError(f"/env/list 返回错误: {res.get('msg', '未知错误')}")
+            data = res.get('data') or {}
+            page = data.get('list') or []
+            envs.extend(page)
+            total = data.get('total')
+            if not page or len(page) < self.page_size or (total is not None and len(envs) >= total):
+                return envs
+            current += 1
+
+    @staticmethod
+    def _tags_of(env):
+        tags = env.get('tagName')
+        if not tags:
+            return []
+        if isinstance(tags, (list, tuple)):
+            return [str(t) for t in tags]
+        return [str(tags)]
+
+    def refresh(self):
+        """
+        立即重新拉取全部环境并重建索引。
+        返回:
+            bool: 刷新成功为 True，失败为 False (此时保留旧数据)。
+        """
+        with self._refresh_lock:
+            return self._refresh_locked()
+
+    def _refresh_locked(self):
+        """refresh() 的实现，调用方必须持有 _refresh_lock。"""
+        try:
+            envs = self._fetch_all()
+        except (requests.exceptions.RequestException, RuntimeError) as e:
+            self._failed_at = time.monotonic()
+            print(f"HubStudio: 刷新环境列表失败，继续使用缓存数据: {e}")
+            return False
+        by_code, by_name, by_tag = {}, {}, {}
+        for env in envs:
+            code = env.get('containerCode')
+            if code is not None:
+                by_code[str(code)] = env
+            name = env.get('containerName')
+            if name is not None:
+                by_name.setdefault(name, []).append(env)
+            for tag in self._tags_of(env):
+                by_tag.setdefault(tag, []).append(env)
+        # 整体替换引用，读取方无需加锁即可看到一致的快照
+        self._envs, self._by_code, self._by_name, self._by_tag = envs, by_code, by_name, by_tag
+        self._loaded_at = time.monotonic()
+        self._failed_at = None
+        print(f"HubStudio: 环境列表已刷新，共 {len(envs)} 个环境。")
+        return True
+
+    def invalidate(self):
+        """使缓存失效，下一次查询时重新拉取。"""
+        self._loaded_at = None
+        self._failed_at = None
+
+    def _needs_refresh(self):
+        now = time.monotonic()
+        loaded_at, failed_at = self._loaded_at, self._failed_at
+        if loaded_at is not None and (self.ttl_seconds is None or now - loaded_at < self.ttl_seconds):
+            return False
+        # 最近一次刷新失败时先退避，避免每次查询都打到 /env/list
+        return failed_at is None or now - failed_at >= self.retry_seconds
+
+    def _ensure_fresh(self):
+        if not self._needs_refresh():
+            return
+        with self._refresh_lock:
+            # 等锁期间其他线程可能已经完成 (或刚刚失败) 刷新
+            if self._needs_refresh():
+                self._refresh_locked()
+
+    def all(self):
+        """返回全部环境的列表。"""
+        self._ensure_fresh()
+        return list(self._envs)
+
+    def get_by_code(self, container_code):
+        """按 containerCode 查找环境，找不到时返回 None。"""
+        self._ensure_fresh()
+        return self._by_code.get(str(container_code))
+
+    def find_by_name(self, name):
+        """按 containerName 查找环境 (名称可能重复)，返回列表。"""
+        self._ensure_fresh()
+        return list(self._by_name.get(name, []))
+
+    def find_by_tag(self, tag):
+        """按 tagName 查找环境，返回列表。"""
+        self._ensure_fresh()
+        return list(self._by_tag.get(str(tag), []))
+
+    def __len__(self):
+        self._ensure_fresh()
+        return len(self._envs)
+
+
+_default_registry = None
+_default_registry_lock = threading.Lock()
+
+
+def get_environment_registry():
+    """
+    返回模块级共享的 EnvironmentRegistry (使用共享客户端和 config.json 中的 TTL/分页大小)。
+    返回:
+        EnvironmentRegistry: 共享的环境注册表。
+    """
+    global _default_registry
+    if _default_registry is None:
+        with _default_registry_lock:
+            if _default_registry is None:
+                _default_registry = EnvironmentRegistry()
+    return _default_registry
+
+# --- WebDriver 连接层 (扩展缓存、chromedriver 复用与重连) ---
+_extension_cache = {}
+_chromedriver_services = {}
+_attachments = {}
+_attach_lock = threading.Lock()
+_attach_stats = {
+    'opens': 0, 'started': 0, 'reattached': 0, 'reused_sessions': 0, 'failures': 0,
+    'start_api_seconds_total': 0.0, 'attach_seconds_total': 0.0, 'attach_seconds_max': 0.0,
+}
+
+
+def _get_encoded_extension(extension_path):
+    """读取并 base64 编码 CRX 扩展文件，按 (路径, 修改时间, 大小) 在进程内缓存。"""
+    stat = os.stat(extension_path)
+    key = (os.path.abspath(extension_path), stat.st_mtime_ns, stat.st_size)
+    encoded = _extension_cache.get(key)
+    if encoded is None:
+        with open(extension_path, 'rb') as f:
+            encoded = base64.b64encode(f.read()).decode('utf-8')
+        _extension_cache[key] = encoded
+    return encoded
+
+
+def _get_chromedriver_service(chromedriver_executable_path):
+    """
+    返回该路径对应的共享 chromedriver 服务 (一个 chromedriver 进程可同时承载多个会话)。
+    进程已退出时会自动重新启动。
+    """
+    with _attach_lock:
+        service = _chromedriver_services.get(chromedriver_executable_path)
+        process = getattr(service, 'process', None) if service is not None else None
+        if service is None or process is None or process.poll() is not None:
+            service = Service(executable_path=chromedriver_executable_path)
+            service.start()
+            _chromedriver_services[chromedriver_executable_path] = service
+        return service
+
+
+def shutdown_chromedriver_services():
+    """停止所有共享的 chromedriver 进程 (进程退出时自动调用)。"""
+    with _attach_lock:
+        services = list(_chromedriver_services.values())
+        _chromedriver_services.clear()
+    for service in services:
+        try:
+            service.stop()
+        except Exception:
+            pass
+
+
+atexit.register(shutdown_chromedriver_services)
+
+
+def _quit_driver_quietly(driver):
+    """释放 WebDriver 会话 (结束 chromedriver 端的会话)，忽略任何错误。重复调用不会再次发送请求。"""
+    if getattr(driver, '_hub_session_released', False):
+        return
+    try:
+        driver._hub_session_released = True
+        driver.quit()
+    except Exception:
+        pass
+
+
+def _release_attachment(container_id):
+    """忘记容器的连接记录并释放其 WebDriver 会话。"""
+    with _attach_lock:
+        attachment = _attachments.pop(str(container_id), None)
+    if attachment and attachment.get('driver') is not None:
+        _quit_driver_quietly(attachment['driver'])
+
+
+def _is_session_alive(driver):
+    if getattr(driver, '_hub_session_released', False):
+        return False
+    try:
+        driver.current_window_handle
+        return True
+    except Exception:
+        return False
+
+
+def _attach_driver(debugging_port, extension_path, chromedriver_executable_path, reuse_service, load_profile=None):
+    """通过 debuggerAddress 把 WebDriver 会话连接到已运行的浏览器。"""
+    options = webdriver.ChromeOptions()
+    options.page_load_strategy = get_load_profile(load_profile)['page_load_strategy']
+    if extension_path: # 仅当提供了路径时才添加扩展
+        options.add_encoded_extension(_get_encoded_extension(extension_path))
+    options.add_experimental_option("debuggerAddress", f'127.0.0.1:{debugging_port}')
+    if not reuse_service:
+        return webdriver.Chrome(service=Service(executable_path=chromedriver_executable_path), options=options)
+    service = _get_chromedriver_service(chromedriver_executable_path)
+    executor = ChromiumRemoteConnection(remote_server_addr=service.service_url, vendor_prefix='goog',
+                                        browser_name='chrome')
+    return webdriver.Remote(command_executor=executor, options=options)
+
+
+def get_attach_stats():
+    """
+    返回连接层的统计信息。
+    返回:
+        dict: 包含 'opens', 'started' (通过 /browser/start 启动), 'reattached' (直接连接到已运行的容器),
+              'reused_sessions' (复用仍存活的会话), 'failures', 'avg_start_api_seconds',
+              'avg_attach_seconds', 'max_attach_seconds', 'chromedriver_processes', 'attached_containers'。
+    """
+    with _attach_lock:
+        stats = dict(_attach_stats)
+        chromedriver_processes = len(_chromedriver_services)
+        attached_containers = len(_attachments)
+    attaches = stats['started'] + stats['reattached']
+    return {
+        'opens': stats['opens'],
+        'started': stats['started'],
+        'reattached': stats['reattached'],
+        'reused_sessions': stats['reused_sessions'],
+        'failures': stats['failures'],
+        'avg_start_api_seconds': stats['start_api_seconds_total'] / stats['started'] if stats['started'] else None,
+        'avg_attach_seconds': stats['attach_seconds_total'] / attaches if attaches else None,
+        'max_attach_seconds': stats['attach_seconds_max'],
+        'chromedriver_processes': chromedriver_processes,
+        'attached_containers': attached_containers,
+    }
+
+
+def _bump_attach_stats(**increments):
+    with _attach_lock:
+        for key, value in increments.items():
+            _attach_stats[key] += value
+        if 'attach_seconds_total' in increments:
+            _attach_stats['attach_seconds_max'] = max(_attach_stats['attach_seconds_max'], increments['attach_seconds_total'])
+
+
+def open_container(container_id, extension_path=DEFAULT_EXTENSION_PATH, chromedriver_executable_path=DEFAULT_CHROMEDRIVER_PATH,
+                   client=None, reuse_service=True, reattach=True, load_profile=None):
     """
     打开一个 HubStudio 容器并返回一个 Selenium WebDriver 实例。
+
+    默认情况下，同一 chromedriver 路径的所有容器共享一个 chromedriver 进程；
+    若该容器此前已由本进程连接且会话仍然存活，直接返回原会话；
+    若容器已在运行且已知其 debuggingPort，则直接重新连接而不再调用 /browser/start。
     参数:
         container_id (str): 要打开的容器 ID。
         extension_path (str): HubStudio 的 CRX 扩展文件路径。
         chromedriver_executable_path (str): chromedriver.exe 的路径。
+        client (HubStudioClient, optional): 使用的 API 客户端，默认为共享客户端。
+        reuse_service (bool): 是否复用共享的 chromedriver 进程。为 False 时为该容器单独启动一个。
+        reattach (bool): 是否复用/重新连接已运行的容器。
+        load_profile (str, optional): 会话的默认加载配置名 (决定 pageLoadStrategy)，默认为 DEFAULT_LOAD_PROFILE。
     返回:
-        selenium.webdriver.Chrome or None: WebDriver 实例，如果失败则为 None。
+        selenium.webdriver.Remote or None: WebDriver 实例，如果失败则为 None。
     """
-    url = f'{HUBSTUDIO_BASE_URL}/browser/start'
-    open_data = {"containerCode": container_id}
+    client = client if client is not None else get_hubstudio_client()
+    key = str(container_id)
+    _bump_attach_stats(opens=1)
     try:
-        open_res = requests.post(url, json=open_data).json()
-        if open_res.get('code') != 0:
-            print(f"HubStudio: 环境 {container_id} 打开失败: {open_res.get('msg', '未知错误')}")
-            return None
-        
-        # webdriver_path_from_api = open_res['data']['webdriver'] # 这通常是浏览器可执行文件本身
-        debugging_port = open_res['data']['debuggingPort']
-
-        service = Service(executable_path=chromedriver_executable_path)
-        options = webdriver.ChromeOptions()
-        if extension_path: # 仅当提供了路径时才添加扩展
-             options.add_extension(extension_path)
-        options.add_experimental_option("debuggerAddress", f'127.0.0.1:{debugging_port}')
-        
-        driver = webdriver.Chrome(service=service, options=options)
+        debugging_port = None
+        if reattach:
+            with _attach_lock:
+                attachment = _attachments.get(key)
+            if attachment is not None and attachment.get('driver') is not None and _is_session_alive(attachment['driver']):
+                _bump_attach_stats(reused_sessions=1)
+                return attachment['driver']
+            status, item = _query_browser_status_item(client, container_id)
+            if status == BROWSER_STATUS_OPEN:
+                debugging_port = (item or {}).get('debuggingPort') or (attachment or {}).get('debugging_port')
+
+        if debugging_port is None:
+            api_start = time.perf_counter()
+            open_res = client.start_browser(container_id)
+            api_seconds = time.perf_counter() - api_start
+            if open_res.get('code') != 0:
+                print(f"HubStudio: 环境 {container_id} 打开失败: {open_res.get('msg', '未知错误')}")
+                _bump_attach_stats(failures=1)
+                return None
+            # webdriver_path_from_api = open_res['data']['webdriver'] # 这通常是浏览器可执行文件本身
+            debugging_port = open_res['data']['debuggingPort']
+            _bump_attach_stats(started=1, start_api_seconds_total=api_seconds)
+        else:
+            _bump_attach_stats(reattached=1)
+
+        attach_start = time.perf_counter()
+        driver = _attach_driver(debugging_port, extension_path, chromedriver_executable_path, reuse_service,
+                                load_profile)
+        _bump_attach_stats(attach_seconds_total=time.perf_counter() - attach_start)
+        with _attach_lock:
+            _attachments[key] = {'debugging_port': debugging_port, 'driver': driver}
         print(f"HubStudio: 成功连接到容器 {container_id} (端口 {debugging_port})")
         # 可选：初始打开一个空白页
         # open_url(driver, 'about:blank') 
@@ -238,69 +1140,1043 @@ def open_container(container_id, extension_path=DEFAULT_EXTENSION_PATH, chromedr
         print(f"HubStudio: 打开 {container_id} 时 API 响应格式意外: 缺少键 {e}")
     except Exception as e:
         print(f"HubStudio: 打开容器 {container_id} 时发生常规错误: {e}")
+    _bump_attach_stats(failures=1)
     return None
 
 
-def close_container(container_id):
+def _backoff_delay(attempt, base_delay, max_delay):
+    """第 attempt 次失败后的等待时间: 指数退避上限内的随机抖动 (equal jitter)。"""
+    cap = min(max_delay, base_delay * (2 ** (attempt - 1)))
+    return cap / 2 + random.uniform(0, cap / 2)
+
+
+def _query_browser_status_item(client, container_id):
     """
-    关闭一个 HubStudio 容器。
-    参数:
-        container_id (str): 要关闭的容器 ID。
+    查询单个容器的浏览器状态。
     返回:
-        bool: 如果成功则为 True，否则为 False。
+        tuple: (状态码, 状态条目字典)。容器不在运行列表中时状态视为 BROWSER_STATUS_CLOSED，
+               查询失败时为 (None, None)。
     """
-    url = f'{HUBSTUDIO_BASE_URL}/browser/stop?containerCode={container_id}'
-    retries = 3
-    for i in range(retries):
-        try:
-            close_res = requests.get(url).json()
-            if close_res.get('code') == 0:
-                print(f"HubStudio: 环境 {container_id} 关闭成功。")
-                return True
-            else:
-                print(f"HubStudio: 关闭环境 {container_id} 失败 (尝试 {i+1}/{retries}): {close_res.get('msg', '未知错误')}")
-        except requests.exceptions.RequestException as e:
-            print(f"HubStudio: 关闭容器 {container_id} 时请求错误 (尝试 {i+1}/{retries}): {e}")
-        except Exception as e:
-            print(f"HubStudio: 关闭容器 {container_id} 时发生常规错误 (尝试 {i+1}/{retries}): {e}")
-        if i < retries - 1:
-            time.sleep(5)
-    print(f"HubStudio: 尝试 {retries} 次后放弃关闭容器 {container_id}。")
-    return False
+    try:
+        res = client.browser_status([container_id])
+    except requests.exceptions.RequestException:
+        return None, None
+    if res.get('code') != 0:
+        return None, None
+    for item in (res.get('data') or {}).get('containers') or []:
+        if str(item.get('containerCode')) == str(container_id):
+            return item.get('status'), item
+    return BROWSER_STATUS_CLOSED, None
 
-# --- Selenium WebDriver 操作函数 ---
 
-def open_url(driver, url, wait_time=10):
+def _query_browser_statuses(client, container_ids):
     """
-    让 WebDriver 导航到给定的 URL。
-    参数:
-        driver: Selenium WebDriver 实例。
-        url (str): 要打开的 URL。
-        wait_time (int): 导航后的隐式等待时间。
+    用一次 /browser/all-browser-status 查询一组容器的浏览器状态。
+    返回:
+        dict or None: 容器 ID -> 状态码 (不在运行列表中的容器视为 BROWSER_STATUS_CLOSED)；查询失败时为 None。
     """
     try:
-        driver.get(url)
-        driver.implicitly_wait(wait_time)
-    except Exception as e:
-        print(f"打开 URL {url} 时出错: {e}")
+        res = client.browser_status(container_ids)
+    except requests.exceptions.RequestException:
+        return None
+    if res.get('code') != 0:
+        return None
+    statuses = {cid: BROWSER_STATUS_CLOSED for cid in container_ids}
+    by_code = {str(cid): cid for cid in container_ids}
+    for item in (res.get('data') or {}).get('containers') or []:
+        cid = by_code.get(str(item.get('containerCode')))
+        if cid is not None:
+            statuses[cid] = item.get('status')
+    return statuses
+
 
-def open_new_page(driver, url, wait_time=10):
+def _wait_until_closed(client, container_ids, wait_ids, timeout):
     """
-    在新标签页/窗口中打开一个 URL 并将焦点切换到它。
-    参数:
-        driver: Selenium WebDriver 实例。
-        url (str): 要在新标签页中打开的 URL。
-        wait_time (int): 隐式等待时间。
+    轮询一组容器的状态 (每轮只发一次批量查询，间隔按指数退避增长)，直到 wait_ids 中的容器都已关闭或超时。
+    不在 wait_ids 中的容器只参与第一次查询。
     返回:
-        str or None: 新页面的窗口句柄，如果出错则为 None。
+        dict: 容器 ID -> 最后一次查询到的状态码 (从未查询成功时为 None)。
     """
+    statuses = {cid: None for cid in container_ids}
+    deadline = time.monotonic() + timeout
+    delay = CLOSE_STATUS_POLL_INITIAL_SECONDS
+    pending = list(container_ids)
+    while pending:
+        queried = _query_browser_statuses(client, pending)
+        if queried is not None:
+            statuses.update(queried)
+            pending = [cid for cid in pending if cid in wait_ids and queried[cid] != BROWSER_STATUS_CLOSED]
+        if not pending or time.monotonic() + delay > deadline:
+            break
+        time.sleep(delay)
+        delay = min(delay * 2, CLOSE_STATUS_POLL_MAX_SECONDS)
+    return statuses
+
+
+def _send_stop(client, container_id):
+    """发送一次 /browser/stop；返回 None 表示请求成功，否则返回错误信息。"""
     try:
-        original_window = driver.current_window_handle
-        driver.execute_script("window.open('');")
-        all_handles = driver.window_handles
-        new_window_handle = [handle for handle in all_handles if handle != original_window][0]
+        close_res = client.stop_browser(container_id)
+        if close_res.get('code') == 0:
+            return None
+        return close_res.get('msg', '未知错误')
+    except requests.exceptions.RequestException as e:
+        return f"请求错误: {e}"
+    except Exception as e:
+        return f"常规错误: {e}"
+
+
+def _stop_containers(client, container_ids, max_attempts, base_delay, max_delay, verify_status,
+                     status_timeout=DEFAULT_CLOSE_STATUS_TIMEOUT_SECONDS, max_workers=1):
+    """
+    关闭一组容器。每一轮并发发送 /browser/stop，然后用批量状态查询确认:
+    stop 成功的容器轮询到 BROWSER_STATUS_CLOSED 为止 (CLOSING 只是关闭中，不重复发送 stop)，超时视为失败；
+    stop 失败的容器如果状态已是关闭则视为成功 (容器本就未运行时 /browser/stop 也可能返回失败)，
+    否则在抖动指数退避后进入下一轮重试。
+    返回:
+        dict: 容器 ID -> {'ok', 'attempts', 'error', 'seconds'}。
+    """
+    results = {cid: {'ok': False, 'attempts': 0, 'error': None, 'seconds': None} for cid in container_ids}
+    start = time.perf_counter()
+    for cid in container_ids:
+        _release_attachment(cid)
+
+    def finish(cid, ok, error=None):
+        results[cid].update(ok=ok, error=None if ok else error, seconds=time.perf_counter() - start)
+
+    remaining = list(container_ids)
+    for attempt in range(1, max_attempts + 1):
+        for cid in remaining:
+            results[cid]['attempts'] = attempt
+        if max_workers > 1 and len(remaining) > 1:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(remaining)),
+                                    thread_name_prefix='hub-close') as executor:
+                errors = dict(zip(remaining, executor.map(lambda cid: _send_stop(client, cid), remaining)))
+        else:
+            errors = {cid: _send_stop(client, cid) for cid in remaining}
+        stopped = {cid for cid in remaining if errors[cid] is None}
+        statuses = _wait_until_closed(client, remaining, stopped, status_timeout) if verify_status else {}
+
+        retry = []
+        for cid in remaining:
+            status = statuses.get(cid)
+            if status == BROWSER_STATUS_CLOSED:
+                finish(cid, True)
+            elif cid in stopped:
+                # 状态查询不可用时以 /browser/stop 的返回为准
+                if status is None:
+                    finish(cid, True)
+                else:
+                    finish(cid, False, f"关闭请求成功但 {status_timeout} 秒内容器状态仍为 {status}")
+                    print(f"HubStudio: 关闭环境 {cid} 失败: {results[cid]['error']}")
+            else:
+                results[cid]['error'] = errors[cid]
+                print(f"HubStudio: 关闭环境 {cid} 失败 (尝试 {attempt}/{max_attempts}): {errors[cid]}")
+                retry.append(cid)
+        remaining = retry
+        if not remaining:
+            break
+        if attempt < max_attempts:
+            time.sleep(_backoff_delay(attempt, base_delay, max_delay))
+    for cid in remaining:
+        finish(cid, False, results[cid]['error'])
+    return results
+
+
+def _stop_container(client, container_id, max_attempts, base_delay, max_delay, verify_status,
+                    status_timeout=DEFAULT_CLOSE_STATUS_TIMEOUT_SECONDS):
+    """
+    关闭单个容器，失败时按抖动指数退避重试，并可通过状态查询确认容器确实已关闭。
+    返回:
+        dict: 包含 'ok', 'attempts', 'error', 'seconds' 的字典。
+    """
+    return _stop_containers(client, [container_id], max_attempts, base_delay, max_delay, verify_status,
+                            status_timeout)[container_id]
+
+
+def close_container(container_id, client=None, max_attempts=DEFAULT_CLOSE_MAX_ATTEMPTS, verify_status=True):
+    """
+    关闭一个 HubStudio 容器。失败时按抖动指数退避重试，并通过状态查询确认容器已关闭。
+    参数:
+        container_id (str): 要关闭的容器 ID。
+        client (HubStudioClient, optional): 使用的 API 客户端，默认为共享客户端。
+        max_attempts (int): 最大尝试次数。
+        verify_status (bool): 是否在关闭后查询 /browser/all-browser-status 确认状态。
+    返回:
+        bool: 如果成功则为 True，否则为 False。
+    """
+    client = client if client is not None else get_hubstudio_client()
+    result = _stop_container(client, container_id, max_attempts, DEFAULT_CLOSE_BACKOFF_BASE_SECONDS,
+                             DEFAULT_CLOSE_BACKOFF_MAX_SECONDS, verify_status, DEFAULT_CLOSE_STATUS_TIMEOUT_SECONDS)
+    if result['ok']:
+        print(f"HubStudio: 环境 {container_id} 关闭成功。")
+    else:
+        print(f"HubStudio: 尝试 {result['attempts']} 次后放弃关闭容器 {container_id}。")
+    return result['ok']
+
+
+def close_containers(container_ids, client=None, max_workers=DEFAULT_CLOSE_MAX_WORKERS,
+                     max_attempts=DEFAULT_CLOSE_MAX_ATTEMPTS, base_delay=DEFAULT_CLOSE_BACKOFF_BASE_SECONDS,
+                     max_delay=DEFAULT_CLOSE_BACKOFF_MAX_SECONDS, verify_status=True,
+                     status_timeout=DEFAULT_CLOSE_STATUS_TIMEOUT_SECONDS):
+    """
+    并发关闭一批 HubStudio 容器。/browser/stop 失败的容器按抖动指数退避重试；
+    状态确认对整批容器每轮只发一次 /browser/all-browser-status 查询。
+    参数:
+        container_ids (iterable): 要关闭的容器 ID。
+        client (HubStudioClient, optional): 使用的 API 客户端，默认为共享客户端。
+        max_workers (int): 同时进行的关闭请求数上限。
+        max_attempts (int): 每个容器的最大尝试次数。
+        base_delay (float): 第一次失败后的退避上限（秒），之后每次翻倍。
+        max_delay (float): 单次退避的最大上限（秒）。
+        verify_status (bool): 是否查询 /browser/all-browser-status 确认状态，而不是盲目等待。
+        status_timeout (float): stop 成功后等待容器状态变为已关闭的最长时间（秒）。
+    返回:
+        dict: 容器 ID -> {'ok', 'attempts', 'error', 'seconds'} 的结果字典。
+    """
+    client = client if client is not None else get_hubstudio_client()
+    container_ids = list(dict.fromkeys(container_ids))
+    if not container_ids:
+        return {}
+    start = time.perf_counter()
+    results = _stop_containers(client, container_ids, max_attempts, base_delay, max_delay, verify_status,
+                               status_timeout, max_workers)
+    closed = sum(1 for r in results.values() if r['ok'])
+    print(f"HubStudio: 批量关闭完成，成功 {closed}/{len(container_ids)}，耗时 {time.perf_counter() - start:.1f} 秒。")
+    return {cid: results[cid] for cid in container_ids}
+
+# --- HubStudio 批量容器调度 ---
+class ContainerFleet:
+    """
+    以有限并发批量处理 HubStudio 容器: 打开容器 -> 执行任务 -> 关闭容器。
+
+    无论任务成功、返回 False 还是抛出异常，都会释放 WebDriver 会话并关闭容器。
+    每个容器的耗时 (打开/任务/关闭/总计) 记录在结果中，stats() 给出整体吞吐量。
+    参数:
+        max_workers (int): 同时处理的容器数量上限。
+        open_func (callable, optional): 打开容器的函数，签名同 open_container，默认为 open_container。
+        close_func (callable, optional): 关闭容器的函数，签名同 close_container，默认为 close_container。
+        open_kwargs (dict, optional): 透传给 open_func 的额外参数 (例如 extension_path)。
+        client (HubStudioClient, optional): 指定时作为 client 参数传给 open_func 和 close_func
+                                            (例如指向本地的模拟 HubStudio 服务)。
+    """
+
+    def __init__(self, max_workers=DEFAULT_FLEET_MAX_WORKERS, open_func=None, close_func=None, open_kwargs=None,
+                 client=None):
+        self.max_workers = max(1, int(max_workers))
+        self._open_func = open_func if open_func is not None else open_container
+        self._close_func = close_func if close_func is not None else close_container
+        self._open_kwargs = dict(open_kwargs or {})
+        self._close_kwargs = {}
+        if client is not None:
+            self._open_kwargs.setdefault('client', client)
+            self._close_kwargs['client'] = client
+        self._lock = threading.Lock()
+        self._results = []
+        self._started_at = None
+        self._finished_at = None
+
+    def run_one(self, container_id, task):
+        """
+        处理单个容器并返回其结果记录。
+        参数:
+            container_id (str): 容器 ID。
+            task (callable): task(driver, container_id)，返回值记录为 'result'；返回 False 或抛出异常视为失败。
+        返回:
+            dict: 包含 'container_id', 'ok', 'result', 'error', 'closed',
+                  'open_seconds', 'task_seconds', 'close_seconds', 'total_seconds' 的字典。
+        """
+        record = {
+            'container_id': container_id, 'ok': False, 'result': None, 'error': None, 'closed': False,
+            'open_seconds': None, 'task_seconds': None, 'close_seconds': None, 'total_seconds': None,
+        }
+        start = time.perf_counter()
+        driver = None
+        task_start = None
+        try:
+            driver = self._open_func(container_id, **self._open_kwargs)
+            record['open_seconds'] = time.perf_counter() - start
+            if driver is None:
+                record['error'] = "打开容器失败"
+            else:
+                task_start = time.perf_counter()
+                result = task(driver, container_id)
+                record['result'] = result
+                record['ok'] = result is not False
+                if not record['ok']:
+                    record['error'] = "任务返回 False"
+        except Exception as e:
+            record['error'] = f"{type(e).__name__}: {e}"
+            print(f"HubStudio: 容器 {container_id} 的任务出错: {record['error']}")
+            traceback.print_exc(limit=2)
+        finally:
+            if task_start is not None:
+                record['task_seconds'] = time.perf_counter() - task_start
+            elif record['open_seconds'] is None:
+                record['open_seconds'] = time.perf_counter() - start
+            close_start = time.perf_counter()
+            if driver is not None:
+                _quit_driver_quietly(driver)
+            try:
+                record['closed'] = bool(self._close_func(container_id, **self._close_kwargs))
+            except Exception as e:
+                print(f"HubStudio: 清理容器 {container_id} 时出错: {e}")
+            record['close_seconds'] = time.perf_counter() - close_start
+            record['total_seconds'] = time.perf_counter() - start
+        return record
+
+    def run(self, container_ids, task, on_result=None):
+        """
+        并发处理一批容器。
+        参数:
+            container_ids (iterable): 容器 ID 列表。
+            task (callable): task(driver, container_id)，见 run_one。
+            on_result (callable, optional): 每个容器完成时以结果记录调用，便于流式处理。
+        返回:
+            list: 与 container_ids 顺序一致的结果记录列表 (见 run_one)。
+        """
+        container_ids = list(container_ids)
+        records = [None] * len(container_ids)
+        with self._lock:
+            self._results = []
+            self._started_at = time.perf_counter()
+            self._finished_at = None
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='hub-fleet') as executor:
+            futures = {executor.submit(self.run_one, cid, task): i for i, cid in enumerate(container_ids)}
+            for future in as_completed(futures):
+                record = future.result()
+                records[futures[future]] = record
+                with self._lock:
+                    self._results.append(record)
+                if on_result is not None:
+                    try:
+                        on_result(record)
+                    except Exception as e:
+                        print(f"HubStudio: on_result 回调出错 (容器 {record['container_id']}): {e}")
+        with self._lock:
+            self._finished_at = time.perf_counter()
+        return records
+
+    def stats(self):
+        """
+        返回最近一次 run 的吞吐量统计。
+        返回:
+            dict: 包含 'total', 'succeeded', 'failed', 'wall_seconds', 'containers_per_minute',
+                  以及 'avg_open_seconds', 'avg_task_seconds', 'avg_close_seconds', 'avg_total_seconds'。
+        """
+        with self._lock:
+            results = list(self._results)
+            started, finished = self._started_at, self._finished_at
+        if started is None:
+            wall = 0.0
+        else:
+            wall = (finished if finished is not None else time.perf_counter()) - started
+
+        def _avg(key):
+            values = [r[key] for r in results if r[key] is not None]
+            return sum(values) / len(values) if values else None
+
+        succeeded = sum(1 for r in results if r['ok'])
+        return {
+            'total': len(results),
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded,
+            'wall_seconds': wall,
+            'containers_per_minute': (len(results) * 60.0 / wall) if wall > 0 else None,
+            'avg_open_seconds': _avg('open_seconds'),
+            'avg_task_seconds': _avg('task_seconds'),
+            'avg_close_seconds': _avg('close_seconds'),
+            'avg_total_seconds': _avg('total_seconds'),
+        }
+
+# --- 可恢复的账户任务队列 ---
+JOB_PENDING = 'pending'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+
+class AccountJobQueue:
+    """
+    基于本地 SQLite 的持久化账户任务队列。
+
+    每个账户行是一个任务，记录状态 (pending/running/done/failed)、尝试次数、执行的容器、结果、错误和耗时。
+    任务键相同的行只会入队一次，因此中断后重新运行同一脚本 (再次 add_jobs) 不会重复已完成的账户。线程安全。
+    失败后放回 pending 的任务在 retry_delay 秒内不会被再次领取 (not_before)，避免同一 worker 立即重试。
+
+    Args:
+        db_path (str, optional): SQLite 文件路径。
+        max_attempts (int, optional): 单个任务的最大尝试次数，用完后标记为 failed。
+        retry_delay (float, optional): 失败任务再次可领取前的等待时间（秒）。
+    """
+
+    _SCHEMA = """
+        CREATE TABLE IF NOT EXISTS jobs (
+            job_key TEXT PRIMARY KEY,
+            seq INTEGER NOT NULL,
+            account TEXT NOT NULL,
+            container_id TEXT,
+            last_container TEXT,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            result TEXT,
+            error TEXT,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            seconds REAL,
+            not_before REAL
+        );
+        CREATE INDEX IF NOT EXISTS jobs_status_seq ON jobs (status, seq);
+    """
+
+    def __init__(self, db_path=DEFAULT_JOB_DB_PATH, max_attempts=DEFAULT_JOB_MAX_ATTEMPTS,
+                 retry_delay=DEFAULT_JOB_RETRY_DELAY_SECONDS):
+        self.db_path = db_path
+        self.max_attempts = max(1, int(max_attempts))
+        self.retry_delay = max(0.0, float(retry_delay))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(self._SCHEMA)
+            if 'not_before' not in [row[1] for row in self._conn.execute('PRAGMA table_info(jobs)')]:
+                self._conn.execute('ALTER TABLE jobs ADD COLUMN not_before REAL')
+
+    @staticmethod
+    def _claim_filter(container_id, busy_containers):
+        """claim/next_ready_in 共用的容器条件 (SQL 片段, 参数)。"""
+        if container_id is not None:
+            return 'AND (container_id IS NULL OR container_id = ?)', [container_id]
+        busy = list(busy_containers)
+        return f"AND container_id IS NOT NULL AND container_id NOT IN ({','.join('?' * len(busy))})", busy
+
+    @staticmethod
+    def _job_key(account, key_field):
+        if key_field is not None:
+            return str(account[key_field])
+        return hashlib.sha1(json_lib.dumps(account, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def add_jobs(self, accounts, key_field=None, container_field=None):
+        """
+        把账户行加入队列 (已存在的任务键会被忽略)。
+
+        Args:
+            accounts (iterable): 账户行，dict/CompactRow (如 get_accounts_from_file 的结果) 或 list (如表格行)。
+            key_field (str or int, optional): 作为任务键的字段 (例如 'email')；为 None 时使用整行内容的哈希。
+            container_field (str or int, optional): 指定执行容器的字段；为 None 时任务可由任意容器执行。
+
+        Returns:
+            int: 新加入的任务数。
+        """
+        added = 0
+        now = time.time()
+        with self._lock, self._conn:
+            seq = self._conn.execute('SELECT COALESCE(MAX(seq), 0) FROM jobs').fetchone()[0]
+            for account in accounts:
+                account = dict(account) if isinstance(account, Mapping) else list(account)
+                container_id = account[container_field] if container_field is not None else None
+                seq += 1
+                cursor = self._conn.execute(
+                    'INSERT OR IGNORE INTO jobs (job_key, seq, account, container_id, status, created_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?)',
+                    (self._job_key(account, key_field), seq, json_lib.dumps(account, ensure_ascii=False),
+                     container_id, JOB_PENDING, now))
+                added += cursor.rowcount
+        return added
+
+    def recover(self):
+        """把上次中断时仍为 running 的任务恢复为 pending，返回恢复的数量。"""
+        with self._lock, self._conn:
+            return self._conn.execute('UPDATE jobs SET status = ? WHERE status = ?', (JOB_PENDING, JOB_RUNNING)).rowcount
+
+    def claim(self, container_id=None, busy_containers=()):
+        """
+        领取下一个待执行任务并标记为 running。
+
+        Args:
+            container_id (str, optional): 领取者的容器；只领取未指定容器或指定为该容器的任务。
+                                          为 None 时领取任意任务，但跳过 busy_containers 中的容器的任务。
+            busy_containers (iterable): 正在被其他 worker 使用的容器。
+
+        Returns:
+            dict or None: {'job_key', 'account', 'container_id', 'attempts'}；没有可领取的任务时返回 None。
+        """
+        condition, params = self._claim_filter(container_id, busy_containers)
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                'SELECT job_key, account, container_id, attempts FROM jobs WHERE status = ? '
+                f'AND (not_before IS NULL OR not_before <= ?) {condition} ORDER BY seq LIMIT 1',
+                [JOB_PENDING, time.time()] + params).fetchone()
+            if row is None:
+                return None
+            self._conn.execute('UPDATE jobs SET status = ?, attempts = attempts + 1, started_at = ? WHERE job_key = ?',
+                               (JOB_RUNNING, time.time(), row[0]))
+        return {'job_key': row[0], 'account': json_lib.loads(row[1]), 'container_id': row[2], 'attempts': row[3] + 1}
+
+    def next_ready_in(self, container_id=None, busy_containers=()):
+        """
+        返回还需等待多少秒才有因重试延迟 (not_before) 暂不可领取的任务可以领取，参数同 claim；
+        没有这样的任务时返回 None。
+        """
+        condition, params = self._claim_filter(container_id, busy_containers)
+        with self._lock:
+            earliest = self._conn.execute(
+                f'SELECT MIN(not_before) FROM jobs WHERE status = ? AND not_before IS NOT NULL {condition}',
+                [JOB_PENDING] + params).fetchone()[0]
+        return None if earliest is None else max(0.0, earliest - time.time())
+
+    def finish(self, job_key, ok, result=None, error=None, container_id=None, seconds=None):
+        """
+        记录任务结果: 成功为 done；失败时未用完尝试次数则放回 pending (retry_delay 秒后才能再次领取)，否则为 failed。
+        container_id 记录为实际执行任务的容器 (last_container)。
+
+        Returns:
+            str: 任务的新状态。
+        """
+        with self._lock, self._conn:
+            attempts = self._conn.execute('SELECT attempts FROM jobs WHERE job_key = ?', (job_key,)).fetchone()[0]
+            status = JOB_DONE if ok else (JOB_FAILED if attempts >= self.max_attempts else JOB_PENDING)
+            now = time.time()
+            self._conn.execute(
+                'UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ?, seconds = ?, last_container = ?, '
+                'not_before = ? WHERE job_key = ?',
+                (status, json_lib.dumps(result, ensure_ascii=False, default=str) if result is not None else None,
+                 error, now, seconds, container_id,
+                 now + self.retry_delay if status == JOB_PENDING and self.retry_delay else None, job_key))
+        return status
+
+    def count_unassigned(self):
+        """返回未指定容器的待执行任务数。"""
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM jobs WHERE status = ? AND container_id IS NULL',
+                                      (JOB_PENDING,)).fetchone()[0]
+
+    def count_outside(self, container_ids):
+        """返回指定了容器、但该容器不在 container_ids 中的待执行任务数 (这些任务不会被该容器池执行)。"""
+        container_ids = list(container_ids)
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM jobs WHERE status = ? AND container_id IS NOT NULL '
+                f"AND container_id NOT IN ({','.join('?' * len(container_ids))})",
+                [JOB_PENDING] + container_ids).fetchone()[0]
+
+    def retry_failed(self):
+        """把 failed 任务重置为 pending 并清零尝试次数，返回重置的数量。"""
+        with self._lock, self._conn:
+            return self._conn.execute('UPDATE jobs SET status = ?, attempts = 0, not_before = NULL WHERE status = ?',
+                                      (JOB_PENDING, JOB_FAILED)).rowcount
+
+    def counts(self):
+        """返回各状态的任务数: {'pending', 'running', 'done', 'failed', 'total'}。"""
+        with self._lock:
+            counts = dict(self._conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status'))
+        report = {status: counts.get(status, 0) for status in (JOB_PENDING, JOB_RUNNING, JOB_DONE, JOB_FAILED)}
+        report['total'] = sum(counts.values())
+        return report
+
+    def jobs(self, status=None):
+        """
+        返回任务记录列表 (按入队顺序)。
+
+        Returns:
+            list: dict，包含 'job_key', 'account', 'container_id' (最后执行的容器), 'status', 'attempts', 'result', 'error', 'seconds'。
+        """
+        query = 'SELECT job_key, account, last_container, status, attempts, result, error, seconds FROM jobs'
+        params = ()
+        if status is not None:
+            query += ' WHERE status = ?'
+            params = (status,)
+        with self._lock:
+            rows = self._conn.execute(query + ' ORDER BY seq', params).fetchall()
+        return [{'job_key': r[0], 'account': json_lib.loads(r[1]), 'container_id': r[2], 'status': r[3],
+                 'attempts': r[4], 'result': json_lib.loads(r[5]) if r[5] is not None else None,
+                 'error': r[6], 'seconds': r[7]} for r in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class AccountJobRunner:
+    """
+    从 AccountJobQueue 领取任务，并发分派到多个 HubStudio 容器执行。
+
+    每个容器同一时间只执行一个任务，容器的打开/关闭和计时复用 ContainerFleet.run_one；
+    每个任务的结果在完成时立即写入队列，进程中断后重新 run() 会从未完成的任务继续。
+    - 传入 container_ids 时，每个容器一个 worker，领取未指定容器 (或指定为该容器) 的任务；
+    - 不传 container_ids 时，任务必须在入队时通过 container_field 指定容器，最多 max_workers 个容器并行。
+
+    Args:
+        queue (AccountJobQueue): 任务队列。
+        task (callable): task(driver, container_id, account)，返回值 (需可 JSON 序列化) 记录为结果；
+                         返回 False 或抛出异常视为失败，按队列的 max_attempts 重试。
+        container_ids (list, optional): 容器池。
+        max_workers (int, optional): 没有容器池时的并行容器数。
+        fleet (ContainerFleet, optional): 自定义打开/关闭容器方式的 ContainerFleet。
+    """
+
+    def __init__(self, queue, task, container_ids=None, max_workers=DEFAULT_FLEET_MAX_WORKERS, fleet=None):
+        self.queue = queue
+        self.task = task
+        self.container_ids = list(dict.fromkeys(container_ids)) if container_ids else []
+        self.max_workers = max(1, int(max_workers))
+        self.fleet = fleet if fleet is not None else ContainerFleet()
+        self._stop = threading.Event()
+        self._busy = set()
+        self._busy_lock = threading.Lock()
+        self._processed = 0
+        self._started_at = None
+        self._finished_at = None
+
+    def stop(self):
+        """请求停止: 正在执行的任务完成后不再领取新任务。"""
+        self._stop.set()
+
+    def _execute(self, job, container_id, on_result):
+        record = self.fleet.run_one(container_id, lambda driver, cid: self.task(driver, cid, job['account']))
+        status = self.queue.finish(job['job_key'], record['ok'], record['result'], record['error'],
+                                   container_id=container_id, seconds=record['total_seconds'])
+        with self._busy_lock:
+            self._processed += 1
+        if status == JOB_FAILED:
+            print(f"HubStudio: 任务 {job['job_key']} 已失败 {job['attempts']} 次，不再重试: {record['error']}")
+        if on_result is not None:
+            try:
+                on_result(dict(job, status=status, record=record))
+            except Exception as e:
+                print(f"HubStudio: on_result 回调出错 (任务 {job['job_key']}): {e}")
+
+    def _pool_worker(self, container_id, on_result):
+        while not self._stop.is_set():
+            job = self.queue.claim(container_id=container_id)
+            if job is None:
+                # 只剩下重试延迟中的任务时等待，而不是立即退出或立即重试刚失败的任务
+                wait_seconds = self.queue.next_ready_in(container_id=container_id)
+                if wait_seconds is None:
+                    return
+                self._stop.wait(min(max(wait_seconds, 0.05), 1.0))
+                continue
+            self._execute(job, container_id, on_result)
+
+    def _assigned_worker(self, on_result):
+        while not self._stop.is_set():
+            with self._busy_lock:
+                job = self.queue.claim(busy_containers=self._busy)
+                if job is not None:
+                    self._busy.add(job['container_id'])
+            if job is None:
+                with self._busy_lock:
+                    idle = not self._busy
+                if idle and self.queue.next_ready_in() is None:
+                    return
+                time.sleep(0.2) # 剩余任务的容器都在被其他 worker 使用，或还在重试延迟中
+                continue
+            try:
+                self._execute(job, job['container_id'], on_result)
+            finally:
+                with self._busy_lock:
+                    self._busy.discard(job['container_id'])
+
+    def run(self, on_result=None):
+        """
+        执行队列中所有待执行的任务 (先把上次中断时的 running 任务恢复为 pending)。
+
+        Args:
+            on_result (callable, optional): 每个任务完成时调用，参数为任务字典 (含 'status' 和 ContainerFleet 的 'record')。
+
+        Returns:
+            dict: stats() 的结果。
+        """
+        recovered = self.queue.recover()
+        if recovered:
+            print(f"HubStudio: 恢复了 {recovered} 个上次中断的任务。")
+        if self.container_ids:
+            outside = self.queue.count_outside(self.container_ids)
+            if outside:
+                print(f"HubStudio: 警告: {outside} 个任务指定的容器不在 container_ids 中，本次运行不会执行。")
+        self._stop.clear()
+        self._processed = 0
+        self._started_at = time.perf_counter()
+        self._finished_at = None
+        if self.container_ids:
+            workers = [(self._pool_worker, (cid, on_result)) for cid in self.container_ids]
+        else:
+            workers = [(self._assigned_worker, (on_result,)) for _ in range(self.max_workers)]
+        with ThreadPoolExecutor(max_workers=len(workers), thread_name_prefix='hub-jobs') as executor:
+            futures = [executor.submit(func, *args) for func, args in workers]
+            for future in as_completed(futures):
+                future.result()
+        self._finished_at = time.perf_counter()
+        if not self.container_ids:
+            unassigned = self.queue.count_unassigned()
+            if unassigned:
+                print(f"HubStudio: 警告: {unassigned} 个任务没有指定容器，需要传入 container_ids 才能执行。")
+        return self.stats()
+
+    def stats(self):
+        """
+        返回队列计数和本次运行的吞吐量。
+
+        Returns:
+            dict: 队列各状态计数 (见 AccountJobQueue.counts)，以及 'processed', 'wall_seconds', 'jobs_per_minute'。
+        """
+        stats = self.queue.counts()
+        if self._started_at is None:
+            wall = 0.0
+        else:
+            wall = (self._finished_at if self._finished_at is not None else time.perf_counter()) - self._started_at
+        stats['processed'] = self._processed
+        stats['wall_seconds'] = wall
+        stats['jobs_per_minute'] = (self._processed * 60.0 / wall) if wall > 0 else None
+        return stats
+
+
+# --- Selenium WebDriver 操作函数 ---
+
+_implicit_waits = weakref.WeakKeyDictionary()
+
+
+def _ensure_implicit_wait(driver, seconds):
+    """仅在隐式等待时间变化时才调用 implicitly_wait，避免每次导航多一次往返。"""
+    if _implicit_waits.get(driver) != seconds:
+        driver.implicitly_wait(seconds)
+        _implicit_waits[driver] = seconds
+
+
+_script_timeouts = weakref.WeakKeyDictionary()
+
+
+def _ensure_script_timeout(driver, seconds):
+    """仅在需要更长的异步脚本超时时才调用 set_script_timeout，避免每次调用都多一次往返。"""
+    current = _script_timeouts.get(driver)
+    if current is None or current < seconds:
+        driver.set_script_timeout(seconds)
+        _script_timeouts[driver] = seconds
+
+
+# 资源类型 -> URL 匹配模式。chromedriver 的 executeCdpCommand 无法接收 Fetch.requestPaused 事件，
+# 因此资源类型拦截通过 Network.setBlockedURLs 的扩展名模式实现。
+_RESOURCE_TYPE_URL_PATTERNS = {
+    'Image': ['*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.avif', '*.svg', '*.ico', '*.bmp'],
+    'Media': ['*.mp4', '*.webm', '*.ogg', '*.mp3', '*.wav', '*.m4a', '*.m3u8', '*.ts'],
+    'Font': ['*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot'],
+    'Stylesheet': ['*.css'],
+}
+
+# 导航完成后统计本次页面已传输的字节数 (跨域资源未设置 Timing-Allow-Origin 时 transferSize 为 0，结果偏小)
+_PAGE_TRANSFER_STATS_JS = """
+const nav = performance.getEntriesByType('navigation')[0];
+const resources = performance.getEntriesByType('resource');
+let bytes = nav ? (nav.transferSize || 0) : 0;
+for (const r of resources) { bytes += r.transferSize || 0; }
+return {bytes: bytes, resources: resources.length};
+"""
+
+_WAIT_READY_STATE_JS = """
+const done = arguments[arguments.length - 1];
+const target = arguments[0];
+const ready = () => target === 'interactive' ? document.readyState !== 'loading' : document.readyState === 'complete';
+if (ready()) { done(true); }
+else { document.addEventListener('readystatechange', () => { if (ready()) done(true); }); }
+"""
+
+_blocked_patterns_by_driver = weakref.WeakKeyDictionary()
+_load_stats = {}
+_load_stats_lock = threading.Lock()
+
+
+def get_load_profile(name=None):
+    """
+    返回加载配置字典 (page_load_strategy, block_resource_types, block_url_patterns)。
+    参数:
+        name (str, optional): 配置名，默认为 DEFAULT_LOAD_PROFILE。
+    返回:
+        dict: 加载配置；未知的配置名会抛出 ValueError。
+    """
+    name = name or DEFAULT_LOAD_PROFILE
+    if name not in LOAD_PROFILES:
+        raise ValueError(f"未知的加载配置 '{name}'，可选: {', '.join(LOAD_PROFILES)}")
+    profile = LOAD_PROFILES[name]
+    return {
+        'page_load_strategy': profile.get('page_load_strategy', 'normal'),
+        'block_resource_types': list(profile.get('block_resource_types', [])),
+        'block_url_patterns': list(profile.get('block_url_patterns', [])),
+    }
+
+
+def _execute_cdp(driver, cmd, params=None):
+    """执行 CDP 命令，兼容 webdriver.Chrome 与通过共享 chromedriver 连接的 webdriver.Remote。"""
+    if hasattr(driver, 'execute_cdp_cmd'):
+        return driver.execute_cdp_cmd(cmd, params or {})
+    return driver.execute('executeCdpCommand', {'cmd': cmd, 'params': params or {}})['value']
+
+
+def _apply_blocked_urls(driver, profile):
+    patterns = list(profile['block_url_patterns'])
+    for resource_type in profile['block_resource_types']:
+        patterns.extend(_RESOURCE_TYPE_URL_PATTERNS.get(resource_type, []))
+    # 拦截规则作用于当前标签页，只要本次或上一次有规则就重新下发，避免切换标签后规则失效
+    if not patterns and not _blocked_patterns_by_driver.get(driver):
+        return
+    _execute_cdp(driver, 'Network.enable')
+    _execute_cdp(driver, 'Network.setBlockedURLs', {'urls': patterns})
+    _blocked_patterns_by_driver[driver] = patterns
+
+
+def _navigate(driver, url, strategy, timeout):
+    """按指定的加载策略导航。与会话的 pageLoadStrategy 不同时通过 CDP 导航并自行等待 readyState。"""
+    session_strategy = (getattr(driver, 'capabilities', None) or {}).get('pageLoadStrategy', 'normal')
+    if strategy == session_strategy:
+        driver.get(url)
+        return
+    _execute_cdp(driver, 'Page.navigate', {'url': url})
+    if strategy != 'none':
+        _ensure_script_timeout(driver, timeout + SCRIPT_TIMEOUT_MARGIN_SECONDS)
+        driver.execute_async_script(_WAIT_READY_STATE_JS, 'interactive' if strategy == 'eager' else 'complete')
+
+
+def _record_load(profile_name, seconds, transfer):
+    with _load_stats_lock:
+        stats = _load_stats.setdefault(profile_name, {'loads': 0, 'seconds_total': 0.0, 'bytes_total': 0, 'measured': 0})
+        stats['loads'] += 1
+        stats['seconds_total'] += seconds
+        if transfer is not None:
+            stats['bytes_total'] += int(transfer.get('bytes') or 0)
+            stats['measured'] += 1
+
+
+def get_load_profile_stats(baseline='full'):
+    """
+    返回各加载配置的导航统计，以及相对于基准配置 (默认 'full') 平均每次节省的时间和字节数。
+    返回:
+        dict: 配置名 -> {'loads', 'avg_seconds', 'avg_bytes', 'saved_seconds_per_load', 'saved_bytes_per_load'}。
+              基准配置在本进程中尚无数据时，节省量为 None。
+    """
+    with _load_stats_lock:
+        snapshot = {name: dict(stats) for name, stats in _load_stats.items()}
+    report = {}
+    for name, stats in snapshot.items():
+        report[name] = {
+            'loads': stats['loads'],
+            'avg_seconds': stats['seconds_total'] / stats['loads'] if stats['loads'] else None,
+            'avg_bytes': stats['bytes_total'] / stats['measured'] if stats['measured'] else None,
+        }
+    base = report.get(baseline)
+    for name, entry in report.items():
+        entry['saved_seconds_per_load'] = None
+        entry['saved_bytes_per_load'] = None
+        if base is not None:
+            if base['avg_seconds'] is not None and entry['avg_seconds'] is not None:
+                entry['saved_seconds_per_load'] = base['avg_seconds'] - entry['avg_seconds']
+            if base['avg_bytes'] is not None and entry['avg_bytes'] is not None:
+                entry['saved_bytes_per_load'] = base['avg_bytes'] - entry['avg_bytes']
+    return report
+
+
+def open_url(driver, url, wait_time=DEFAULT_IMPLICIT_WAIT, load_profile=None):
+    """
+    让 WebDriver 导航到给定的 URL。
+    参数:
+        driver: Selenium WebDriver 实例。
+        url (str): 要打开的 URL。
+        wait_time (int): 会话的隐式等待时间 (仅在与当前值不同时设置)。
+                         本模块的元素辅助函数使用页面内事件等待，不受隐式等待影响。
+        load_profile (str, optional): 加载配置名 (见 config.json 的 Selenium.load_profiles)，
+                                      决定加载策略 (normal/eager/none) 和要拦截的资源，默认为 DEFAULT_LOAD_PROFILE。
+    """
+    try:
+        profile_name = load_profile or DEFAULT_LOAD_PROFILE
+        profile = get_load_profile(profile_name)
+        _apply_blocked_urls(driver, profile)
+        start = time.perf_counter()
+        _navigate(driver, url, profile['page_load_strategy'], DEFAULT_EXPLICIT_WAIT_TIMEOUT)
+        seconds = time.perf_counter() - start
+        transfer = None
+        if COLLECT_LOAD_STATS:
+            try:
+                transfer = driver.execute_script(_PAGE_TRANSFER_STATS_JS)
+            except Exception:
+                pass
+        _record_load(profile_name, seconds, transfer)
+        _ensure_implicit_wait(driver, wait_time)
+    except Exception as e:
+        print(f"打开 URL {url} 时出错: {e}")
+
+def _new_tab_handle(driver):
+    """用一次 W3C New Window 命令创建新标签页并直接返回其句柄 (不切换焦点、不重新查询 window_handles)。"""
+    return driver.execute(Command.NEW_WINDOW, {'type': 'tab'})['value']['handle']
+
+
+def _close_handle(driver, handle):
+    """
+    关闭指定句柄的标签页。优先通过 CDP Target.closeTarget 直接关闭 (chromedriver 的窗口句柄即目标 ID)，
+    无需先切换过去；失败时退回到 切换 + close。
+    返回:
+        bool: 关闭后焦点是否可能已改变 (走了切换路径)。
+    """
+    try:
+        _execute_cdp(driver, 'Target.closeTarget', {'targetId': handle.replace('CDwindow-', '')})
+        return False
+    except Exception:
+        driver.switch_to.window(handle)
+        driver.close()
+        return True
+
+
+class TabPool:
+    """
+    单个 WebDriver 的预热标签页池。
+
+    预先打开固定数量的标签页，acquire() 时直接切换到空闲标签，release() 时导航到 about:blank 回收而不是关闭；
+    句柄和当前焦点都在本地记录，不需要反复查询 window_handles。通常通过 get_tab_pool(driver) 获取。
+    参数:
+        driver: Selenium WebDriver 实例。
+        size (int): 预热的标签页数量。池耗尽时 acquire() 会临时多开标签，这些标签在 release() 时关闭。
+    """
+
+    def __init__(self, driver, size=DEFAULT_TAB_POOL_SIZE):
+        self.driver = driver
+        self.size = max(0, int(size))
+        self.home_handle = driver.current_window_handle
+        self._current = self.home_handle
+        self._free = deque()
+        self._busy = set()
+        self._lock = threading.Lock()
+        for _ in range(self.size):
+            self._free.append(_new_tab_handle(driver))
+
+    @property
+    def handles(self):
+        """池中所有标签页的句柄 (不含 home_handle)。"""
+        with self._lock:
+            return list(self._free) + list(self._busy)
+
+    def switch_to(self, handle, force=False):
+        """
+        切换到指定标签页；本地记录显示已经在该标签上时不发送任何命令。
+        外部代码可能直接调用 driver.switch_to.window 而不经过池，本地记录因此可能过期；
+        接下来的操作必须作用在该标签上时 (如 acquire/release) 使用 force=True 总是发送切换命令。
+        """
+        if force or self._current != handle:
+            self.driver.switch_to.window(handle)
+            self._current = handle
+
+    def mark_current(self, handle):
+        """记录外部代码已经切换到的标签页句柄 (外部代码直接调用 driver.switch_to.window 之后)。"""
+        self._current = handle
+
+    def state_of(self, handle):
+        """返回句柄在池中的状态：'home'、'free' 或 'busy'；不属于该池时返回 None。"""
+        if handle == self.home_handle:
+            return 'home'
+        with self._lock:
+            if handle in self._busy:
+                return 'busy'
+            if handle in self._free:
+                return 'free'
+        return None
+
+    def acquire(self, url=None, wait_time=DEFAULT_IMPLICIT_WAIT, load_profile=None):
+        """
+        取出一个空闲标签页并切换过去，可选地直接打开 URL。
+        返回:
+            str: 标签页句柄。
+        """
+        with self._lock:
+            handle = self._free.popleft() if self._free else None
+        if handle is None:
+            handle = _new_tab_handle(self.driver)
+        with self._lock:
+            self._busy.add(handle)
+        self.switch_to(handle, force=True)
+        if url:
+            open_url(self.driver, url, wait_time, load_profile=load_profile)
+        return handle
+
+    def release(self, handle):
+        """把标签页导航到 about:blank 并放回池中；超出池大小的临时标签直接关闭。"""
+        with self._lock:
+            self._busy.discard(handle)
+            keep = len(self._free) < self.size
+        try:
+            if keep:
+                # 必须确保 about:blank 导航发生在要回收的标签上，不能只依赖本地记录的焦点
+                self.switch_to(handle, force=True)
+                self.driver.get('about:blank')
+                with self._lock:
+                    self._free.append(handle)
+            else:
+                if _close_handle(self.driver, handle) or self._current == handle:
+                    self._current = None
+        except Exception as e:
+            print(f"回收标签页 {handle} 时出错: {e}")
+            self.forget(handle)
+
+    def forget(self, handle):
+        """从池中移除一个已经被外部关闭的句柄。"""
+        with self._lock:
+            self._busy.discard(handle)
+            try:
+                self._free.remove(handle)
+            except ValueError:
+                pass
+        if self._current == handle:
+            self._current = None
+
+    def close(self):
+        """关闭池中所有标签页并切换回 home_handle。"""
+        for handle in self.handles:
+            try:
+                _close_handle(self.driver, handle)
+            except Exception:
+                pass
+            self.forget(handle)
+        try:
+            self.driver.switch_to.window(self.home_handle)
+            self._current = self.home_handle
+        except Exception as e:
+            print(f"切换回主标签页时出错: {e}")
+
+
+_tab_pools = weakref.WeakKeyDictionary()
+
+
+def get_tab_pool(driver, size=DEFAULT_TAB_POOL_SIZE):
+    """
+    返回该 WebDriver 的标签页池，首次调用时创建并预热。之后 open_new_page 会从池中取标签页。
+    参数:
+        driver: Selenium WebDriver 实例。
+        size (int): 首次创建时预热的标签页数量。
+    返回:
+        TabPool: 该 WebDriver 的标签页池。
+    """
+    pool = _tab_pools.get(driver)
+    if pool is None:
+        pool = TabPool(driver, size)
+        _tab_pools[driver] = pool
+    return pool
+
+
+def open_new_page(driver, url, wait_time=DEFAULT_IMPLICIT_WAIT, load_profile=None):
+    """
+    在新标签页/窗口中打开一个 URL 并将焦点切换到它。
+    如果该 WebDriver 已通过 get_tab_pool 创建了标签页池，则从池中取出预热的标签页。
+    参数:
+        driver: Selenium WebDriver 实例。
+        url (str): 要在新标签页中打开的 URL。
+        wait_time (int): 隐式等待时间。
+        load_profile (str, optional): 加载配置名，见 open_url。
+    返回:
+        str or None: 新页面的窗口句柄，如果出错则为 None。
+    """
+    try:
+        pool = _tab_pools.get(driver)
+        if pool is not None:
+            return pool.acquire(url, wait_time, load_profile=load_profile)
+        new_window_handle = _new_tab_handle(driver)
         driver.switch_to.window(new_window_handle)
-        open_url(driver, url, wait_time)
+        open_url(driver, url, wait_time, load_profile=load_profile)
         return new_window_handle
     except Exception as e:
         print(f"为 {url} 打开新页面时出错: {e}")
@@ -309,6 +2185,9 @@ def open_new_page(driver, url, wait_time=10):
 def close_other_windows(driver, keep_handle):
     """
     关闭除 keep_handle 指定的窗口外的所有浏览器窗口。
+    标签页通过 CDP 直接关闭，无需逐个切换；最后只切换一次回到 keep_handle。
+    如果该 WebDriver 有标签页池，池的主标签页和空闲的预热标签页保持打开，
+    正在使用的池标签页通过 release() 回收到池中而不是关闭。
     参数:
         driver: Selenium WebDriver 实例。
         keep_handle (str): 要保持打开的页面的窗口句柄。
@@ -316,16 +2195,25 @@ def close_other_windows(driver, keep_handle):
     try:
         all_handles = driver.window_handles
         if len(all_handles) > 1:
+            pool = _tab_pools.get(driver)
             for handle in all_handles:
-                if handle != keep_handle:
-                    driver.switch_to.window(handle)
-                    driver.close()
-            driver.switch_to.window(keep_handle) # 确保焦点在保留的窗口上
+                if handle == keep_handle:
+                    continue
+                state = pool.state_of(handle) if pool is not None else None
+                if state == 'busy':
+                    pool.release(handle)
+                elif state is None:
+                    _close_handle(driver, handle)
+            # release() 可能切换过标签页，因此总是切换回保留的窗口
+            if pool is not None:
+                pool.switch_to(keep_handle, force=True)
+            else:
+                driver.switch_to.window(keep_handle)
     except Exception as e:
         print(f"关闭其他窗口时出错: {e}")
 
 
-def fill_input_field(driver, xpath, text_to_fill, clear_first=True):
+def fill_input_field(driver, xpath, text_to_fill, clear_first=True, timeout=DEFAULT_EXPLICIT_WAIT_TIMEOUT):
     """
     通过 XPath 找到一个输入字段并用文本填充它。
     参数:
@@ -333,13 +2221,12 @@ def fill_input_field(driver, xpath, text_to_fill, clear_first=True):
         xpath (str): 输入字段的 XPath。
         text_to_fill (str): 要输入到字段中的文本。
         clear_first (bool): 是否在发送键之前清除字段。
+        timeout (float): 等待元素出现的最长时间（秒）。
     返回:
         bool: 如果成功则为 True，否则为 False。
     """
     try:
-        element = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.XPATH, xpath))
-        )
+        element = _require_element(driver, xpath, 'present', timeout)
         if clear_first:
             element.clear()
         element.send_keys(text_to_fill)
@@ -348,20 +2235,19 @@ def fill_input_field(driver, xpath, text_to_fill, clear_first=True):
         print(f"填充输入字段 (XPath: {xpath}) 时出错，内容 '{text_to_fill}': {e}")
         return False
 
-def select_dropdown_option_by_index(driver, xpath, index):
+def select_dropdown_option_by_index(driver, xpath, index, timeout=DEFAULT_EXPLICIT_WAIT_TIMEOUT):
     """
     通过索引在下拉列表中选择一个选项。
     参数:
         driver: Selenium WebDriver 实例。
         xpath (str): select (下拉) 元素的 XPath。
         index (int): 要选择的选项的基于 0 的索引。
+        timeout (float): 等待元素出现的最长时间（秒）。
     返回:
         str or None: 所选选项的文本，如果失败则为 None。
     """
     try:
-        element = WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.XPATH, xpath))
-        )
+        element = _require_element(driver, xpath, 'present', timeout)
         select = Select(element)
         select.select_by_index(index)
         selected_option_text = select.first_selected_option.text
@@ -370,70 +2256,553 @@ def select_dropdown_option_by_index(driver, xpath, index):
         print(f"按索引选择下拉选项时出错 (XPath: {xpath}, 索引: {index}): {e}")
         return None
 
-def click_element(driver, xpath):
+def click_element(driver, xpath, timeout=DEFAULT_EXPLICIT_WAIT_TIMEOUT):
     """
     通过 XPath 找到一个元素并点击它。
     参数:
         driver: Selenium WebDriver 实例。
         xpath (str): 要点击的元素的 XPath。
+        timeout (float): 等待元素可点击的最长时间（秒）。
     返回:
         bool: 如果成功则为 True，否则为 False。
     """
     try:
-        element = WebDriverWait(driver, 10).until(
-            EC.element_to_be_clickable((By.XPATH, xpath))
-        )
+        element = _require_element(driver, xpath, 'clickable', timeout)
         element.click()
         return True
     except Exception as e:
         print(f"点击元素 (XPath: {xpath}) 时出错: {e}")
         return False
 
-# --- 外部 API 函数 ---
-def get_verification_code_from_api(email, api_url=GET_CODE_API_URL_DEFAULT, timeout=10):
+# --- 页面内事件驱动的元素等待 ---
+# 页面内执行的等待脚本: (xpath, condition, timeoutMs, fallbackPollMs) => Promise<Element|null>。
+# 由 MutationObserver 在 DOM 变化时触发检查 (用 requestAnimationFrame 合并同一帧内的多次变化)，
+# 条件满足的瞬间即返回。'visible'/'clickable' 还依赖布局和样式，且后台标签页中 rAF 会被暂停，
+# 因此额外保留一个低频的 setTimeout 兜底检查。
+_WAIT_FOR_XPATH_JS = r"""
+(xpath, condition, timeoutMs, fallbackPollMs) => new Promise((resolve) => {
+  const lookup = () => document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+  const isVisible = (el) => {
+    const rect = el.getBoundingClientRect();
+    if (rect.width === 0 && rect.height === 0) return false;
+    const style = window.getComputedStyle(el);
+    return style.visibility !== 'hidden' && style.display !== 'none';
+  };
+  const check = () => {
+    const el = lookup();
+    if (!el) return null;
+    if (condition === 'present') return el;
+    if (!isVisible(el)) return null;
+    if (condition === 'clickable' && (el.disabled || el.getAttribute('aria-disabled') === 'true')) return null;
+    return el;
+  };
+  let settled = false, frame = null, observer = null, poller = null, timer = null;
+  const finish = (el) => {
+    if (settled) return;
+    settled = true;
+    if (observer) observer.disconnect();
+    if (frame !== null) cancelAnimationFrame(frame);
+    clearInterval(poller);
+    clearTimeout(timer);
+    resolve(el);
+  };
+  const schedule = () => {
+    if (frame !== null || settled) return;
+    frame = requestAnimationFrame(() => { frame = null; const el = check(); if (el) finish(el); });
+  };
+  const first = check();
+  if (first) { finish(first); return; }
+  observer = new MutationObserver(schedule);
+  observer.observe(document.documentElement || document, {childList: true, subtree: true, attributes: true, characterData: false});
+  poller = setInterval(() => { const el = check(); if (el) finish(el); }, fallbackPollMs);
+  timer = setTimeout(() => finish(null), timeoutMs);
+})
+"""
+
+WAIT_CONDITIONS = ('present', 'visible', 'clickable')
+
+
+def wait_for_element(driver, xpath, condition='present', timeout=DEFAULT_EXPLICIT_WAIT_TIMEOUT):
     """
-    调用 API (例如 Google Apps Script) 来获取电子邮件的验证码。
+    在页面内等待 XPath 对应的元素满足条件，满足的瞬间返回 (一次 execute_async_script 调用)。
     参数:
-        email (str): 要获取验证码的电子邮件地址。
-        api_url (str): 验证码 API 的 URL。
-        timeout (int): 请求超时时间（秒）。
+        driver: Selenium WebDriver 实例。
+        xpath (str): 元素的 XPath。
+        condition (str): 'present' (存在于 DOM), 'visible' (可见) 或 'clickable' (可见且未禁用)。
+        timeout (float): 最长等待时间（秒），默认取 config.json 中 Selenium.default_explicit_wait_timeout。
     返回:
-        dict or None: API 的 JSON 响应 (预计包含 'code')，如果失败则为 None。
+        WebElement or None: 找到的元素，超时或出错时为 None。
     """
-    if not api_url or not email:
-        print("错误: get_verification_code_from_api 的 API URL 和 email 不能为空。")
+    if condition not in WAIT_CONDITIONS:
+        raise ValueError(f"未知的等待条件 '{condition}'，可选: {', '.join(WAIT_CONDITIONS)}")
+    try:
+        _ensure_script_timeout(driver, timeout + SCRIPT_TIMEOUT_MARGIN_SECONDS)
+        return driver.execute_async_script(
+            f"const done = arguments[arguments.length - 1];"
+            f"({_WAIT_FOR_XPATH_JS})(arguments[0], arguments[1], arguments[2], arguments[3]).then(done);",
+            xpath, condition, int(timeout * 1000), int(WAIT_FALLBACK_POLL_MS))
+    except Exception as e:
+        print(f"等待元素 (XPath: {xpath}, 条件: {condition}) 时出错: {e}")
         return None
 
-    params = {'email': email}
+
+def _require_element(driver, xpath, condition, timeout):
+    element = wait_for_element(driver, xpath, condition, timeout)
+    if element is None:
+        raise TimeoutException(f"{timeout} 秒内元素未满足条件 '{condition}'")
+    return element
+
+# --- 批量表单填写 ---
+# 页面内执行的批量表单脚本: (steps, timeoutMs) => Promise<results>。
+# 逐步解析 XPath (元素尚未出现时用 _WAIT_FOR_XPATH_JS 在 timeoutMs 内等待)，执行动作并派发 input/change 事件。
+# 赋值时使用原型上的原生 value setter，使 React/Vue 等框架的受控组件也能感知到变化。
+_FILL_FORM_JS = r"""
+(steps, timeoutMs, stopOnError) => {
+  const lookup = (xpath) => document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue;
+  const waitFor = (xpath) => (__WAIT_FOR_XPATH__)(xpath, 'present', timeoutMs, __FALLBACK_POLL_MS__);
+  const fire = (el, type) => el.dispatchEvent(new Event(type, {bubbles: true}));
+  const setNativeValue = (el, value) => {
+    const proto = Object.getPrototypeOf(el);
+    const desc = Object.getOwnPropertyDescriptor(proto, 'value');
+    if (desc && desc.set) { desc.set.call(el, value); } else { el.value = value; }
+  };
+  const selectOption = (el, predicate) => {
+    const options = Array.from(el.options || []);
+    const i = options.findIndex(predicate);
+    if (i < 0) throw new Error('未找到匹配的选项');
+    el.selectedIndex = i;
+    fire(el, 'input'); fire(el, 'change');
+    return options[i].text;
+  };
+  const run = async () => {
+    const results = [];
+    let failed = false;
+    for (const [xpath, action, value] of steps) {
+      const result = {xpath: xpath, action: action, ok: false, value: null, error: null};
+      results.push(result);
+      if (failed && stopOnError) { result.error = '已跳过 (前面的步骤失败)'; continue; }
+      try {
+        const el = await waitFor(xpath);
+        if (!el) throw new Error(timeoutMs + ' 毫秒内未找到元素');
+        el.scrollIntoView({block: 'center'});
+        if (action === 'fill') {
+          el.focus();
+          setNativeValue(el, value == null ? '' : String(value));
+          fire(el, 'input'); fire(el, 'change');
+          el.blur();
+          result.value = el.value;
+        } else if (action === 'click') {
+          el.click();
+        } else if (action === 'check') {
+          if (el.checked !== !!value) el.click();
+          result.value = el.checked;
+        } else if (action === 'select_index') {
+          const options = Array.from(el.options || []);
+          if (value < 0 || value >= options.length) throw new Error('选项索引越界');
+          result.value = selectOption(el, (o, i) => i === value);
+        } else if (action === 'select_value') {
+          result.value = selectOption(el, (o) => o.value === String(value));
+        } else if (action === 'select_text') {
+          result.value = selectOption(el, (o) => o.text.trim() === String(value).trim());
+        } else {
+          throw new Error('未知动作: ' + action);
+        }
+        result.ok = true;
+      } catch (e) {
+        result.error = String(e && e.message ? e.message : e);
+        failed = true;
+      }
+    }
+    return results;
+  };
+  return run();
+}
+""".replace('__WAIT_FOR_XPATH__', _WAIT_FOR_XPATH_JS).replace('__FALLBACK_POLL_MS__', str(int(WAIT_FALLBACK_POLL_MS)))
+
+FORM_ACTIONS = ('fill', 'click', 'check', 'select_index', 'select_value', 'select_text')
+
+def _normalize_form_steps(steps):
+    normalized = []
+    for step in steps:
+        xpath, action = step[0], step[1]
+        value = step[2] if len(step) > 2 else None
+        if action not in FORM_ACTIONS:
+            raise ValueError(f"未知的表单动作 '{action}'，可选: {', '.join(FORM_ACTIONS)}")
+        if action == 'select_index':
+            value = int(value)
+        normalized.append([xpath, action, value])
+    return normalized
+
+
+def fill_form(driver, steps, timeout=DEFAULT_EXPLICIT_WAIT_TIMEOUT, stop_on_error=True):
+    """
+    用一次 execute_async_script 按顺序完成整张表单的填写、选择和点击。
+    参数:
+        driver: Selenium WebDriver 实例。
+        steps (list): (xpath, action, value) 元组列表。action 可为:
+                      'fill' (填入文本), 'click' (点击，value 可省略), 'check' (设置复选框为 bool(value)),
+                      'select_index', 'select_value', 'select_text' (选择下拉选项)。
+        timeout (float): 每一步等待元素出现的最长时间（秒）。
+        stop_on_error (bool): 某一步失败后是否跳过后续步骤。
+    返回:
+        list: 每一步的结果字典，包含 'xpath', 'action', 'ok', 'value' (填入后的值/所选选项文本), 'error'。
+              如果脚本本身执行失败，则所有步骤都标记为失败。
+    """
     try:
-        response = requests.get(api_url, params=params, timeout=timeout)
-        response.raise_for_status()  # 对于错误的响应 (4xx 或 5xx) 抛出 HTTPError
-        
-        data = response.json()
-        print(f"邮箱 {email} 的 API 响应: {data}")
-        return data
-    except requests.exceptions.Timeout:
-        print(f"错误: 从 API ({api_url}) 请求 {email} 的验证码超时。")
-    except requests.exceptions.HTTPError as e:
-        print(f"错误: 来自 API ({api_url}) 的 HTTP 错误，邮箱 {email}: {e.response.status_code} - {e.response.text}")
-    except requests.exceptions.RequestException as e:
-        print(f"错误: API ({api_url}) 请求异常，邮箱 {email}: {e}")
-    except json.JSONDecodeError:
-        print(f"错误: 无法解码来自 API ({api_url}) 的 JSON 响应。响应文本: {response.text}")
+        normalized = _normalize_form_steps(steps)
+    except (ValueError, TypeError, IndexError) as e:
+        print(f"批量填写表单的步骤无效: {e}")
+        return [{'xpath': None, 'action': None, 'ok': False, 'value': None, 'error': str(e)}]
+    if not normalized:
+        return []
+    try:
+        _ensure_script_timeout(driver, timeout * len(normalized) + SCRIPT_TIMEOUT_MARGIN_SECONDS)
+        results = driver.execute_async_script(
+            f"const done = arguments[arguments.length - 1];"
+            f"({_FILL_FORM_JS})(arguments[0], arguments[1], arguments[2]).then(done, (e) => done([{{error: String(e)}}]));",
+            normalized, int(timeout * 1000), bool(stop_on_error))
     except Exception as e:
-        print(f"获取 {email} 验证码时发生意外错误: {e}")
-    return None
+        print(f"批量填写表单时出错: {e}")
+        return [{'xpath': x, 'action': a, 'ok': False, 'value': None, 'error': str(e)} for x, a, _ in normalized]
+    for result in results:
+        if not result.get('ok'):
+            print(f"表单步骤失败 (XPath: {result.get('xpath')}, 动作: {result.get('action')}): {result.get('error')}")
+    return results
 
-# --- EVM Wallet 函数 ---
-def generate_evm_wallet():
-    """
-    生成一个新的 EVM 兼容钱包 (地址、私钥、助记词)。
-    启用 HD Wallet 功能以生成助记词。
+# --- CDP 直连驱动 (无需 chromedriver) ---
+# 可选依赖: pip install websockets
+_XPATH_LOOKUP_JS = "document.evaluate({xpath}, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null).singleNodeValue"
 
-    Returns:
-        dict or None: 包含 'address', 'private_key', 'mnemonic' 的字典，
-                      如果发生错误则返回 None。
-    """
+
+class CdpError(Exception):
+    """CDP 命令返回错误或页面内脚本抛出异常。"""
+
+
+def _import_websockets():
+    try:
+        import websockets
+    except ImportError:
+        raise ImportError("CDP 直连驱动需要 websockets 库: pip install websockets")
+    return websockets
+
+
+def _fetch_cdp_targets(host, debugging_port, timeout):
+    response = requests.get(f'http://{host}:{debugging_port}/json/list', timeout=timeout)
+    return response.json()
+
+
+class CdpPage:
+    """
+    通过 Chrome DevTools Protocol websocket 直接控制一个页面标签，不经过 Selenium/chromedriver。
+
+    所有操作均为协程，一个事件循环可同时驱动多个容器。提供与 Selenium 辅助函数相同的操作:
+    open_url, fill_input_field, click_element, select_dropdown_option_by_index。
+    通常通过 CdpPage.connect(debugging_port) 或 open_container_cdp(container_id) 创建。
+    参数:
+        ws_url (str): 页面目标的 webSocketDebuggerUrl。
+        command_timeout (float): 单个 CDP 命令的超时时间（秒）。
+    """
+
+    def __init__(self, ws_url, command_timeout=DEFAULT_EXPLICIT_WAIT_TIMEOUT):
+        self.ws_url = ws_url
+        self.command_timeout = command_timeout
+        self._ws = None
+        self._reader = None
+        self._next_id = 0
+        self._pending = {}
+        self._event_waiters = {}
+        self._page_enabled = False
+        self._disconnect_error = None
+
+    @classmethod
+    async def connect(cls, debugging_port, host='127.0.0.1', command_timeout=DEFAULT_EXPLICIT_WAIT_TIMEOUT):
+        """
+        连接到指定调试端口上的第一个普通页面标签。
+        参数:
+            debugging_port (int): 浏览器的远程调试端口 (open_container 返回的 debuggingPort)。
+            host (str): 调试端口所在主机。
+            command_timeout (float): 单个 CDP 命令的超时时间（秒）。
+        返回:
+            CdpPage: 已连接的页面。
+        """
+        loop = asyncio.get_running_loop()
+        targets = await loop.run_in_executor(None, _fetch_cdp_targets, host, debugging_port, command_timeout)
+        pages = [t for t in targets if t.get('type') == 'page' and t.get('webSocketDebuggerUrl')]
+        if not pages:
+            raise CdpError(f"端口 {debugging_port} 上没有可连接的页面标签")
+        page = cls(pages[0]['webSocketDebuggerUrl'], command_timeout=command_timeout)
+        await page._open()
+        return page
+
+    async def _open(self):
+        websockets = _import_websockets()
+        self._ws = await websockets.connect(self.ws_url, max_size=None, ping_interval=None)
+        self._reader = asyncio.ensure_future(self._read_loop())
+
+    async def _read_loop(self):
+        error = None
+        try:
+            async for raw in self._ws:
+                message = json_lib.loads(raw)
+                if 'id' in message:
+                    future = self._pending.pop(message['id'], None)
+                    if future is None or future.done():
+                        continue
+                    if 'error' in message:
+                        future.set_exception(CdpError(message['error'].get('message', str(message['error']))))
+                    else:
+                        future.set_result(message.get('result', {}))
+                else:
+                    for future in self._event_waiters.pop(message.get('method'), []):
+                        if not future.done():
+                            future.set_result(message.get('params', {}))
+        except Exception as e:
+            error = e
+            print(f"CDP 连接 {self.ws_url} 读取出错: {e}")
+        finally:
+            # 连接断开或读取出错后，让所有等待中的命令和事件立即失败，而不是等到各自超时
+            message = f"CDP 连接已断开: {error}" if error is not None else "CDP 连接已断开"
+            self._disconnect_error = message
+            waiters = list(self._pending.values())
+            for futures in self._event_waiters.values():
+                waiters.extend(futures)
+            self._pending.clear()
+            self._event_waiters.clear()
+            for future in waiters:
+                if not future.done():
+                    exc = CdpError(message)
+                    exc.__cause__ = error
+                    future.set_exception(exc)
+
+    async def send(self, method, params=None, timeout=None):
+        """
+        发送一个 CDP 命令并等待其结果。
+        参数:
+            method (str): CDP 方法名，例如 'Page.navigate'。
+            params (dict, optional): 命令参数。
+            timeout (float, optional): 超时时间（秒），默认为 command_timeout。
+        返回:
+            dict: 命令的 result 字段。
+        """
+        if self._ws is None:
+            raise CdpError("页面尚未连接")
+        if self._disconnect_error is not None:
+            raise CdpError(self._disconnect_error)
+        self._next_id += 1
+        message_id = self._next_id
+        future = asyncio.get_running_loop().create_future()
+        self._pending[message_id] = future
+        await self._ws.send(json_lib.dumps({'id': message_id, 'method': method, 'params': params or {}}))
+        try:
+            return await asyncio.wait_for(future, timeout if timeout is not None else self.command_timeout)
+        finally:
+            self._pending.pop(message_id, None)
+
+    def _expect_event(self, method):
+        future = asyncio.get_running_loop().create_future()
+        if self._disconnect_error is not None:
+            future.set_exception(CdpError(self._disconnect_error))
+        else:
+            self._event_waiters.setdefault(method, []).append(future)
+        return future
+
+    async def evaluate(self, expression, await_promise=False, timeout=None):
+        """在页面中执行 JavaScript 表达式并按值返回结果。"""
+        result = await self.send('Runtime.evaluate', {
+            'expression': expression, 'returnByValue': True, 'awaitPromise': await_promise,
+        }, timeout=timeout)
+        if 'exceptionDetails' in result:
+            details = result['exceptionDetails']
+            raise CdpError(details.get('exception', {}).get('description') or details.get('text', '脚本执行出错'))
+        return result.get('result', {}).get('value')
+
+    async def _wait_for_xpath(self, xpath, clickable=False, timeout=DEFAULT_EXPLICIT_WAIT_TIMEOUT):
+        """在页面内用 MutationObserver 等待元素出现 (clickable 时还要求可见且未禁用)。"""
+        condition = 'clickable' if clickable else 'present'
+        return await self.evaluate(
+            f"({_WAIT_FOR_XPATH_JS})({json_lib.dumps(xpath)}, '{condition}', {int(timeout * 1000)}, "
+            f"{int(WAIT_FALLBACK_POLL_MS)}).then((el) => !!el)",
+            await_promise=True, timeout=timeout + SCRIPT_TIMEOUT_MARGIN_SECONDS)
+
+    async def open_url(self, url, wait_time=DEFAULT_IMPLICIT_WAIT):
+        """
+        导航到给定的 URL 并等待 load 事件 (最多 wait_time 秒)。
+        返回:
+            bool: 导航请求成功为 True (即使 load 事件超时)，否则为 False。
+        """
+        try:
+            if not self._page_enabled:
+                await self.send('Page.enable')
+                self._page_enabled = True
+            loaded = self._expect_event('Page.loadEventFired')
+            result = await self.send('Page.navigate', {'url': url})
+            if result.get('errorText'):
+                print(f"打开 URL {url} 时出错: {result['errorText']}")
+                return False
+            try:
+                await asyncio.wait_for(loaded, wait_time)
+            except asyncio.TimeoutError:
+                pass
+            return True
+        except Exception as e:
+            print(f"打开 URL {url} 时出错: {e}")
+            return False
+
+    async def fill_input_field(self, xpath, text_to_fill, clear_first=True, timeout=DEFAULT_EXPLICIT_WAIT_TIMEOUT):
+        """通过 XPath 找到输入字段并以可信输入事件填入文本。返回 bool。"""
+        try:
+            if not await self._wait_for_xpath(xpath, timeout=timeout):
+                raise CdpError(f"{timeout} 秒内未找到元素")
+            lookup = _XPATH_LOOKUP_JS.format(xpath=json_lib.dumps(xpath))
+            await self.evaluate(
+                f"(() => {{ const el = {lookup}; el.focus(); "
+                f"if ({'true' if clear_first else 'false'}) {{ if (el.select) el.select(); "
+                f"if ('value' in el) el.value = ''; el.dispatchEvent(new Event('input', {{bubbles: true}})); }} }})()")
+            await self.send('Input.insertText', {'text': str(text_to_fill)})
+            await self.evaluate(f"{lookup}.dispatchEvent(new Event('change', {{bubbles: true}}))")
+            return True
+        except Exception as e:
+            print(f"填充输入字段 (XPath: {xpath}) 时出错，内容 '{text_to_fill}': {e}")
+            return False
+
+    async def click_element(self, xpath, timeout=DEFAULT_EXPLICIT_WAIT_TIMEOUT):
+        """通过 XPath 找到可点击的元素，并在其中心位置派发真实的鼠标点击。返回 bool。"""
+        try:
+            if not await self._wait_for_xpath(xpath, clickable=True, timeout=timeout):
+                raise CdpError(f"{timeout} 秒内元素不可点击")
+            lookup = _XPATH_LOOKUP_JS.format(xpath=json_lib.dumps(xpath))
+            point = await self.evaluate(
+                f"(() => {{ const el = {lookup}; el.scrollIntoView({{block: 'center', inline: 'center'}}); "
+                f"const r = el.getBoundingClientRect(); return {{x: r.left + r.width / 2, y: r.top + r.height / 2}}; }})()")
+            for event_type in ('mouseMoved', 'mousePressed', 'mouseReleased'):
+                await self.send('Input.dispatchMouseEvent', {
+                    'type': event_type, 'x': point['x'], 'y': point['y'], 'button': 'left', 'clickCount': 1,
+                })
+            return True
+        except Exception as e:
+            print(f"点击元素 (XPath: {xpath}) 时出错: {e}")
+            return False
+
+    async def select_dropdown_option_by_index(self, xpath, index, timeout=DEFAULT_EXPLICIT_WAIT_TIMEOUT):
+        """按索引选择下拉选项并触发 input/change 事件。返回所选选项的文本，失败时为 None。"""
+        try:
+            if not await self._wait_for_xpath(xpath, timeout=timeout):
+                raise CdpError(f"{timeout} 秒内未找到元素")
+            lookup = _XPATH_LOOKUP_JS.format(xpath=json_lib.dumps(xpath))
+            return await self.evaluate(
+                f"(() => {{ const el = {lookup}; const i = {int(index)}; "
+                f"if (!el.options || i < 0 || i >= el.options.length) throw new Error('选项索引越界'); "
+                f"el.selectedIndex = i; el.dispatchEvent(new Event('input', {{bubbles: true}})); "
+                f"el.dispatchEvent(new Event('change', {{bubbles: true}})); return el.options[i].text; }})()")
+        except Exception as e:
+            print(f"按索引选择下拉选项时出错 (XPath: {xpath}, 索引: {index}): {e}")
+            return None
+
+    async def fill_form(self, steps, timeout=DEFAULT_EXPLICIT_WAIT_TIMEOUT, stop_on_error=True):
+        """用一次 Runtime.evaluate 完成整张表单，参数和返回值同模块级的 fill_form。"""
+        try:
+            normalized = _normalize_form_steps(steps)
+        except (ValueError, TypeError, IndexError) as e:
+            print(f"批量填写表单的步骤无效: {e}")
+            return [{'xpath': None, 'action': None, 'ok': False, 'value': None, 'error': str(e)}]
+        if not normalized:
+            return []
+        try:
+            return await self.evaluate(
+                f"({_FILL_FORM_JS})({json_lib.dumps(normalized)}, {int(timeout * 1000)}, "
+                f"{'true' if stop_on_error else 'false'})",
+                await_promise=True, timeout=timeout * len(normalized) + SCRIPT_TIMEOUT_MARGIN_SECONDS)
+        except Exception as e:
+            print(f"批量填写表单时出错: {e}")
+            return [{'xpath': x, 'action': a, 'ok': False, 'value': None, 'error': str(e)} for x, a, _ in normalized]
+
+    async def close(self):
+        """关闭 websocket 连接 (不会关闭浏览器或容器)。"""
+        if self._ws is not None:
+            await self._ws.close()
+            self._ws = None
+        if self._reader is not None:
+            await asyncio.gather(self._reader, return_exceptions=True)
+            self._reader = None
+
+
+async def open_container_cdp(container_id, client=None, command_timeout=DEFAULT_EXPLICIT_WAIT_TIMEOUT):
+    """
+    打开一个 HubStudio 容器 (已运行时直接使用其调试端口) 并返回 CDP 直连页面，不启动 chromedriver。
+    参数:
+        container_id (str): 要打开的容器 ID。
+        client (HubStudioClient, optional): 使用的 API 客户端，默认为共享客户端。
+        command_timeout (float): 单个 CDP 命令的超时时间（秒）。
+    返回:
+        CdpPage or None: 已连接的页面，如果失败则为 None。
+    """
+    client = client if client is not None else get_hubstudio_client()
+    loop = asyncio.get_running_loop()
+    try:
+        status, item = await loop.run_in_executor(None, _query_browser_status_item, client, container_id)
+        debugging_port = (item or {}).get('debuggingPort') if status == BROWSER_STATUS_OPEN else None
+        if debugging_port is None:
+            open_res = await loop.run_in_executor(None, client.start_browser, container_id)
+            if open_res.get('code') != 0:
+                print(f"HubStudio: 环境 {container_id} 打开失败: {open_res.get('msg', '未知错误')}")
+                return None
+            debugging_port = open_res['data']['debuggingPort']
+        page = await CdpPage.connect(debugging_port, command_timeout=command_timeout)
+        print(f"HubStudio: 已通过 CDP 连接到容器 {container_id} (端口 {debugging_port})")
+        return page
+    except requests.exceptions.RequestException as e:
+        print(f"HubStudio: 打开容器 {container_id} 时请求错误: {e}")
+    except KeyError as e:
+        print(f"HubStudio: 打开 {container_id} 时 API 响应格式意外: 缺少键 {e}")
+    except Exception as e:
+        print(f"HubStudio: 通过 CDP 连接容器 {container_id} 时发生常规错误: {e}")
+    return None
+
+# --- 外部 API 函数 ---
+def get_verification_code_from_api(email, api_url=GET_CODE_API_URL_DEFAULT, timeout=10):
+    """
+    调用 API (例如 Google Apps Script) 来获取电子邮件的验证码。
+    参数:
+        email (str): 要获取验证码的电子邮件地址。
+        api_url (str): 验证码 API 的 URL。
+        timeout (int): 请求超时时间（秒）。
+    返回:
+        dict or None: API 的 JSON 响应 (预计包含 'code')，如果失败则为 None。
+    """
+    if not api_url or not email:
+        print("错误: get_verification_code_from_api 的 API URL 和 email 不能为空。")
+        return None
+
+    params = {'email': email}
+    try:
+        response = requests.get(api_url, params=params, timeout=timeout)
+        response.raise_for_status()  # 对于错误的响应 (4xx 或 5xx) 抛出 HTTPError
+        
+        data = response.json()
+        print(f"邮箱 {email} 的 API 响应: {data}")
+        return data
+    except requests.exceptions.Timeout:
+        print(f"错误: 从 API ({api_url}) 请求 {email} 的验证码超时。")
+    except requests.exceptions.HTTPError as e:
+        print(f"错误: 来自 API ({api_url}) 的 HTTP 错误，邮箱 {email}: {e.response.status_code} - {e.response.text}")
+    except requests.exceptions.RequestException as e:
+        print(f"错误: API ({api_url}) 请求异常，邮箱 {email}: {e}")
+    except json.JSONDecodeError:
+        print(f"错误: 无法解码来自 API ({api_url}) 的 JSON 响应。响应文本: {response.text}")
+    except Exception as e:
+        print(f"获取 {email} 验证码时发生意外错误: {e}")
+    return None
+
+# --- EVM Wallet 函数 ---
+def generate_evm_wallet():
+    """
+    生成一个新的 EVM 兼容钱包 (地址、私钥、助记词)。
+    启用 HD Wallet 功能以生成助记词。
+
+    Returns:
+        dict or None: 包含 'address', 'private_key', 'mnemonic' 的字典，
+                      如果发生错误则返回 None。
+    """
     try:
         Account.enable_unaudited_hdwallet_features()
         acct, mnemonic = Account.create_with_mnemonic()
@@ -450,15 +2819,638 @@ def generate_evm_wallet():
         traceback.print_exc()
         return None
 
-def get_evm_balance(wallet_address, rpc_url=DEFAULT_EVM_RPC_URL, chain_id=DEFAULT_EVM_CHAIN_ID, request_timeout=DEFAULT_EVM_REQUEST_TIMEOUT_SECONDS):
+def _derive_wallet_chunk(args):
+    """
+    进程池任务: 从同一助记词按路径模板派生一段索引的钱包。
+    种子和公共父路径 (例如 m/44'/60'/0'/0) 的扩展私钥在每个任务中只计算一次，每个索引只派生最后一级子密钥；
+    模板中 {index} 不在最后一级时退回为每个索引派生完整路径。
+    """
+    from eth_account.hdaccount import seed_from_mnemonic, key_from_seed
+    from eth_account.hdaccount.deterministic import (
+        SECP256K1_N, HardNode, Node, derive_child_key, ec_point, hmac_sha512, to_int,
+    )
+    mnemonic, passphrase, path_template, indices = args
+    seed = seed_from_mnemonic(mnemonic, passphrase)
+    parent_path, _, last_node = path_template.rpartition('/')
+    parent_nodes = parent_path.split('/')
+    shared_parent = '{index}' in last_node and '{index}' not in parent_path and parent_nodes[0] in ('m', 'M')
+    if shared_parent:
+        master = hmac_sha512(b"Bitcoin seed", seed)
+        parent_key, chain_code = master[:32], master[32:]
+        for node in parent_nodes[1:]:
+            parent_key, chain_code = derive_child_key(parent_key, chain_code, Node.decode(node))
+        parent_point = ec_point(parent_key)
+    wallets = []
+    for index in indices:
+        path = path_template.format(index=index)
+        if shared_parent:
+            node = Node.decode(last_node.format(index=index))
+            data = (b"\x00" + parent_key if isinstance(node, HardNode) else parent_point) + node.serialize()
+            child = hmac_sha512(chain_code, data)
+            child_key = (to_int(child[:32]) + to_int(parent_key)) % SECP256K1_N
+            if to_int(child[:32]) >= SECP256K1_N or child_key == 0:
+                # 概率低于 2**-127 的无效子密钥，交给 eth_account 按 BIP32 规则处理
+                private_key = derive_child_key(parent_key, chain_code, node)[0]
+            else:
+                private_key = child_key.to_bytes(32, 'big')
+        else:
+            private_key = key_from_seed(seed, path)
+        acct = Account.from_key(private_key)
+        wallets.append({'address': acct.address, 'private_key': acct.key.hex(), 'mnemonic': mnemonic,
+                        'path': path, 'index': index})
+    return wallets
+
+
+def _create_wallet_chunk(args):
+    """进程池任务: 生成一批各自独立助记词的钱包，每个钱包取 path_template 中索引 0 的账户。"""
+    count, num_words, path_template = args
+    Account.enable_unaudited_hdwallet_features()
+    path = path_template.format(index=0)
+    wallets = []
+    for _ in range(count):
+        acct, mnemonic = Account.create_with_mnemonic(num_words=num_words, account_path=path)
+        wallets.append({'address': acct.address, 'private_key': acct.key.hex(), 'mnemonic': mnemonic,
+                        'path': path, 'index': 0})
+    return wallets
+
+
+def _as_wallet_writer(writer):
+    if hasattr(writer, 'write'):
+        def _write_tsv(wallet):
+            writer.write(f"{wallet['address']}\t{wallet['private_key']}\t{wallet['mnemonic']}\t{wallet['path']}\n")
+        return _write_tsv
+    return writer
+
+
+def generate_evm_wallets(count, writer, mode='derive', mnemonic=None, passphrase='',
+                         path_template=DEFAULT_HD_PATH_TEMPLATE, start_index=0, processes=None,
+                         chunk_size=DEFAULT_WALLET_CHUNK_SIZE, num_words=12):
+    """
+    批量生成 EVM 钱包，并把每个钱包逐个交给 writer，不在内存中累积完整列表，也不逐个打印。
+
+    两种模式:
+        'derive': 从同一个助记词按 path_template 派生 start_index 起的 count 个账户 (未提供助记词时新建一个)；
+        'independent': 生成 count 个各自拥有独立助记词的钱包。
+    两种模式都按 chunk_size 分块并分布到进程池。在 Windows 上调用方脚本需要 if __name__ == '__main__' 保护。
+
+    Args:
+        count (int): 要生成的钱包数量。
+        writer (callable or file): 以钱包字典 ('address', 'private_key', 'mnemonic', 'path', 'index') 调用的函数；
+                                   也可以是已打开的文本文件，此时每行写入制表符分隔的 地址、私钥、助记词、路径。
+        mode (str): 'derive' 或 'independent'。
+        mnemonic (str, optional): derive 模式使用的助记词。
+        passphrase (str, optional): derive 模式的 BIP39 口令。
+        path_template (str): 派生路径模板，{index} 会被替换为账户索引；independent 模式使用索引 0 的路径。
+        start_index (int): derive 模式的起始索引。
+        processes (int, optional): 进程数，默认为 CPU 核数；为 1 时在当前进程内生成。
+        chunk_size (int): 每个进程任务生成的钱包数量。
+        num_words (int): independent 模式下助记词的单词数。
+
+    Returns:
+        dict or None: 包含 'count', 'seconds', 'wallets_per_second', 'mode', 'mnemonic' (derive 模式使用的助记词)
+                      的统计字典，如果发生错误则返回 None。
+    """
+    if mode not in ('derive', 'independent'):
+        print(f"Error generating EVM wallets: unknown mode '{mode}' (expected 'derive' or 'independent')")
+        return None
+    emit = _as_wallet_writer(writer)
+    chunk_size = max(1, int(chunk_size))
+    start = time.perf_counter()
+    generated = 0
+    try:
+        Account.enable_unaudited_hdwallet_features()
+        if mode == 'derive':
+            if mnemonic is None:
+                _, mnemonic = Account.create_with_mnemonic(num_words=num_words)
+            tasks = [(mnemonic, passphrase, path_template, range(i, min(i + chunk_size, start_index + count)))
+                     for i in range(start_index, start_index + count, chunk_size)]
+            worker = _derive_wallet_chunk
+        else:
+            tasks = [(min(chunk_size, count - i), num_words, path_template) for i in range(0, count, chunk_size)]
+            worker = _create_wallet_chunk
+
+        if processes == 1 or len(tasks) <= 1:
+            chunks = map(worker, tasks)
+            executor = None
+        else:
+            executor = ProcessPoolExecutor(max_workers=processes)
+            chunks = executor.map(worker, tasks)
+        try:
+            for chunk in chunks:
+                for wallet in chunk:
+                    emit(wallet)
+                generated += len(chunk)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+    except Exception as e:
+        print(f"Error generating EVM wallets (after {generated}): {e}")
+        traceback.print_exc()
+        return None
+    seconds = time.perf_counter() - start
+    stats = {
+        'count': generated,
+        'seconds': seconds,
+        'wallets_per_second': generated / seconds if seconds > 0 else None,
+        'mode': mode,
+        'mnemonic': mnemonic if mode == 'derive' else None,
+    }
+    print(f"EVM Wallets Generated: {generated} in {seconds:.2f}s ({stats['wallets_per_second'] or 0:.1f} wallets/s)")
+    return stats
+
+# --- EVM RPC 连接复用 ---
+_web3_instances = {}
+_rpc_sessions = {}
+_web3_lock = threading.RLock()
+_rpc_stats = {}
+
+
+def _get_rpc_session(rpc_url):
+    """返回该 RPC 地址共享的 requests.Session (带连接池)。"""
+    session = _rpc_sessions.get(rpc_url)
+    if session is None:
+        with _web3_lock:
+            session = _rpc_sessions.get(rpc_url)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=EVM_RPC_POOL_MAXSIZE)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _rpc_sessions[rpc_url] = session
+    return session
+
+
+def get_web3(rpc_url=DEFAULT_EVM_RPC_URL, request_timeout=DEFAULT_EVM_REQUEST_TIMEOUT_SECONDS):
+    """
+    返回 (rpc_url, request_timeout) 对应的共享 Web3 实例。
+    实例及其底层 requests.Session 连接池在进程内复用，不做额外的 is_connected() 探测。
+
+    Args:
+        rpc_url (str): EVM 兼容网络的 RPC URL。
+        request_timeout (int, optional): HTTP 请求的超时时间（秒）。
+
+    Returns:
+        Web3: 共享的 Web3 实例。
+    """
+    key = (rpc_url, request_timeout)
+    w3_instance = _web3_instances.get(key)
+    if w3_instance is None:
+        with _web3_lock:
+            w3_instance = _web3_instances.get(key)
+            if w3_instance is None:
+                provider = Web3.HTTPProvider(rpc_url, request_kwargs={'timeout': request_timeout},
+                                             session=_get_rpc_session(rpc_url))
+                w3_instance = Web3(provider)
+                _web3_instances[key] = w3_instance
+    return w3_instance
+
+
+def _record_rpc_call(rpc_url, seconds, ok):
+    with _web3_lock:
+        stats = _rpc_stats.setdefault(rpc_url, {'calls': 0, 'errors': 0, 'seconds_total': 0.0, 'seconds_max': 0.0})
+        stats['calls'] += 1
+        if not ok:
+            stats['errors'] += 1
+        stats['seconds_total'] += seconds
+        stats['seconds_max'] = max(stats['seconds_max'], seconds)
+
+
+def _post_json_rpc(rpc_url, payload, timeout=DEFAULT_EVM_REQUEST_TIMEOUT_SECONDS):
+    """
+    通过共享连接池向 RPC 端点发送原始 JSON-RPC 请求 (单个请求或批量请求列表)，并记录端点统计。
+
+    Returns:
+        dict or list: 解析后的 JSON 响应。
+    """
+    start = time.perf_counter()
+    try:
+        response = _get_rpc_session(rpc_url).post(rpc_url, json=payload, timeout=timeout)
+        response.raise_for_status()
+        data = response.json()
+    except Exception:
+        _record_rpc_call(rpc_url, time.perf_counter() - start, False)
+        raise
+    _record_rpc_call(rpc_url, time.perf_counter() - start, True)
+    return data
+
+
+def get_rpc_endpoint_stats():
+    """
+    返回各 RPC 端点的调用统计。
+
+    Returns:
+        dict: rpc_url -> {'calls', 'errors', 'error_rate', 'avg_seconds', 'max_seconds'}。
+    """
+    with _web3_lock:
+        snapshot = {url: dict(stats) for url, stats in _rpc_stats.items()}
+    return {
+        url: {
+            'calls': stats['calls'],
+            'errors': stats['errors'],
+            'error_rate': stats['errors'] / stats['calls'] if stats['calls'] else 0.0,
+            'avg_seconds': stats['seconds_total'] / stats['calls'] if stats['calls'] else None,
+            'max_seconds': stats['seconds_max'],
+        }
+        for url, stats in snapshot.items()
+    }
+
+
+# --- 多 RPC 端点路由 ---
+# 可以安全地重复发送 (对冲) 的只读方法
+_HEDGEABLE_RPC_METHODS = frozenset([
+    'eth_getBalance', 'eth_call', 'eth_chainId', 'eth_blockNumber', 'eth_gasPrice', 'eth_feeHistory',
+    'eth_getTransactionCount', 'eth_getTransactionReceipt', 'eth_getTransactionByHash', 'eth_getBlockByNumber',
+    'eth_getCode', 'eth_estimateGas', 'eth_maxPriorityFeePerGas', 'net_version',
+])
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    k = (len(ordered) - 1) * pct / 100.0
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+class RpcRouter:
+    """
+    多 RPC 端点路由器。
+
+    记录每个端点最近 window 次请求的延迟和成败，把请求发给得分最低的健康端点 (尚无样本的端点优先试探)；
+    得分为中位延迟除以成功率，近期只有失败、没有成功样本的端点排在有成功样本的端点之后，
+    错误率达到阈值的端点进入冷却期，排到最后。请求失败时依次转移到下一个端点。
+    开启 hedge 时，只读请求在首选端点超过其延迟百分位 (hedge_percentile) 仍未返回时，
+    会向次优端点再发一份，先成功者胜出。
+
+    Args:
+        rpc_urls (iterable): RPC 端点 URL。
+        request_timeout (int, optional): 单个请求的默认超时时间（秒），request(timeout=...) 可以按请求覆盖。
+        window (int): 每个端点保留的样本数。
+        hedge (bool): 是否对只读请求进行对冲。
+        hedge_percentile (float): 触发对冲的延迟百分位。
+        default_hedge_delay (float): 样本不足时的对冲延迟（秒）。
+        error_rate_threshold (float): 进入冷却的错误率阈值 (至少 5 个样本时才判断)。
+        cooldown_seconds (float): 冷却时长（秒）。
+    """
+
+    def __init__(self, rpc_urls, request_timeout=DEFAULT_EVM_REQUEST_TIMEOUT_SECONDS, window=RPC_ROUTER_WINDOW,
+                 hedge=RPC_ROUTER_HEDGE, hedge_percentile=RPC_ROUTER_HEDGE_PERCENTILE,
+                 default_hedge_delay=RPC_ROUTER_DEFAULT_HEDGE_DELAY_SECONDS,
+                 error_rate_threshold=RPC_ROUTER_ERROR_RATE_THRESHOLD, cooldown_seconds=RPC_ROUTER_COOLDOWN_SECONDS):
+        self.urls = tuple(dict.fromkeys(rpc_urls))
+        if not self.urls:
+            raise ValueError("RpcRouter requires at least one RPC URL")
+        self.request_timeout = request_timeout
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.default_hedge_delay = default_hedge_delay
+        self.error_rate_threshold = error_rate_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self._lock = threading.Lock()
+        self._endpoints = {
+            url: {'latencies': deque(maxlen=window), 'outcomes': deque(maxlen=window), 'cooldown_until': 0.0}
+            for url in self.urls
+        }
+        self._executor = ThreadPoolExecutor(max_workers=max(4, 2 * len(self.urls)), thread_name_prefix='rpc-hedge')
+
+    def _record(self, url, seconds, ok):
+        with self._lock:
+            endpoint = self._endpoints[url]
+            outcomes = endpoint['outcomes']
+            outcomes.append(ok)
+            if ok:
+                endpoint['latencies'].append(seconds)
+            elif len(outcomes) >= 5 and outcomes.count(False) / len(outcomes) >= self.error_rate_threshold:
+                endpoint['cooldown_until'] = time.monotonic() + self.cooldown_seconds
+                outcomes.clear()
+
+    def ranked_urls(self):
+        """
+        按得分从好到差排列的端点: 尚无样本的端点在前 (用于试探)，然后按 中位延迟 / 成功率 排列有成功样本的端点，
+        再是只有失败样本的端点，冷却中的端点排在最后。
+        """
+        now = time.monotonic()
+        with self._lock:
+            scored = []
+            for index, url in enumerate(self.urls):
+                endpoint = self._endpoints[url]
+                outcomes = endpoint['outcomes']
+                median = _percentile(endpoint['latencies'], 50)
+                if median is None:
+                    # 没有成功样本: 从未请求过的端点优先试探，只失败过的端点排在有成功样本的端点之后
+                    group, score = (2, 0.0) if outcomes else (0, 0.0)
+                else:
+                    success_rate = outcomes.count(True) / len(outcomes) if outcomes else 1.0
+                    group, score = (1, median / success_rate) if success_rate else (2, 0.0)
+                scored.append((endpoint['cooldown_until'] > now, group, score, index, url))
+        return [item[-1] for item in sorted(scored)]
+
+    def _hedge_delay(self, url):
+        with self._lock:
+            latencies = list(self._endpoints[url]['latencies'])
+        if len(latencies) < 5:
+            return self.default_hedge_delay
+        return _percentile(latencies, self.hedge_percentile)
+
+    def _timed_post(self, url, payload, timeout):
+        start = time.perf_counter()
+        try:
+            data = _post_json_rpc(url, payload, timeout)
+        except Exception:
+            self._record(url, time.perf_counter() - start, False)
+            raise
+        self._record(url, time.perf_counter() - start, True)
+        return data
+
+    @staticmethod
+    def _is_hedgeable(payload):
+        items = payload if isinstance(payload, list) else [payload]
+        return all(item.get('method') in _HEDGEABLE_RPC_METHODS for item in items)
+
+    def request(self, payload, timeout=None):
+        """
+        发送原始 JSON-RPC 请求 (单个或批量)，返回解析后的 JSON。所有端点都失败时抛出最后一个异常。
+        timeout 为单个端点请求的超时时间（秒），默认使用 request_timeout。
+        """
+        timeout = self.request_timeout if timeout is None else timeout
+        ranked = self.ranked_urls()
+        last_error = None
+        if self.hedge and len(ranked) > 1 and self._is_hedgeable(payload):
+            primary = self._executor.submit(self._timed_post, ranked[0], payload, timeout)
+            wait([primary], timeout=self._hedge_delay(ranked[0]))
+            pending = {primary}
+            if not primary.done() or primary.exception() is not None:
+                pending.add(self._executor.submit(self._timed_post, ranked[1], payload, timeout))
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        return future.result()
+                    last_error = future.exception()
+            ranked = ranked[2:]
+        for url in ranked:
+            try:
+                return self._timed_post(url, payload, timeout)
+            except Exception as e:
+                last_error = e
+        raise last_error
+
+    def call(self, method, params, timeout=None):
+        """发送单个 JSON-RPC 调用并返回 result；节点返回错误时抛出 RuntimeError。"""
+        response = self.request({'jsonrpc': '2.0', 'id': 1, 'method': method, 'params': params}, timeout)
+        if 'error' in response:
+            error = response['error']
+            raise RuntimeError(error.get('message', str(error)) if isinstance(error, dict) else str(error))
+        return response.get('result')
+
+    def stats(self):
+        """
+        返回各端点的滚动统计。
+
+        Returns:
+            dict: url -> {'samples', 'p50_seconds', 'p90_seconds', 'error_rate', 'healthy'}。
+        """
+        now = time.monotonic()
+        with self._lock:
+            report = {}
+            for url, endpoint in self._endpoints.items():
+                outcomes = endpoint['outcomes']
+                report[url] = {
+                    'samples': len(outcomes),
+                    'p50_seconds': _percentile(endpoint['latencies'], 50),
+                    'p90_seconds': _percentile(endpoint['latencies'], 90),
+                    'error_rate': outcomes.count(False) / len(outcomes) if outcomes else 0.0,
+                    'healthy': endpoint['cooldown_until'] <= now,
+                }
+        return report
+
+
+_rpc_routers = {}
+
+
+def get_rpc_router(rpc_urls=None):
+    """
+    返回这组 RPC 端点共享的 RpcRouter (按端点列表缓存，路由统计在进程内持续累积)。
+
+    Args:
+        rpc_urls (iterable, optional): RPC 端点 URL，默认为 config.json 中的 EVM.rpc_urls。
+
+    Returns:
+        RpcRouter: 共享的路由器。
+    """
+    key = tuple(dict.fromkeys(rpc_urls if rpc_urls is not None else DEFAULT_EVM_RPC_URLS))
+    router = _rpc_routers.get(key)
+    if router is None:
+        with _web3_lock:
+            router = _rpc_routers.get(key)
+            if router is None:
+                router = RpcRouter(key)
+                _rpc_routers[key] = router
+    return router
+
+
+def _resolve_rpc_target(rpc_url):
+    """把 rpc_url 参数 (URL 字符串、URL 列表或 RpcRouter) 规整为 URL 字符串或 RpcRouter。"""
+    if isinstance(rpc_url, RpcRouter):
+        return rpc_url
+    if isinstance(rpc_url, (list, tuple)):
+        return rpc_url[0] if len(rpc_url) == 1 else get_rpc_router(rpc_url)
+    return rpc_url
+
+
+def _rpc_cache_key(rpc_url):
+    target = _resolve_rpc_target(rpc_url)
+    return target.urls if isinstance(target, RpcRouter) else target
+
+
+def _send_json_rpc(rpc_url, payload, timeout=DEFAULT_EVM_REQUEST_TIMEOUT_SECONDS):
+    """向单个 URL 或经由 RpcRouter 发送原始 JSON-RPC 请求；timeout 同样作用于路由器的每个端点请求。"""
+    target = _resolve_rpc_target(rpc_url)
+    if isinstance(target, RpcRouter):
+        return target.request(payload, timeout)
+    return _post_json_rpc(target, payload, timeout)
+
+
+def _rpc_call(rpc_url, method, params, request_timeout):
+    """发送单个 JSON-RPC 请求，返回 result；节点返回错误时抛出 RuntimeError (信息为节点的错误信息)。"""
+    response = _send_json_rpc(rpc_url, {'jsonrpc': '2.0', 'id': 1, 'method': method, 'params': params},
+                              request_timeout)
+    if 'error' in response:
+        error = response['error']
+        raise RuntimeError(error.get('message', str(error)) if isinstance(error, dict) else str(error))
+    return response.get('result')
+
+
+# --- 链上数据缓存 ---
+# 进程内不变的数据
+_STATIC_RPC_METHODS = frozenset(['eth_chainId', 'net_version'])
+# 随链头变化的数据：最后一个参数为区块标签时，'latest' 在新区块出现前有效，具体区块号则永久有效
+_BLOCK_SCOPED_RPC_METHODS = frozenset(['eth_getBalance', 'eth_call', 'eth_getCode', 'eth_getStorageAt'])
+# 没有区块参数、但同样只随新区块变化的数据
+_HEAD_SCOPED_RPC_METHODS = frozenset(['eth_gasPrice', 'eth_maxPriorityFeePerGas', 'eth_feeHistory'])
+
+
+class ChainDataCache:
+    """
+    某个 RPC 端点前的读穿透缓存。
+
+    chainId 等静态数据在进程内只查询一次；gas price、fee history、'latest' 余额等数据缓存到观察到新区块为止。
+    链头通过 eth_blockNumber 获取，至少间隔 head_ttl 秒才重新查询一次。其他方法直接透传给节点。
+
+    Args:
+        rpc_url (str, list or RpcRouter): EVM 兼容网络的 RPC URL。
+        request_timeout (int, optional): 请求超时时间（秒）。
+        head_ttl (float, optional): 链头区块号的缓存时间（秒）。
+    """
+
+    def __init__(self, rpc_url=DEFAULT_EVM_RPC_TARGET, request_timeout=DEFAULT_EVM_REQUEST_TIMEOUT_SECONDS,
+                 head_ttl=CHAIN_CACHE_HEAD_TTL_SECONDS):
+        self.rpc_url = rpc_url
+        self.request_timeout = request_timeout
+        self.head_ttl = head_ttl
+        self._lock = threading.Lock()
+        self._static = {}
+        self._block_scoped = {}
+        self._head = None
+        self._head_checked_at = 0.0
+        self._stats = {'hits': 0, 'misses': 0, 'passthrough': 0, 'head_queries': 0, 'new_blocks': 0}
+
+    def block_number(self, request_timeout=None):
+        """返回当前链头区块号 (head_ttl 内复用)；区块号变化时清空与链头相关的缓存。"""
+        now = time.monotonic()
+        with self._lock:
+            if self._head is not None and now - self._head_checked_at < self.head_ttl:
+                return self._head
+        head = int(_rpc_call(self.rpc_url, 'eth_blockNumber', [], request_timeout or self.request_timeout), 16)
+        with self._lock:
+            self._stats['head_queries'] += 1
+            self._head_checked_at = time.monotonic()
+            if head != self._head:
+                if self._head is not None:
+                    self._stats['new_blocks'] += 1
+                self._head = head
+                self._block_scoped.clear()
+        return head
+
+    def _scope(self, method, params):
+        if method in _STATIC_RPC_METHODS:
+            return 'static'
+        if method in _HEAD_SCOPED_RPC_METHODS:
+            return 'head'
+        if method in _BLOCK_SCOPED_RPC_METHODS and params:
+            block = params[-1]
+            if isinstance(block, int) or (isinstance(block, str) and block.startswith('0x') and len(block) < 20):
+                return 'static'
+            if block == 'latest':
+                return 'head'
+        return None
+
+    def call(self, method, params, request_timeout=None):
+        """
+        发送 JSON-RPC 调用，可缓存的方法优先返回缓存结果。节点返回错误时抛出 RuntimeError，错误不会被缓存。
+
+        Returns:
+            节点返回的 result。
+        """
+        request_timeout = request_timeout or self.request_timeout
+        scope = self._scope(method, params)
+        if scope is None:
+            with self._lock:
+                self._stats['passthrough'] += 1
+            return _rpc_call(self.rpc_url, method, params, request_timeout)
+        if scope == 'head':
+            head = self.block_number(request_timeout)
+        key = (method, json_lib.dumps(params, sort_keys=True))
+        with self._lock:
+            store = self._static if scope == 'static' else self._block_scoped
+            if key in store:
+                self._stats['hits'] += 1
+                return store[key]
+            self._stats['misses'] += 1
+        value = _rpc_call(self.rpc_url, method, params, request_timeout)
+        with self._lock:
+            # 查询期间链头已前进时不写入，避免旧区块的数据留到新区块
+            if scope == 'static' or head == self._head:
+                store[key] = value
+        return value
+
+    def chain_id(self):
+        return int(self.call('eth_chainId', []), 16)
+
+    def gas_price(self):
+        return int(self.call('eth_gasPrice', []), 16)
+
+    def fee_history(self, block_count, newest_block='latest', reward_percentiles=None):
+        return self.call('eth_feeHistory', [hex(block_count), newest_block, list(reward_percentiles or [])])
+
+    def get_balance(self, address, block='latest', request_timeout=None):
+        block_param = hex(block) if isinstance(block, int) else block
+        return int(self.call('eth_getBalance', [Web3.to_checksum_address(address), block_param], request_timeout), 16)
+
+    def clear(self):
+        """清空所有缓存 (包括静态数据)。"""
+        with self._lock:
+            self._static.clear()
+            self._block_scoped.clear()
+            self._head = None
+
+    def stats(self):
+        """
+        返回缓存统计。
+
+        Returns:
+            dict: {'hits', 'misses', 'passthrough', 'hit_rate', 'head_queries', 'new_blocks', 'head'}。
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['head'] = self._head
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+_chain_caches = {}
+
+
+def get_chain_cache(rpc_url=DEFAULT_EVM_RPC_TARGET):
+    """
+    返回该 RPC 端点 (或端点列表/路由器) 共享的 ChainDataCache。
+
+    Returns:
+        ChainDataCache: 共享的缓存实例。
+    """
+    key = _rpc_cache_key(rpc_url)
+    cache = _chain_caches.get(key)
+    if cache is None:
+        with _web3_lock:
+            cache = _chain_caches.get(key)
+            if cache is None:
+                cache = ChainDataCache(rpc_url)
+                _chain_caches[key] = cache
+    return cache
+
+
+def get_chain_cache_stats():
+    """返回各 RPC 端点的链上数据缓存统计: {端点: ChainDataCache.stats()}。"""
+    with _web3_lock:
+        caches = dict(_chain_caches)
+    return {key if isinstance(key, str) else ','.join(key): cache.stats() for key, cache in caches.items()}
+
+
+def get_evm_balance(wallet_address, rpc_url=DEFAULT_EVM_RPC_TARGET, chain_id=DEFAULT_EVM_CHAIN_ID, request_timeout=DEFAULT_EVM_REQUEST_TIMEOUT_SECONDS,
+                    use_cache=CHAIN_CACHE_BALANCES):
     """
     查询指定 EVM 钱包地址的余额。
+    使用 get_web3 复用的 Web3 实例，只发送一次 eth_getBalance 请求；传入多个 URL 或 RpcRouter 时经由路由器发送。
 
     Args:
         wallet_address (str): 要查询的钱包地址。
-        rpc_url (str): EVM 兼容网络的 RPC URL。
+        rpc_url (str, list or RpcRouter): EVM 兼容网络的 RPC URL。
         chain_id (int, optional): 链 ID，主要用于日志。
         request_timeout (int, optional): Web3 请求的超时时间（秒）。
+        use_cache (bool, optional): 经由 get_chain_cache 查询，同一区块内重复查询同一地址直接返回缓存。
 
     Returns:
         dict: 包含 'balance_wei' (int), 'balance_eth' (str), 'error' (str or None) 的字典。
@@ -476,29 +3468,39 @@ def get_evm_balance(wallet_address, rpc_url=DEFAULT_EVM_RPC_URL, chain_id=DEFAUL
         print(result['error'])
         return result
     
-    w3_instance = None
+    target = _resolve_rpc_target(rpc_url)
+    direct = not use_cache and not isinstance(target, RpcRouter) # 其他路径在 _post_json_rpc / 路由器内部记录统计
+    start = time.perf_counter()
     try:
-        w3_instance = Web3(Web3.HTTPProvider(rpc_url, request_kwargs={'timeout': request_timeout}))
-        if not w3_instance.is_connected():
-            result['error'] = f"Failed to connect to RPC node: {rpc_url}"
-            print(result['error'])
-            return result
-        
-        print(f"Successfully connected to {rpc_url} (Chain ID: {chain_id if chain_id else 'Unknown'}, Timeout: {request_timeout}s)")
-        
         checksum_address = Web3.to_checksum_address(wallet_address)
-        balance_wei = w3_instance.eth.get_balance(checksum_address)
-        balance_eth = w3_instance.from_wei(balance_wei, 'ether')
+        if use_cache:
+            balance_wei = get_chain_cache(target).get_balance(checksum_address, request_timeout=request_timeout)
+        elif direct:
+            w3_instance = get_web3(target, request_timeout)
+            balance_wei = w3_instance.eth.get_balance(checksum_address)
+            _record_rpc_call(target, time.perf_counter() - start, True)
+        else:
+            balance_wei = int(target.call('eth_getBalance', [checksum_address, 'latest']), 16)
+        balance_eth = Web3.from_wei(balance_wei, 'ether')
         
         result['balance_wei'] = balance_wei
         result['balance_eth'] = str(balance_eth) # 转换为字符串以保持一致性
-        print(f"Address: {checksum_address}, Balance: {balance_eth} ETH ({balance_wei} Wei)")
+        print(f"Address: {checksum_address}, Balance: {balance_eth} ETH ({balance_wei} Wei) (Chain ID: {chain_id if chain_id else 'Unknown'})")
         
     except requests.exceptions.ReadTimeout:
+        if direct:
+            _record_rpc_call(target, time.perf_counter() - start, False)
         error_msg = f"Timeout (> {request_timeout}s) while getting balance for {wallet_address} from {rpc_url}"
         result['error'] = error_msg
         print(error_msg)
+    except requests.exceptions.ConnectionError:
+        if direct:
+            _record_rpc_call(target, time.perf_counter() - start, False)
+        result['error'] = f"Failed to connect to RPC node: {rpc_url}"
+        print(result['error'])
     except Exception as e:
+        if direct:
+            _record_rpc_call(target, time.perf_counter() - start, False)
         error_msg = f"Error getting EVM balance for {wallet_address}: {e}"
         result['error'] = error_msg
         print(error_msg)
@@ -507,6 +3509,604 @@ def get_evm_balance(wallet_address, rpc_url=DEFAULT_EVM_RPC_URL, chain_id=DEFAUL
     return result
 
 
+# --- EVM 批量余额查询 ---
+class _AsyncRateLimiter:
+    """简单的 asyncio 速率限制器: 两次放行之间至少间隔 1/rate 秒。rate 为 None 或 0 时不限速。"""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._next_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def _balance_result_from_rpc_item(item):
+    """把批量响应中的一项转换为余额结果；缺失或格式异常的条目只影响该地址，作为 error 返回。"""
+    result = {'balance_wei': None, 'balance_eth': None, 'error': None}
+    if item is None:
+        result['error'] = "No response for this address in the batch"
+    elif 'error' in item:
+        error = item['error']
+        result['error'] = f"RPC error: {error.get('message', error) if isinstance(error, dict) else error}"
+    else:
+        try:
+            balance_wei = int(item['result'], 16)
+        except (KeyError, TypeError, ValueError):
+            result['error'] = f"Malformed RPC response for this address: {item}"
+            return result
+        result['balance_wei'] = balance_wei
+        result['balance_eth'] = str(Web3.from_wei(balance_wei, 'ether'))
+    return result
+
+
+async def stream_evm_balances(addresses, rpc_url=DEFAULT_EVM_RPC_TARGET, batch_size=DEFAULT_EVM_BATCH_SIZE,
+                              max_concurrency=DEFAULT_EVM_MAX_CONCURRENCY,
+                              requests_per_second=DEFAULT_EVM_REQUESTS_PER_SECOND,
+                              request_timeout=DEFAULT_EVM_REQUEST_TIMEOUT_SECONDS, block='latest'):
+    """
+    异步批量查询余额，按批次完成的顺序逐个产出结果。
+
+    地址被打包为 JSON-RPC 批量请求 (每批 batch_size 个 eth_getBalance)，
+    批次在 max_concurrency 个并发请求和 requests_per_second 的速率限制下发送。
+
+    Args:
+        addresses (iterable): 钱包地址。无效地址会立即产出带 error 的结果。
+        rpc_url (str, list or RpcRouter): EVM 兼容网络的 RPC URL，多个 URL 时经由 RpcRouter 路由。
+        batch_size (int): 每个 JSON-RPC 批量请求包含的地址数。
+        max_concurrency (int): 同时在途的批量请求数。
+        requests_per_second (float, optional): 每秒最多发送的批量请求数，None 表示不限速。
+        request_timeout (int, optional): 单个批量请求的超时时间（秒）。
+        block (str or int): 查询的区块，默认为 'latest'。
+
+    Yields:
+        tuple: (address, result)，result 的格式与 get_evm_balance 的返回值相同。
+    """
+    valid = []
+    for address in dict.fromkeys(addresses):
+        if not address or not Web3.is_address(address):
+            yield address, {'balance_wei': None, 'balance_eth': None,
+                            'error': f"Invalid wallet address provided: {address}"}
+        else:
+            valid.append(address)
+    if not valid:
+        return
+
+    block_param = hex(block) if isinstance(block, int) else block
+    batch_size = max(1, int(batch_size))
+    batches = [valid[i:i + batch_size] for i in range(0, len(valid), batch_size)]
+    semaphore = asyncio.Semaphore(max(1, int(max_concurrency)))
+    limiter = _AsyncRateLimiter(requests_per_second)
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=max(1, int(max_concurrency)), thread_name_prefix='evm-batch')
+
+    async def run_batch(batch):
+        payload = [
+            {'jsonrpc': '2.0', 'id': i, 'method': 'eth_getBalance',
+             'params': [Web3.to_checksum_address(address), block_param]}
+            for i, address in enumerate(batch)
+        ]
+        await limiter.wait()
+        async with semaphore:
+            try:
+                data = await loop.run_in_executor(executor, _send_json_rpc, rpc_url, payload, request_timeout)
+            except requests.exceptions.ReadTimeout:
+                error = f"Timeout (> {request_timeout}s) while getting balances from {rpc_url}"
+                return [(address, {'balance_wei': None, 'balance_eth': None, 'error': error}) for address in batch]
+            except Exception as e:
+                error = f"Error getting EVM balances: {e}"
+                return [(address, {'balance_wei': None, 'balance_eth': None, 'error': error}) for address in batch]
+        if not isinstance(data, list):
+            # 端点不支持批量请求时通常返回单个错误对象
+            error = f"RPC endpoint rejected the batch request: {data.get('error', data) if isinstance(data, dict) else data}"
+            return [(address, {'balance_wei': None, 'balance_eth': None, 'error': error}) for address in batch]
+        by_id = {item.get('id'): item for item in data if isinstance(item, dict)}
+        return [(address, _balance_result_from_rpc_item(by_id.get(i))) for i, address in enumerate(batch)]
+
+    tasks = [asyncio.ensure_future(run_batch(batch)) for batch in batches]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            for address, result in await finished:
+                yield address, result
+    finally:
+        for task in tasks:
+            task.cancel()
+        executor.shutdown(wait=False)
+
+
+def get_evm_balances(addresses, rpc_url=DEFAULT_EVM_RPC_TARGET, batch_size=DEFAULT_EVM_BATCH_SIZE,
+                     max_concurrency=DEFAULT_EVM_MAX_CONCURRENCY, requests_per_second=DEFAULT_EVM_REQUESTS_PER_SECOND,
+                     request_timeout=DEFAULT_EVM_REQUEST_TIMEOUT_SECONDS, on_result=None):
+    """
+    批量查询多个钱包地址的余额 (stream_evm_balances 的同步封装)。
+    不能在已运行的事件循环中调用，此时请直接使用 stream_evm_balances。
+
+    Args:
+        addresses (iterable): 钱包地址。
+        rpc_url (str, list or RpcRouter): EVM 兼容网络的 RPC URL。
+        batch_size, max_concurrency, requests_per_second, request_timeout: 见 stream_evm_balances。
+        on_result (callable, optional): 每得到一个结果即调用 on_result(address, result)，用于流式处理。
+
+    Returns:
+        dict: address -> result，result 的格式与 get_evm_balance 的返回值相同。
+    """
+    results = {}
+
+    async def _collect():
+        async for address, result in stream_evm_balances(addresses, rpc_url, batch_size, max_concurrency,
+                                                         requests_per_second, request_timeout):
+            results[address] = result
+            if on_result is not None:
+                on_result(address, result)
+
+    start = time.perf_counter()
+    asyncio.run(_collect())
+    failed = sum(1 for r in results.values() if r['error'])
+    print(f"Fetched balances for {len(results)} addresses ({failed} failed) in {time.perf_counter() - start:.2f}s")
+    return results
+
+
+# --- ERC-20 / 多代币余额 (Multicall3) ---
+NATIVE_TOKEN = 'native'
+_SELECTOR_BALANCE_OF = bytes.fromhex('70a08231')
+_SELECTOR_DECIMALS = bytes.fromhex('313ce567')
+_SELECTOR_GET_ETH_BALANCE = bytes.fromhex('4d2301cc')
+_SELECTOR_AGGREGATE3 = bytes.fromhex('82ad56cb')
+
+_token_decimals_cache = {}
+_token_decimals_lock = threading.Lock()
+
+
+def _address_word(address):
+    return bytes(12) + bytes.fromhex(Web3.to_checksum_address(address)[2:])
+
+
+def _multicall_aggregate3(rpc_url, calls, gas_limit, request_timeout, block, multicall_address):
+    """
+    通过一次 eth_call 执行 Multicall3.aggregate3。
+
+    Args:
+        calls (list): (target, calldata) 列表，均允许单独失败。
+
+    Returns:
+        list: 与 calls 对应的 (success, return_data) 列表。
+    """
+    encoded = abi_encode(['(address,bool,bytes)[]'], [[(target, True, data) for target, data in calls]])
+    payload = {
+        'jsonrpc': '2.0', 'id': 1, 'method': 'eth_call',
+        'params': [{'to': multicall_address, 'data': '0x' + (_SELECTOR_AGGREGATE3 + encoded).hex(),
+                    'gas': hex(int(gas_limit))},
+                   hex(block) if isinstance(block, int) else block],
+    }
+    response = _send_json_rpc(rpc_url, payload, request_timeout)
+    if 'error' in response:
+        raise RuntimeError(f"aggregate3 eth_call failed: {response['error'].get('message', response['error'])}")
+    raw = bytes.fromhex(response['result'][2:])
+    return abi_decode(['(bool,bytes)[]'], raw)[0]
+
+
+def _chunk_calls(calls, gas_limit, gas_per_call):
+    per_chunk = max(1, int(gas_limit) // max(1, int(gas_per_call)))
+    return [calls[i:i + per_chunk] for i in range(0, len(calls), per_chunk)]
+
+
+def get_token_decimals(tokens, rpc_url=DEFAULT_EVM_RPC_TARGET, request_timeout=DEFAULT_EVM_REQUEST_TIMEOUT_SECONDS,
+                       multicall_address=MULTICALL3_ADDRESS):
+    """
+    查询代币的 decimals，结果按 (RPC 端点, 代币地址) 在进程内缓存；未缓存的代币通过一次 aggregate3 批量查询。
+
+    Args:
+        tokens (iterable): 代币合约地址，NATIVE_TOKEN ('native') 或 None 表示原生币 (18 位)。
+
+    Returns:
+        dict: 代币 -> decimals (int)，查询失败的代币为 None。
+    """
+    decimals = {}
+    missing = []
+    for token in tokens:
+        if token in (None, NATIVE_TOKEN):
+            decimals[token] = 18
+            continue
+        with _token_decimals_lock:
+            cached = _token_decimals_cache.get((_rpc_cache_key(rpc_url), Web3.to_checksum_address(token)))
+        if cached is None:
+            missing.append(token)
+        decimals[token] = cached
+    if missing:
+        calls = [(Web3.to_checksum_address(t), _SELECTOR_DECIMALS) for t in missing]
+        try:
+            returned = _multicall_aggregate3(rpc_url, calls, DEFAULT_MULTICALL_GAS_LIMIT, request_timeout, 'latest',
+                                             multicall_address)
+        except Exception as e:
+            print(f"Error fetching token decimals: {e}")
+            returned = [(False, b'')] * len(missing)
+        for token, (success, data) in zip(missing, returned):
+            if success and len(data) >= 32:
+                value = int.from_bytes(data[:32], 'big')
+                decimals[token] = value
+                with _token_decimals_lock:
+                    _token_decimals_cache[(_rpc_cache_key(rpc_url), Web3.to_checksum_address(token))] = value
+    return decimals
+
+
+def get_token_balances(wallets, tokens, rpc_url=DEFAULT_EVM_RPC_TARGET,
+                       request_timeout=DEFAULT_EVM_REQUEST_TIMEOUT_SECONDS, multicall_address=MULTICALL3_ADDRESS,
+                       gas_limit=DEFAULT_MULTICALL_GAS_LIMIT, gas_per_call=DEFAULT_MULTICALL_GAS_PER_CALL,
+                       max_concurrency=DEFAULT_EVM_MAX_CONCURRENCY, block='latest'):
+    """
+    批量查询 (钱包, 代币) 组合的余额。所有 balanceOf (原生币使用 Multicall3.getEthBalance) 被打包进
+    Multicall3 aggregate3 调用，并按 gas_limit / gas_per_call 切分为多个 eth_call 并发发送。
+
+    Args:
+        wallets (iterable): 钱包地址。
+        tokens (iterable): 代币合约地址，NATIVE_TOKEN ('native') 或 None 表示原生币。
+        rpc_url (str, list or RpcRouter): EVM 兼容网络的 RPC URL。
+        request_timeout (int, optional): 单个 eth_call 的超时时间（秒）。
+        multicall_address (str): Multicall3 合约地址 (大多数链上相同)。
+        gas_limit (int): 单个 aggregate3 eth_call 的 gas 上限，应不超过节点的 eth_call gas cap。
+        gas_per_call (int): 每个子调用的 gas 估计值，用于切分批次。
+        max_concurrency (int): 同时在途的 eth_call 数。
+        block (str or int): 查询的区块，默认为 'latest'。
+
+    Returns:
+        dict: 紧凑的余额表:
+              'wallets' (list): 校验和格式的钱包地址 (行)；
+              'tokens' (list): 代币地址或 'native' (列)；
+              'decimals' (list): 每列代币的 decimals，未知时为 None；
+              'balances' (list of lists): balances[i][j] 为钱包 i 持有代币 j 的最小单位整数，失败时为 None；
+              'errors' (list): (钱包, 代币, 错误信息) 元组列表。
+    """
+    errors = []
+    wallet_list = []
+    for wallet in dict.fromkeys(wallets):
+        if wallet and Web3.is_address(wallet):
+            wallet_list.append(Web3.to_checksum_address(wallet))
+        else:
+            errors.append((wallet, None, f"Invalid wallet address provided: {wallet}"))
+    token_list = []
+    for token in dict.fromkeys(tokens):
+        if token in (None, NATIVE_TOKEN):
+            token_list.append(NATIVE_TOKEN)
+        elif Web3.is_address(token):
+            token_list.append(Web3.to_checksum_address(token))
+        else:
+            errors.append((None, token, f"Invalid token address provided: {token}"))
+
+    decimals_map = get_token_decimals(token_list, rpc_url, request_timeout, multicall_address) if token_list else {}
+    balances = [[None] * len(token_list) for _ in wallet_list]
+
+    calls = []
+    for i, wallet in enumerate(wallet_list):
+        word = _address_word(wallet)
+        for j, token in enumerate(token_list):
+            if token == NATIVE_TOKEN:
+                calls.append((i, j, multicall_address, _SELECTOR_GET_ETH_BALANCE + word))
+            else:
+                calls.append((i, j, token, _SELECTOR_BALANCE_OF + word))
+
+    def run_chunk(chunk):
+        try:
+            returned = _multicall_aggregate3(rpc_url, [(target, data) for _, _, target, data in chunk], gas_limit,
+                                             request_timeout, block, multicall_address)
+        except Exception as e:
+            return [(i, j, None, f"Multicall failed: {e}") for i, j, _, _ in chunk]
+        out = []
+        for (i, j, _, _), (success, data) in zip(chunk, returned):
+            if success and len(data) >= 32:
+                out.append((i, j, int.from_bytes(data[:32], 'big'), None))
+            else:
+                out.append((i, j, None, "balance call reverted or returned no data"))
+        return out
+
+    start = time.perf_counter()
+    chunks = _chunk_calls(calls, gas_limit, gas_per_call)
+    if chunks:
+        with ThreadPoolExecutor(max_workers=max(1, min(int(max_concurrency), len(chunks))),
+                                thread_name_prefix='evm-multicall') as executor:
+            for chunk_result in executor.map(run_chunk, chunks):
+                for i, j, value, error in chunk_result:
+                    balances[i][j] = value
+                    if error:
+                        errors.append((wallet_list[i], token_list[j], error))
+    print(f"Fetched {len(calls)} token balances in {len(chunks)} multicall(s) "
+          f"({len(errors)} errors) in {time.perf_counter() - start:.2f}s")
+    return {
+        'wallets': wallet_list,
+        'tokens': token_list,
+        'decimals': [decimals_map.get(token) for token in token_list],
+        'balances': balances,
+        'errors': errors,
+    }
+
+
+def iter_token_holdings(balance_table, min_raw_balance=1):
+    """
+    遍历 get_token_balances 返回的余额表中余额不小于 min_raw_balance 的条目。
+
+    Yields:
+        tuple: (wallet, token, raw_balance, formatted_balance)。formatted_balance 为按 decimals 换算后的字符串，
+               decimals 未知时为 None。
+    """
+    tokens, decimals = balance_table['tokens'], balance_table['decimals']
+    for wallet, row in zip(balance_table['wallets'], balance_table['balances']):
+        for j, raw in enumerate(row):
+            if raw is not None and raw >= min_raw_balance:
+                formatted = None
+                if decimals[j] is not None:
+                    formatted = format(decimal.Decimal(raw).scaleb(-decimals[j]), 'f')
+                yield wallet, tokens[j], raw, formatted
+
+
+# --- EVM 交易批量发送 ---
+# 节点拒绝 nonce 时常见的错误信息片段 (不同客户端措辞不同)；
+# 'replacement transaction underpriced' 表示交易池中已有同 nonce 的交易，也按 nonce 冲突处理
+_NONCE_ERROR_MARKERS = ('nonce too low', 'nonce is too low', 'invalid nonce', 'replacement transaction underpriced',
+                        'nonce too high')
+# 费用低于节点要求时的错误信息片段，换 nonce 重试不会成功
+_FEE_ERROR_MARKERS = ('transaction underpriced', 'max fee per gas less than block base fee',
+                      'fee cap less than block base fee', 'gas price too low')
+_ALREADY_KNOWN_MARKERS = ('already known', 'already imported', 'known transaction')
+
+
+class NonceManager:
+    """
+    本地的按地址 nonce 分配器。
+
+    每个地址第一次使用时从节点读取 pending nonce，之后在本地递增分配，不再为每笔交易查询节点；
+    节点拒绝 nonce 或发送失败时调用 resync() 重新同步。线程安全。
+
+    Args:
+        rpc_url (str, list or RpcRouter): EVM 兼容网络的 RPC URL。
+        request_timeout (int, optional): 查询 nonce 的超时时间（秒）。
+    """
+
+    def __init__(self, rpc_url=DEFAULT_EVM_RPC_TARGET, request_timeout=DEFAULT_EVM_REQUEST_TIMEOUT_SECONDS):
+        self.rpc_url = rpc_url
+        self.request_timeout = request_timeout
+        self._lock = threading.Lock()
+        self._address_locks = {}
+        self._next = {}
+
+    def _address_lock(self, address):
+        with self._lock:
+            return self._address_locks.setdefault(address, threading.Lock())
+
+    def _fetch(self, address):
+        return int(_rpc_call(self.rpc_url, 'eth_getTransactionCount', [address, 'pending'], self.request_timeout), 16)
+
+    def next_nonce(self, address):
+        """分配该地址的下一个 nonce。"""
+        address = Web3.to_checksum_address(address)
+        with self._address_lock(address):
+            if address not in self._next:
+                self._next[address] = self._fetch(address)
+            nonce = self._next[address]
+            self._next[address] = nonce + 1
+            return nonce
+
+    def resync(self, address):
+        """从节点重新读取该地址的 pending nonce，返回新的下一个 nonce。"""
+        address = Web3.to_checksum_address(address)
+        with self._address_lock(address):
+            self._next[address] = self._fetch(address)
+            return self._next[address]
+
+
+def _send_one_transaction(index, tx_request, nonce_manager, rpc_url, chain_id, gas_price, request_timeout,
+                          nonce_retries):
+    acct = Account.from_key(tx_request['private_key'])
+    result = {'index': index, 'from': acct.address, 'nonce': None, 'tx_hash': None, 'status': 'error',
+              'receipt': None, 'error': None}
+    tx = {
+        'to': Web3.to_checksum_address(tx_request['to']),
+        'value': int(tx_request.get('value', 0)),
+        'data': tx_request.get('data', '0x'),
+        'chainId': chain_id,
+    }
+    fee_fields = ('gasPrice', 'maxFeePerGas', 'maxPriorityFeePerGas')
+    if any(field in tx_request for field in fee_fields):
+        tx.update({field: int(tx_request[field]) for field in fee_fields if field in tx_request})
+    else:
+        tx['gasPrice'] = gas_price
+    try:
+        if 'gas' in tx_request:
+            tx['gas'] = int(tx_request['gas'])
+        else:
+            estimate_params = {'from': acct.address, 'to': tx['to'], 'value': hex(tx['value']), 'data': tx['data']}
+            try:
+                tx['gas'] = int(_rpc_call(rpc_url, 'eth_estimateGas', [estimate_params], request_timeout), 16)
+            except RuntimeError as e:
+                raise ContractLogicError(f"Gas estimation failed (transaction would revert): {e}")
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+        return result
+
+    for attempt in range(nonce_retries + 1):
+        try:
+            tx['nonce'] = nonce_manager.next_nonce(acct.address)
+        except Exception as e:
+            result['error'] = f"Could not get nonce for {acct.address}: {e}"
+            return result
+        result['nonce'] = tx['nonce']
+        signed = Account.sign_transaction(tx, tx_request['private_key'])
+        raw = getattr(signed, 'raw_transaction', None) or signed.rawTransaction
+        tx_hash = Web3.to_hex(Web3.keccak(raw))
+        try:
+            _rpc_call(rpc_url, 'eth_sendRawTransaction', [Web3.to_hex(raw)], request_timeout)
+        except RuntimeError as e:
+            message = str(e).lower()
+            if any(marker in message for marker in _ALREADY_KNOWN_MARKERS):
+                pass  # 同一笔交易已在交易池中
+            elif any(marker in message for marker in _NONCE_ERROR_MARKERS):
+                # 先于费用判断：'replacement transaction underpriced' 同时包含 'transaction underpriced'
+                nonce_manager.resync(acct.address)
+                if attempt < nonce_retries:
+                    print(f"Nonce {tx['nonce']} rejected for {acct.address} ({e}); resyncing and retrying.")
+                    continue
+                result['status'] = 'nonce_error'
+                result['error'] = f"Nonce conflict after {nonce_retries} retries: {e}"
+                return result
+            elif any(marker in message for marker in _FEE_ERROR_MARKERS):
+                # 交易未被接收，nonce 需要归还
+                nonce_manager.resync(acct.address)
+                result['status'] = 'fee_error'
+                result['error'] = f"Fee too low: {e}"
+                return result
+            else:
+                nonce_manager.resync(acct.address)
+                result['error'] = f"Send failed: {e}"
+                return result
+        except Exception as e:
+            # 网络错误时无法确定交易是否已被接收，重新同步以免留下 nonce 空洞
+            try:
+                nonce_manager.resync(acct.address)
+            except Exception:
+                pass
+            result['error'] = f"Send failed: {e}"
+            return result
+        result['tx_hash'] = tx_hash
+        result['status'] = 'sent'
+        return result
+    return result
+
+
+def poll_transaction_receipts(tx_hashes, rpc_url=DEFAULT_EVM_RPC_TARGET, timeout=DEFAULT_RECEIPT_TIMEOUT_SECONDS,
+                              poll_interval=DEFAULT_RECEIPT_POLL_INTERVAL_SECONDS, batch_size=DEFAULT_EVM_BATCH_SIZE,
+                              request_timeout=DEFAULT_EVM_REQUEST_TIMEOUT_SECONDS):
+    """
+    以 JSON-RPC 批量请求轮询一组交易的回执，每轮只查询仍未上链的交易。
+
+    Args:
+        tx_hashes (iterable): 交易哈希。
+        timeout (float): 最长等待时间（秒）。
+        poll_interval (float): 两轮轮询之间的间隔（秒）。
+        batch_size (int): 每个批量请求包含的交易数。
+
+    Returns:
+        dict: tx_hash -> 回执字典；超时仍未上链的交易不在结果中。
+    """
+    pending = list(dict.fromkeys(h for h in tx_hashes if h))
+    receipts = {}
+    deadline = time.monotonic() + timeout
+    while pending:
+        for i in range(0, len(pending), batch_size):
+            chunk = pending[i:i + batch_size]
+            payload = [{'jsonrpc': '2.0', 'id': j, 'method': 'eth_getTransactionReceipt', 'params': [h]}
+                       for j, h in enumerate(chunk)]
+            try:
+                data = _send_json_rpc(rpc_url, payload, request_timeout)
+            except Exception as e:
+                print(f"Error polling transaction receipts: {e}")
+                continue
+            if not isinstance(data, list):
+                continue
+            for item in data:
+                if isinstance(item, dict) and item.get('result'):
+                    receipts[chunk[item['id']]] = item['result']
+        pending = [h for h in pending if h not in receipts]
+        if not pending or time.monotonic() + poll_interval > deadline:
+            break
+        time.sleep(poll_interval)
+    return receipts
+
+
+def send_transactions(tx_requests, rpc_url=DEFAULT_EVM_RPC_TARGET, chain_id=None, gas_price=None,
+                      max_workers=DEFAULT_TX_MAX_WORKERS, wait_for_receipts=True,
+                      receipt_timeout=DEFAULT_RECEIPT_TIMEOUT_SECONDS, poll_interval=DEFAULT_RECEIPT_POLL_INTERVAL_SECONDS,
+                      request_timeout=DEFAULT_EVM_REQUEST_TIMEOUT_SECONDS, nonce_retries=DEFAULT_TX_NONCE_RETRIES,
+                      nonce_manager=None):
+    """
+    并发签名并发送多个钱包的交易，然后批量轮询回执。
+
+    同一钱包的交易在同一个工作线程内按顺序发送 (nonce 由本地 NonceManager 分配，不逐笔查询节点)，
+    不同钱包之间并发；节点拒绝 nonce 时重新同步并重试。所有交易发出后统一以 JSON-RPC 批量请求轮询回执。
+
+    Args:
+        tx_requests (list): 交易请求字典列表，每个包含 'private_key', 'to'，可选 'value' (wei), 'data', 'gas',
+                            以及 'gasPrice' 或 'maxFeePerGas'/'maxPriorityFeePerGas'。
+        rpc_url (str, list or RpcRouter): EVM 兼容网络的 RPC URL。
+        chain_id (int, optional): 链 ID，默认通过 eth_chainId 查询 (经由 get_chain_cache 在进程内缓存)。
+        gas_price (int, optional): 未指定费用字段的交易使用的 gasPrice (wei)，默认通过 eth_gasPrice 查询一次 (同一区块内复用缓存)。
+        max_workers (int): 同时发送交易的钱包数。
+        wait_for_receipts (bool): 是否等待回执。
+        receipt_timeout (float): 等待回执的最长时间（秒）。
+        poll_interval (float): 回执轮询间隔（秒）。
+        request_timeout (int, optional): 单个 RPC 请求的超时时间（秒）。
+        nonce_retries (int): nonce 被拒绝时的最大重试次数。
+        nonce_manager (NonceManager, optional): 复用已有的 nonce 管理器 (跨多次调用保持本地 nonce)。
+
+    Returns:
+        list: 与 tx_requests 顺序一致的结果字典，包含 'index', 'from', 'nonce', 'tx_hash', 'receipt', 'error' 和
+              'status' ('sent', 'confirmed', 'reverted', 'timeout', 'fee_error' (节点因费用过低拒绝交易)、
+              'nonce_error' (重试后仍有 nonce 冲突) 或 'error')。
+    """
+    tx_requests = list(tx_requests)
+    if not tx_requests:
+        return []
+    try:
+        chain_cache = get_chain_cache(rpc_url)
+        if chain_id is None:
+            chain_id = chain_cache.chain_id()
+        if gas_price is None:
+            gas_price = chain_cache.gas_price()
+    except Exception as e:
+        error = f"Could not prepare transactions: {e}"
+        print(error)
+        return [{'index': i, 'from': None, 'nonce': None, 'tx_hash': None, 'status': 'error', 'receipt': None,
+                 'error': error} for i in range(len(tx_requests))]
+    nonce_manager = nonce_manager if nonce_manager is not None else NonceManager(rpc_url, request_timeout)
+
+    by_sender = {}
+    for index, tx_request in enumerate(tx_requests):
+        try:
+            sender = Account.from_key(tx_request['private_key']).address
+        except Exception:
+            sender = None
+        by_sender.setdefault(sender, []).append(index)
+
+    results = [None] * len(tx_requests)
+
+    def send_for_sender(indices):
+        for index in indices:
+            try:
+                results[index] = _send_one_transaction(index, tx_requests[index], nonce_manager, rpc_url, chain_id,
+                                                       gas_price, request_timeout, nonce_retries)
+            except Exception as e:
+                results[index] = {'index': index, 'from': None, 'nonce': None, 'tx_hash': None, 'status': 'error',
+                                  'receipt': None, 'error': f"{type(e).__name__}: {e}"}
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(int(max_workers), len(by_sender))),
+                            thread_name_prefix='evm-tx') as executor:
+        list(executor.map(send_for_sender, by_sender.values()))
+    sent = [r for r in results if r['status'] == 'sent']
+    print(f"Sent {len(sent)}/{len(results)} transactions in {time.perf_counter() - start:.2f}s")
+
+    if wait_for_receipts and sent:
+        receipts = poll_transaction_receipts([r['tx_hash'] for r in sent], rpc_url, receipt_timeout, poll_interval,
+                                             request_timeout=request_timeout)
+        for r in sent:
+            receipt = receipts.get(r['tx_hash'])
+            if receipt is None:
+                r['status'] = 'timeout'
+                r['error'] = str(TimeExhausted(
+                    f"Transaction {r['tx_hash']} is not in the chain after {receipt_timeout} seconds"))
+            else:
+                r['receipt'] = receipt
+                r['status'] = 'confirmed' if int(receipt.get('status', '0x1'), 16) == 1 else 'reverted'
+        confirmed = sum(1 for r in sent if r['status'] == 'confirmed')
+        print(f"Confirmed {confirmed}/{len(sent)} transactions after {time.perf_counter() - start:.2f}s")
+    return results
+
+
 if __name__ == '__main__':
     print("HubStudio Automated Control Library - Now with externalized configuration!")
     print(f"Default Chrome Driver Path: {DEFAULT_CHROMEDRIVER_PATH}")
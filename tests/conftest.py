@@ -0,0 +1,77 @@
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+# 测试直接导入仓库根目录下的模块 (hub_selenium, google_sheets_helper)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeJsonRpcServer:
+    """
+    本地 JSON-RPC 替身 (进程内 HTTP 服务)，支持单个请求和批量请求。
+    methods 为 方法名 -> handler(params)，handler 抛出异常时返回 JSON-RPC 错误；
+    batch_hook(items) 可以改写批量响应 (例如删除或损坏某些条目)。requests 记录收到的每个请求体。
+    """
+
+    def __init__(self):
+        self.methods = {}
+        self.requests = []
+        self.batch_hook = None
+        self.lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                data = json.dumps(fake.handle(json.loads(self.rfile.read(length)))).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_address[1]}/'
+
+    def _answer(self, request):
+        handler = self.methods.get(request.get('method'))
+        response = {'jsonrpc': '2.0', 'id': request.get('id')}
+        if handler is None:
+            response['error'] = {'code': -32601, 'message': f"method not found: {request.get('method')}"}
+            return response
+        try:
+            response['result'] = handler(request.get('params') or [])
+        except Exception as e:
+            response['error'] = {'code': -32000, 'message': str(e)}
+        return response
+
+    def handle(self, body):
+        with self.lock:
+            self.requests.append(body)
+        if isinstance(body, list):
+            items = [self._answer(request) for request in body]
+            return self.batch_hook(items) if self.batch_hook is not None else items
+        return self._answer(body)
+
+    def methods_called(self):
+        called = []
+        for body in self.requests:
+            called.extend(r.get('method') for r in (body if isinstance(body, list) else [body]))
+        return called
+
+
+@pytest.fixture
+def json_rpc_server():
+    server = FakeJsonRpcServer()
+    thread = threading.Thread(target=server.server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.server.shutdown()
+    server.server.server_close()
@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+for _module in ('dotenv', 'requests', 'selenium', 'eth_abi', 'eth_account', 'web3'):
+    pytest.importorskip(_module)
+
+import hub_selenium as hs
+
+WALLETS = ['0x' + f'{i:02x}' * 20 for i in range(1, 6)]
+
+
+@pytest.fixture
+def balances(json_rpc_server):
+    """每个地址的余额等于其末字节 (wei)。"""
+    json_rpc_server.methods['eth_getBalance'] = lambda params: hex(int(params[0][-2:], 16))
+    return json_rpc_server
+
+
+def test_balances_are_packed_into_batches(balances):
+    results = hs.get_evm_balances(WALLETS, rpc_url=balances.url, batch_size=2, max_concurrency=2,
+                                  requests_per_second=None, request_timeout=5)
+
+    assert [len(body) for body in balances.requests if isinstance(body, list)] == [2, 2, 1]
+    assert set(results) == set(WALLETS)
+    for address in WALLETS:
+        assert results[address]['error'] is None
+        assert results[address]['balance_wei'] == int(address[-2:], 16)
+
+
+def test_malformed_batch_items_only_fail_their_address(balances):
+    def corrupt(items):
+        by_id = {item['id']: item for item in items}
+        by_id[1]['result'] = 'not-hex'
+        by_id[2] = {'jsonrpc': '2.0', 'id': 2, 'error': {'code': -32000, 'message': 'header not found'}}
+        del by_id[3]
+        return list(by_id.values()) + ['garbage']
+
+    balances.batch_hook = corrupt
+
+    results = hs.get_evm_balances(WALLETS[:4], rpc_url=balances.url, batch_size=4, requests_per_second=None,
+                                  request_timeout=5)
+
+    assert results[WALLETS[0]]['balance_wei'] == 1
+    assert results[WALLETS[1]]['error'].startswith('Malformed RPC response')
+    assert results[WALLETS[2]]['error'] == 'RPC error: header not found'
+    assert results[WALLETS[3]]['error'] == 'No response for this address in the batch'
+
+
+def test_non_batch_response_fails_the_whole_batch(balances):
+    balances.batch_hook = lambda items: {'jsonrpc': '2.0', 'id': None, 'error': {'message': 'batch not supported'}}
+
+    results = hs.get_evm_balances(WALLETS[:2], rpc_url=balances.url, requests_per_second=None, request_timeout=5)
+
+    assert all('rejected the batch request' in r['error'] for r in results.values())
+
+
+def test_stream_yields_invalid_addresses_first(balances):
+    async def collect():
+        return [item async for item in hs.stream_evm_balances(['bad', WALLETS[0]], rpc_url=balances.url,
+                                                              requests_per_second=None, request_timeout=5)]
+
+    streamed = asyncio.run(collect())
+
+    assert streamed[0][0] == 'bad' and streamed[0][1]['error'].startswith('Invalid wallet address')
+    assert streamed[1] == (WALLETS[0], {'balance_wei': 1, 'balance_eth': str(hs.Web3.from_wei(1, 'ether')),
+                                        'error': None})
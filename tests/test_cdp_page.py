@@ -0,0 +1,168 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+for _module in ('dotenv', 'requests', 'selenium', 'eth_abi', 'eth_account', 'web3', 'websockets'):
+    pytest.importorskip(_module)
+
+import websockets
+
+import hub_selenium as hs
+
+
+class FakeCdpBrowser:
+    """
+    假的 CDP websocket 端点。记录收到的每个命令 (method, params)；
+    Runtime.evaluate 的返回值由 evaluate(expression) 决定，抛出异常时以 exceptionDetails 返回。
+    'Test.disconnect' 会直接断开连接，'Test.fail' 返回 CDP 错误。
+    """
+
+    def __init__(self):
+        self.commands = []
+        self.evaluate = lambda expression: True
+
+    async def handler(self, connection):
+        async for raw in connection:
+            message = json.loads(raw)
+            method, params = message['method'], message.get('params', {})
+            self.commands.append((method, params))
+            reply = {'id': message['id'], 'result': {}}
+            if method == 'Test.disconnect':
+                await connection.close()
+                return
+            if method == 'Test.fail':
+                reply = {'id': message['id'], 'error': {'code': -32000, 'message': 'no such method'}}
+            elif method == 'Page.navigate':
+                if params['url'] == 'http://bad.invalid/':
+                    reply['result'] = {'errorText': 'net::ERR_NAME_NOT_RESOLVED'}
+                else:
+                    reply['result'] = {'frameId': 'f1'}
+            elif method == 'Runtime.evaluate':
+                try:
+                    reply['result'] = {'result': {'value': self.evaluate(params['expression'])}}
+                except Exception as e:
+                    reply['result'] = {'exceptionDetails': {'exception': {'description': str(e)}}}
+            await connection.send(json.dumps(reply))
+            if method == 'Page.navigate' and 'frameId' in reply['result']:
+                await connection.send(json.dumps({'method': 'Page.loadEventFired', 'params': {'timestamp': 1}}))
+
+    def methods(self):
+        return [method for method, _ in self.commands]
+
+
+def run_with_page(test, command_timeout=5):
+    """启动假浏览器，通过 CdpPage.connect 连接后执行 test(page, browser)。"""
+    browser = FakeCdpBrowser()
+
+    async def main():
+        async with websockets.serve(browser.handler, '127.0.0.1', 0) as server:
+            port = server.sockets[0].getsockname()[1]
+            targets = [
+                {'type': 'service_worker', 'webSocketDebuggerUrl': 'ws://ignored'},
+                {'type': 'page', 'webSocketDebuggerUrl': f'ws://127.0.0.1:{port}/devtools/page/1'},
+            ]
+            original = hs._fetch_cdp_targets
+            hs._fetch_cdp_targets = lambda host, debugging_port, timeout: targets
+            try:
+                page = await hs.CdpPage.connect(port, command_timeout=command_timeout)
+            finally:
+                hs._fetch_cdp_targets = original
+            try:
+                return await test(page, browser)
+            finally:
+                await page.close()
+
+    return asyncio.run(main()), browser
+
+
+def test_open_url_enables_page_once_and_waits_for_load():
+    async def test(page, browser):
+        return [await page.open_url('http://a.example/', wait_time=2),
+                await page.open_url('http://b.example/', wait_time=2),
+                await page.open_url('http://bad.invalid/', wait_time=2)]
+
+    results, browser = run_with_page(test)
+
+    assert results == [True, True, False]
+    assert browser.methods() == ['Page.enable', 'Page.navigate', 'Page.navigate', 'Page.navigate']
+
+
+def test_fill_input_field_inserts_text_as_trusted_input():
+    async def test(page, browser):
+        return await page.fill_input_field('//input[@id="email"]', 'a@b.c', timeout=1)
+
+    ok, browser = run_with_page(test)
+
+    assert ok is True
+    assert ('Input.insertText', {'text': 'a@b.c'}) in browser.commands
+    assert browser.methods()[-1] == 'Runtime.evaluate'  # change 事件
+
+
+def test_click_element_dispatches_mouse_events_at_element_center():
+    async def test(page, browser):
+        browser.evaluate = lambda expression: {'x': 10, 'y': 20} if 'getBoundingClientRect' in expression else True
+        return await page.click_element('//button', timeout=1)
+
+    ok, browser = run_with_page(test)
+
+    assert ok is True
+    mouse = [params for method, params in browser.commands if method == 'Input.dispatchMouseEvent']
+    assert [p['type'] for p in mouse] == ['mouseMoved', 'mousePressed', 'mouseReleased']
+    assert all((p['x'], p['y']) == (10, 20) for p in mouse)
+
+
+def test_select_dropdown_returns_option_text_or_none_on_script_error():
+    def evaluate(expression):
+        if 'selectedIndex' not in expression:
+            return True
+        if 'const i = 9;' in expression:
+            raise ValueError('选项索引越界')
+        return 'Option 2'
+
+    async def test(page, browser):
+        browser.evaluate = evaluate
+        return [await page.select_dropdown_option_by_index('//select', 2, timeout=1),
+                await page.select_dropdown_option_by_index('//select', 9, timeout=1)]
+
+    results, _ = run_with_page(test)
+
+    assert results == ['Option 2', None]
+
+
+def test_missing_element_fails_without_sending_input():
+    async def test(page, browser):
+        browser.evaluate = lambda expression: False
+        return await page.fill_input_field('//input', 'x', timeout=1)
+
+    ok, browser = run_with_page(test)
+
+    assert ok is False
+    assert 'Input.insertText' not in browser.methods()
+
+
+def test_command_errors_raise_cdp_error():
+    async def test(page, browser):
+        with pytest.raises(hs.CdpError, match='no such method'):
+            await page.send('Test.fail')
+        return await page.send('Page.enable')
+
+    result, _ = run_with_page(test)
+
+    assert result == {}
+
+
+def test_pending_commands_fail_fast_when_connection_drops():
+    async def test(page, browser):
+        start = time.monotonic()
+        with pytest.raises(hs.CdpError, match='CDP 连接已断开'):
+            await page.send('Test.disconnect')
+        elapsed = time.monotonic() - start
+        with pytest.raises(hs.CdpError, match='CDP 连接已断开'):
+            await page.send('Page.enable')
+        return elapsed
+
+    elapsed, _ = run_with_page(test, command_timeout=10)
+
+    assert elapsed < 5
@@ -0,0 +1,51 @@
+import pytest
+
+for _module in ('dotenv', 'requests', 'selenium', 'eth_abi', 'eth_account', 'web3'):
+    pytest.importorskip(_module)
+
+import hub_selenium as hs
+
+WALLET = '0x' + '22' * 20
+
+
+@pytest.fixture
+def fake_node(monkeypatch):
+    """替换 HTTP 发送: head 为当前区块号，calls 记录 (method, timeout)。"""
+    node = type('Node', (), {'head': 100, 'calls': []})()
+
+    def post(url, payload, timeout):
+        node.calls.append((payload['method'], timeout))
+        result = hex(node.head) if payload['method'] == 'eth_blockNumber' else hex(7)
+        return {'jsonrpc': '2.0', 'id': payload['id'], 'result': result}
+
+    monkeypatch.setattr(hs, '_post_json_rpc', post)
+    return node
+
+
+def test_cached_balance_uses_request_timeout(fake_node):
+    cache = hs.ChainDataCache('http://node.invalid/', request_timeout=30, head_ttl=0)
+
+    assert cache.get_balance(WALLET, request_timeout=4) == 7
+
+    assert fake_node.calls == [('eth_blockNumber', 4), ('eth_getBalance', 4)]
+
+
+def test_get_evm_balance_passes_request_timeout_to_cache(fake_node, monkeypatch):
+    monkeypatch.setattr(hs, '_chain_caches', {})
+
+    result = hs.get_evm_balance(WALLET, rpc_url='http://node.invalid/', request_timeout=3, use_cache=True)
+
+    assert result['balance_wei'] == 7
+    assert {timeout for _, timeout in fake_node.calls} == {3}
+
+
+def test_latest_balance_is_cached_until_new_block(fake_node):
+    cache = hs.ChainDataCache('http://node.invalid/', head_ttl=0)
+
+    cache.get_balance(WALLET)
+    cache.get_balance(WALLET)
+    fake_node.head = 101
+    cache.get_balance(WALLET)
+
+    assert [method for method, _ in fake_node.calls].count('eth_getBalance') == 2
+    assert cache.stats()['new_blocks'] == 1
@@ -0,0 +1,89 @@
+import pytest
+
+for _module in ('dotenv', 'requests', 'selenium', 'eth_abi', 'eth_account', 'web3'):
+    pytest.importorskip(_module)
+
+import hub_selenium as hs
+
+
+class FakeClient:
+    """
+    假的 HubStudio 客户端。statuses 为每次 /browser/all-browser-status 调用依次返回的 {容器: 状态码}
+    (用完后重复最后一项；不在字典中的容器视为未运行)，stop_codes 为每个容器依次返回的 /browser/stop code。
+    """
+
+    def __init__(self, statuses, stop_codes=None):
+        self.statuses = list(statuses)
+        self.stop_codes = {cid: list(codes) for cid, codes in (stop_codes or {}).items()}
+        self.stop_calls = []
+        self.status_calls = []
+
+    def stop_browser(self, container_id):
+        self.stop_calls.append(container_id)
+        codes = self.stop_codes.get(container_id, [0])
+        code = codes.pop(0) if len(codes) > 1 else codes[0]
+        return {'code': code, 'msg': 'stop failed'}
+
+    def browser_status(self, container_ids):
+        self.status_calls.append(list(container_ids))
+        current = self.statuses.pop(0) if len(self.statuses) > 1 else self.statuses[0]
+        return {'code': 0, 'data': {'containers': [
+            {'containerCode': cid, 'status': status} for cid, status in current.items() if cid in container_ids
+        ]}}
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(hs.time, 'sleep', lambda seconds: None)
+
+
+def test_closing_status_is_polled_without_resending_stop():
+    client = FakeClient([{'a': hs.BROWSER_STATUS_CLOSING}, {'a': hs.BROWSER_STATUS_CLOSING}, {}])
+    result = hs._stop_container(client, 'a', 3, 0.1, 1, True, status_timeout=60)
+    assert result['ok'] is True
+    assert result['attempts'] == 1
+    assert client.stop_calls == ['a']
+    assert len(client.status_calls) == 3
+
+
+def test_stop_ok_but_never_closed_fails_without_resending():
+    client = FakeClient([{'a': hs.BROWSER_STATUS_CLOSING}])
+    result = hs._stop_container(client, 'a', 3, 0.1, 1, True, status_timeout=0)
+    assert result['ok'] is False
+    assert result['error']
+    assert client.stop_calls == ['a']
+
+
+def test_failed_stop_on_closed_container_counts_as_closed():
+    client = FakeClient([{}], stop_codes={'a': [1]})
+    result = hs._stop_container(client, 'a', 3, 0.1, 1, True, status_timeout=60)
+    assert result['ok'] is True
+    assert client.stop_calls == ['a']
+
+
+def test_failed_stop_on_open_container_is_retried():
+    client = FakeClient([{'a': hs.BROWSER_STATUS_OPEN}, {}], stop_codes={'a': [1, 0]})
+    result = hs._stop_container(client, 'a', 3, 0.1, 1, True, status_timeout=60)
+    assert result['ok'] is True
+    assert result['attempts'] == 2
+    assert client.stop_calls == ['a', 'a']
+
+
+def test_close_containers_batches_status_queries():
+    client = FakeClient([
+        {'a': hs.BROWSER_STATUS_CLOSING, 'b': hs.BROWSER_STATUS_CLOSING},
+        {'a': hs.BROWSER_STATUS_CLOSING},
+        {},
+    ])
+    results = hs.close_containers(['a', 'b', 'c'], client=client, max_workers=3, status_timeout=60)
+    assert all(r['ok'] for r in results.values())
+    assert sorted(client.stop_calls) == ['a', 'b', 'c']
+    # 每一轮只有一次批量查询，只包含仍未关闭的容器
+    assert client.status_calls == [['a', 'b', 'c'], ['a', 'b'], ['a']]
+
+
+def test_without_verification_stop_result_is_trusted():
+    client = FakeClient([{'a': hs.BROWSER_STATUS_OPEN}])
+    results = hs.close_containers(['a'], client=client, verify_status=False)
+    assert results['a']['ok'] is True
+    assert client.status_calls == []
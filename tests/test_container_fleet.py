@@ -0,0 +1,166 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+for _module in ('dotenv', 'requests', 'selenium', 'eth_abi', 'eth_account', 'web3'):
+    pytest.importorskip(_module)
+
+import hub_selenium as hs
+
+
+class FakeHubStudio:
+    """本地的模拟 HubStudio 服务: 记录运行中的容器，failing_start 中的容器启动失败。"""
+
+    def __init__(self):
+        self.running = {}
+        self.failing_start = set()
+        self.calls = []
+        self.lock = threading.Lock()
+        self._next_port = 9300
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, body):
+                data = json.dumps(body).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                code = parse_qs(url.query).get('containerCode', [''])[0]
+                self._reply(fake.handle(url.path, {'containerCode': code}))
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length) or b'{}')
+                self._reply(fake.handle(urlparse(self.path).path, body))
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}/api/v1'
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def handle(self, path, body):
+        endpoint = path[len('/api/v1'):]
+        with self.lock:
+            self.calls.append(endpoint)
+            if endpoint == '/browser/start':
+                code = body['containerCode']
+                if code in self.failing_start:
+                    return {'code': -1, 'msg': 'start failed'}
+                self._next_port += 1
+                self.running[code] = self._next_port
+                return {'code': 0, 'data': {'debuggingPort': self._next_port}}
+            if endpoint == '/browser/stop':
+                self.running.pop(body['containerCode'], None)
+                return {'code': 0}
+            if endpoint == '/browser/all-browser-status':
+                containers = [{'containerCode': c, 'status': hs.BROWSER_STATUS_OPEN, 'debuggingPort': port}
+                              for c, port in self.running.items() if c in body['containerCodes']]
+                return {'code': 0, 'data': {'containers': containers}}
+        return {'code': -1, 'msg': 'unknown endpoint'}
+
+
+class FakeDriver:
+    def __init__(self, port):
+        self.port = port
+        self.quit_calls = 0
+
+    def quit(self):
+        self.quit_calls += 1
+
+
+@pytest.fixture
+def hubstudio(monkeypatch):
+    fake = FakeHubStudio()
+    fake.thread.start()
+    drivers = []
+
+    def attach(debugging_port, *args):
+        driver = FakeDriver(debugging_port)
+        drivers.append(driver)
+        return driver
+
+    monkeypatch.setattr(hs, '_attach_driver', attach)
+    monkeypatch.setattr(hs, '_attachments', {})
+    client = hs.HubStudioClient(base_url=fake.base_url)
+    fake.client = client
+    fake.drivers = drivers
+    yield fake
+    client.close()
+    fake.server.shutdown()
+    fake.server.server_close()
+
+
+def test_fleet_opens_runs_and_closes_every_container(hubstudio):
+    fleet = hs.ContainerFleet(max_workers=3, client=hubstudio.client)
+    ids = [f'c{i}' for i in range(6)]
+
+    records = fleet.run(ids, lambda driver, cid: driver.port)
+
+    assert [r['container_id'] for r in records] == ids
+    assert all(r['ok'] and r['closed'] for r in records)
+    assert hubstudio.running == {}
+    assert all(d.quit_calls == 1 for d in hubstudio.drivers)
+    stats = fleet.stats()
+    assert stats['total'] == 6 and stats['succeeded'] == 6
+    assert stats['containers_per_minute'] > 0
+    assert all(r['total_seconds'] >= r['open_seconds'] for r in records)
+
+
+def test_fleet_cleans_up_when_task_fails(hubstudio):
+    def task(driver, cid):
+        if cid == 'boom':
+            raise ValueError('task failed')
+        return cid != 'false'
+
+    fleet = hs.ContainerFleet(max_workers=2, client=hubstudio.client)
+    records = {r['container_id']: r for r in fleet.run(['ok', 'boom', 'false'], task)}
+
+    assert records['ok']['ok']
+    assert not records['boom']['ok'] and 'task failed' in records['boom']['error']
+    assert not records['false']['ok'] and records['false']['error']
+    assert all(r['closed'] for r in records.values())
+    assert hubstudio.running == {}
+    assert fleet.stats()['failed'] == 2
+
+
+def test_fleet_reports_start_failure_and_still_closes(hubstudio):
+    hubstudio.failing_start.add('bad')
+    fleet = hs.ContainerFleet(max_workers=2, client=hubstudio.client)
+    calls = []
+
+    records = {r['container_id']: r for r in fleet.run(['good', 'bad'], lambda d, cid: calls.append(cid))}
+
+    assert calls == ['good']
+    assert records['bad']['error'] == "打开容器失败"
+    assert records['bad']['task_seconds'] is None
+    assert hubstudio.calls.count('/browser/stop') == 2
+
+
+def test_fleet_respects_concurrency_limit(hubstudio):
+    active = []
+    peak = []
+    lock = threading.Lock()
+    gate = threading.Event()
+
+    def task(driver, cid):
+        with lock:
+            active.append(cid)
+            peak.append(len(active))
+        gate.wait(0.05)
+        with lock:
+            active.remove(cid)
+
+    fleet = hs.ContainerFleet(max_workers=2, client=hubstudio.client)
+    fleet.run([f'c{i}' for i in range(6)], task)
+
+    assert max(peak) <= 2
@@ -0,0 +1,48 @@
+import pytest
+
+for _module in ('dotenv', 'requests', 'selenium', 'eth_abi', 'eth_account', 'web3'):
+    pytest.importorskip(_module)
+
+import hub_selenium as hs
+
+
+def _write(path, text, encoding):
+    path.write_bytes(text.encode(encoding))
+    return str(path)
+
+
+def test_detects_utf8(tmp_path):
+    path = _write(tmp_path / 'a.txt', 'email\tname\n' + 'a@x.com\t张三\n' * 10, 'utf-8')
+    assert hs.detect_file_encoding(path) == 'utf-8'
+
+
+def test_detects_utf8_bom(tmp_path):
+    path = tmp_path / 'a.txt'
+    path.write_bytes(b'\xef\xbb\xbfemail\n')
+    assert hs.detect_file_encoding(str(path)) == 'utf-8-sig'
+
+
+def test_gbk_after_long_ascii_prefix_is_not_utf8(tmp_path):
+    # 非 ASCII 字符出现在第一个采样块之后
+    text = 'email\tname\n' + 'user@example.com\tname\n' * 100 + 'last@example.com\t张三\n'
+    path = _write(tmp_path / 'a.txt', text, 'gbk')
+    assert hs.detect_file_encoding(path, sample_size=256) == hs.FALLBACK_ENCODING
+
+
+def test_multibyte_char_split_across_chunks_is_utf8(tmp_path):
+    path = _write(tmp_path / 'a.txt', 'a' * 255 + '张三', 'utf-8')
+    assert hs.detect_file_encoding(path, sample_size=256) == 'utf-8'
+
+
+def test_accounts_read_fully_with_detected_encoding(tmp_path):
+    text = 'email\tname\n' + 'user@example.com\tname\n' * 5000 + 'last@example.com\t张三\n'
+    path = _write(tmp_path / 'a.txt', text, 'gbk')
+    rows = hs.get_accounts_from_file(path, expected_fields=['email', 'name'])
+    assert len(rows) == 5001
+    assert rows[-1] == {'email': 'last@example.com', 'name': '张三'}
+
+
+def test_wrong_encoding_returns_no_partial_rows(tmp_path):
+    text = 'email\tname\n' + 'user@example.com\tname\n' * 5000 + 'last@example.com\t张三\n'
+    path = _write(tmp_path / 'a.txt', text, 'gbk')
+    assert hs.get_accounts_from_file(path, expected_fields=['email', 'name'], encoding='utf-8') == []
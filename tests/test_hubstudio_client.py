@@ -0,0 +1,122 @@
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+for _module in ('dotenv', 'requests', 'selenium', 'eth_abi', 'eth_account', 'web3'):
+    pytest.importorskip(_module)
+
+import requests
+
+import hub_selenium as hs
+
+NO_BACKOFF = {endpoint: {'backoff_factor': 0} for endpoint in hs._DEFAULT_ENDPOINT_POLICIES}
+
+
+class FlakyHubStudio:
+    """本地 HTTP 服务: 每个端点先依次按 plan 中的动作应答 ('503' 或 'slow')，之后返回 code 0。"""
+
+    def __init__(self):
+        self.plan = {}
+        self.hits = {}
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _handle(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                self.rfile.read(length)
+                endpoint = self.path.split('?')[0][len('/api/v1'):]
+                fake.hits[endpoint] = fake.hits.get(endpoint, 0) + 1
+                steps = fake.plan.get(endpoint, [])
+                action = steps.pop(0) if steps else 'ok'
+                if action == 'slow':
+                    time.sleep(0.5)
+                status = 503 if action == '503' else 200
+                body = json.dumps({'code': 0 if status == 200 else -1}).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = _handle
+            do_POST = _handle
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.base_url = f'http://127.0.0.1:{self.server.server_address[1]}/api/v1'
+
+
+@pytest.fixture
+def hubstudio():
+    fake = FlakyHubStudio()
+    threading.Thread(target=fake.server.serve_forever, daemon=True).start()
+    yield fake
+    fake.server.shutdown()
+    fake.server.server_close()
+
+
+def _client(base_url, policies=None):
+    overrides = {endpoint: dict(policy) for endpoint, policy in NO_BACKOFF.items()}
+    for endpoint, policy in (policies or {}).items():
+        overrides[endpoint].update(policy)
+    return hs.HubStudioClient(base_url=base_url, endpoint_policies=overrides)
+
+
+def test_all_endpoints_share_one_connection_pool(hubstudio):
+    client = _client(hubstudio.base_url)
+
+    assert [prefix for prefix in client.session.adapters if prefix.startswith(hubstudio.base_url)] == [
+        hubstudio.base_url]
+
+
+def test_gateway_errors_are_retried_for_idempotent_endpoints(hubstudio):
+    hubstudio.plan['/env/list'] = ['503', '503']
+    client = _client(hubstudio.base_url)
+
+    assert client.list_envs() == {'code': 0}
+    assert hubstudio.hits['/env/list'] == 3
+
+
+def test_browser_start_is_not_retried_on_gateway_errors(hubstudio):
+    hubstudio.plan['/browser/start'] = ['503']
+    client = _client(hubstudio.base_url)
+
+    assert client.start_browser('c1') == {'code': -1}
+    assert hubstudio.hits['/browser/start'] == 1
+
+
+def test_browser_start_is_not_retried_after_read_timeout(hubstudio):
+    hubstudio.plan['/browser/start'] = ['slow']
+    client = _client(hubstudio.base_url, {'/browser/start': {'read_timeout_seconds': 0.1}})
+
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        client.start_browser('c1')
+    assert hubstudio.hits['/browser/start'] == 1
+
+
+def test_read_timeouts_are_retried_when_policy_allows(hubstudio):
+    hubstudio.plan['/browser/stop'] = ['slow']
+    client = _client(hubstudio.base_url, {'/browser/stop': {'read_timeout_seconds': 0.2}})
+
+    assert client.stop_browser('c1') == {'code': 0}
+    assert hubstudio.hits['/browser/stop'] == 2
+
+
+def test_connection_failures_are_retried_even_for_browser_start(monkeypatch):
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]  # 端口关闭后连接会被拒绝
+    client = _client(f'http://127.0.0.1:{port}/api/v1')
+    attempts = []
+    original = client.session.request
+    monkeypatch.setattr(client.session, 'request', lambda *a, **k: attempts.append(1) or original(*a, **k))
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.start_browser('c1')
+    assert len(attempts) == 1 + hs._DEFAULT_ENDPOINT_POLICIES['/browser/start']['retries']
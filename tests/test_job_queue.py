@@ -0,0 +1,76 @@
+import pytest
+
+for _module in ('dotenv', 'requests', 'selenium', 'eth_abi', 'eth_account', 'web3'):
+    pytest.importorskip(_module)
+
+import hub_selenium as hs
+
+
+@pytest.fixture
+def queue(tmp_path):
+    q = hs.AccountJobQueue(str(tmp_path / 'jobs.sqlite3'), max_attempts=2, retry_delay=0)
+    yield q
+    q.close()
+
+
+def test_add_jobs_ignores_existing_keys(queue):
+    accounts = [{'email': 'a@x.com'}, {'email': 'b@x.com'}]
+    assert queue.add_jobs(accounts, key_field='email') == 2
+    assert queue.add_jobs(accounts, key_field='email') == 0
+    assert queue.counts()['pending'] == 2
+
+
+def test_claim_in_order_and_finish(queue):
+    queue.add_jobs([{'email': 'a@x.com'}, {'email': 'b@x.com'}], key_field='email')
+    job = queue.claim(container_id='c1')
+    assert job['job_key'] == 'a@x.com'
+    assert job['attempts'] == 1
+    assert queue.counts()['running'] == 1
+    assert queue.finish(job['job_key'], True, result={'ok': 1}, container_id='c1', seconds=1.5) == hs.JOB_DONE
+    record = queue.jobs(hs.JOB_DONE)[0]
+    assert record['result'] == {'ok': 1}
+    assert record['container_id'] == 'c1'
+
+
+def test_failed_job_is_retried_then_marked_failed(queue):
+    queue.add_jobs([{'email': 'a@x.com'}], key_field='email')
+    job = queue.claim(container_id='c1')
+    assert queue.finish(job['job_key'], False, error='boom') == hs.JOB_PENDING
+    job = queue.claim(container_id='c1')
+    assert job['attempts'] == 2
+    assert queue.finish(job['job_key'], False, error='boom') == hs.JOB_FAILED
+    assert queue.claim(container_id='c1') is None
+    assert queue.retry_failed() == 1
+    assert queue.claim(container_id='c1')['attempts'] == 1
+
+
+def test_retry_delay_blocks_immediate_reclaim(tmp_path):
+    q = hs.AccountJobQueue(str(tmp_path / 'jobs.sqlite3'), max_attempts=3, retry_delay=60)
+    q.add_jobs([{'email': 'a@x.com'}], key_field='email')
+    job = q.claim(container_id='c1')
+    q.finish(job['job_key'], False, error='boom')
+    assert q.claim(container_id='c1') is None
+    assert 0 < q.next_ready_in(container_id='c1') <= 60
+    q.close()
+
+
+def test_recover_resets_running_jobs(tmp_path):
+    path = str(tmp_path / 'jobs.sqlite3')
+    q = hs.AccountJobQueue(path)
+    q.add_jobs([{'email': 'a@x.com'}], key_field='email')
+    q.claim(container_id='c1')
+    q.close()
+    # 模拟进程中断后重新打开
+    q = hs.AccountJobQueue(path)
+    assert q.recover() == 1
+    assert q.claim(container_id='c1')['job_key'] == 'a@x.com'
+    q.close()
+
+
+def test_assigned_claims_skip_busy_containers(queue):
+    queue.add_jobs([{'email': 'a@x.com', 'c': 'c1'}, {'email': 'b@x.com', 'c': 'c2'}],
+                   key_field='email', container_field='c')
+    assert queue.claim(busy_containers=['c1'])['job_key'] == 'b@x.com'
+    assert queue.claim(container_id='c3') is None
+    assert queue.count_outside(['c3']) == 1
+    assert queue.count_unassigned() == 0
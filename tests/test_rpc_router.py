@@ -0,0 +1,75 @@
+import pytest
+
+for _module in ('dotenv', 'requests', 'selenium', 'eth_abi', 'eth_account', 'web3'):
+    pytest.importorskip(_module)
+
+import hub_selenium as hs
+
+
+@pytest.fixture
+def fake_post(monkeypatch):
+    """用进程内的假端点替换 HTTP 发送: failing 中的 URL 抛出异常，calls 记录 (url, timeout)。"""
+    calls = []
+    failing = set()
+
+    def post(url, payload, timeout):
+        calls.append((url, timeout))
+        if url in failing:
+            raise RuntimeError(f'{url} down')
+        return {'jsonrpc': '2.0', 'id': 1, 'result': url}
+
+    monkeypatch.setattr(hs, '_post_json_rpc', post)
+    post.calls = calls
+    post.failing = failing
+    return post
+
+
+def _router(urls, **kwargs):
+    kwargs.setdefault('hedge', False)
+    return hs.RpcRouter(urls, **kwargs)
+
+
+def test_untried_endpoints_are_probed_first():
+    router = _router(['fast', 'new'])
+    router._record('fast', 0.1, True)
+    assert router.ranked_urls() == ['new', 'fast']
+
+
+def test_failure_only_endpoint_ranks_after_healthy_ones():
+    router = _router(['bad', 'slow'])
+    router._record('bad', 0.01, False)
+    router._record('slow', 0.5, True)
+    assert router.ranked_urls() == ['slow', 'bad']
+
+
+def test_error_rate_is_part_of_the_score():
+    router = _router(['flaky', 'steady'], error_rate_threshold=1.0)
+    for ok in (True, False, False):
+        router._record('flaky', 0.1, ok)
+    router._record('steady', 0.25, True)
+    # flaky: 0.1 / (1/3) = 0.3 > steady: 0.25
+    assert router.ranked_urls() == ['steady', 'flaky']
+
+
+def test_cooldown_endpoint_ranks_last():
+    router = _router(['a', 'b'], error_rate_threshold=0.5, cooldown_seconds=60)
+    for _ in range(5):
+        router._record('a', 0.01, False)
+    router._record('b', 1.0, True)
+    assert router.ranked_urls() == ['b', 'a']
+    assert router.stats()['a']['healthy'] is False
+
+
+def test_request_fails_over_and_records_outcomes(fake_post):
+    router = _router(['a', 'b'])
+    fake_post.failing.add('a')
+    assert router.call('eth_chainId', []) == 'b'
+    assert [url for url, _ in fake_post.calls] == ['a', 'b']
+    assert router.ranked_urls() == ['b', 'a']
+
+
+def test_send_json_rpc_passes_timeout_to_router(fake_post):
+    router = _router(['a'], request_timeout=30)
+    hs._send_json_rpc(router, {'jsonrpc': '2.0', 'id': 1, 'method': 'eth_chainId', 'params': []}, 3)
+    router.request({'jsonrpc': '2.0', 'id': 1, 'method': 'eth_chainId', 'params': []})
+    assert fake_post.calls == [('a', 3), ('a', 30)]
@@ -0,0 +1,150 @@
+import threading
+
+import pytest
+
+pytest.importorskip('dotenv')
+
+import google_sheets_helper as gsh
+
+
+class FakeHttpError(Exception):
+    """与 googleapiclient HttpError 一样通过 resp.status 携带 HTTP 状态码。"""
+
+    def __init__(self, status):
+        super().__init__(f'HTTP {status}')
+        self.resp = type('Resp', (), {'status': status})()
+
+
+class _Call:
+    def __init__(self, func):
+        self._func = func
+
+    def execute(self):
+        return self._func()
+
+
+class FakeSheets:
+    """进程内的 Sheets API 假对象: 只实现 values().append，failures 为依次抛出的状态码 (用完后成功)。"""
+
+    def __init__(self, failures=()):
+        self.failures = list(failures)
+        self.appends = []
+        self.attempts = 0
+        self.lock = threading.Lock()
+        self.appended = threading.Event()
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def append(self, spreadsheetId, range, valueInputOption, insertDataOption, body):
+        def execute():
+            with self.lock:
+                self.attempts += 1
+                if self.failures:
+                    raise FakeHttpError(self.failures.pop(0))
+                self.appends.append((spreadsheetId, range, body['values']))
+            self.appended.set()
+            return {'updates': {'updatedRows': len(body['values'])}}
+        return _Call(execute)
+
+
+def _buffer(service, **kwargs):
+    kwargs.setdefault('max_rows', 100)
+    kwargs.setdefault('max_delay', 60)
+    kwargs.setdefault('backoff_base', 0.01)
+    kwargs.setdefault('backoff_max', 0.02)
+    return gsh.SheetAppendBuffer(service, **kwargs)
+
+
+def test_rows_from_many_workers_are_coalesced_into_one_append():
+    service = FakeSheets()
+    with _buffer(service, max_rows=6) as buffer:
+        workers = [threading.Thread(target=buffer.add_row, args=('sid', 'S', [i, None])) for i in range(6)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        assert service.appended.wait(2)
+
+    assert len(service.appends) == 1
+    sid, range_, rows = service.appends[0]
+    assert (sid, range_) == ('sid', 'S!A1')
+    assert sorted(row[0] for row in rows) == list(range(6))
+    assert all(row[1] == "" for row in rows)
+    assert buffer.stats()['flushes'] == 1
+
+
+def test_queue_is_flushed_after_max_delay():
+    service = FakeSheets()
+    buffer = _buffer(service, max_delay=0.05)
+    try:
+        buffer.add('sid', 'S', [['a']])
+        assert buffer.queue_depth() in (0, 1)
+        assert service.appended.wait(2)
+        assert buffer.queue_depth() == 0
+    finally:
+        buffer.close()
+
+
+def test_retryable_error_keeps_rows_in_order():
+    service = FakeSheets(failures=[429])
+    buffer = _buffer(service)
+    buffer.add('sid', 'S', [['a'], ['b']])
+
+    assert buffer.flush() is False
+    buffer.add('sid', 'S', [['c']])
+    assert buffer.flush() is True
+    buffer.close()
+
+    assert [rows for _, _, rows in service.appends] == [[['a'], ['b'], ['c']]]
+    stats = buffer.stats()
+    assert stats['failed_flushes'] == 1 and stats['dropped_rows'] == 0
+
+
+def test_non_retryable_error_drops_rows():
+    service = FakeSheets(failures=[400])
+    dropped = []
+    buffer = _buffer(service, on_drop=lambda sid, sheet, rows, error: dropped.append((sheet, rows, str(error))))
+    buffer.add('sid', 'S', [['a']])
+
+    assert buffer.flush() is False
+    buffer.close()
+
+    assert dropped == [('S', [['a']], 'HTTP 400')]
+    assert service.attempts == 1
+    assert buffer.stats()['dropped_rows'] == 1
+    assert buffer.queue_depth() == 0
+
+
+def test_rows_are_dropped_after_max_attempts():
+    service = FakeSheets(failures=[503, 503, 503])
+    dropped = []
+    buffer = _buffer(service, max_attempts=2, on_drop=lambda *args: dropped.append(args[2]))
+    buffer.add('sid', 'S', [['a']])
+
+    assert buffer.flush() is False
+    assert buffer.queue_depth() == 1
+    assert buffer.flush() is False
+    buffer.close()
+
+    assert dropped == [[['a']]]
+    assert service.attempts == 2
+    assert service.appends == []
+
+
+def test_close_flushes_remaining_rows_and_rejects_new_ones():
+    service = FakeSheets()
+    buffer = _buffer(service)
+    buffer.add('sid', 'S1', [['a']])
+    buffer.add('sid', 'S2', [['b'], ['c']])
+
+    buffer.close()
+    buffer.close()
+
+    assert sorted((range_, rows) for _, range_, rows in service.appends) == [
+        ('S1!A1', [['a']]), ('S2!A1', [['b'], ['c']])]
+    assert buffer.add('sid', 'S1', [['d']]) is False
+    assert buffer.stats()['flushed_rows'] == 3
@@ -0,0 +1,75 @@
+import pytest
+
+pytest.importorskip('dotenv')
+
+import google_sheets_helper as gsh
+
+
+class _Call:
+    def __init__(self, func):
+        self._func = func
+
+    def execute(self):
+        return self._func()
+
+
+class FakeSheets:
+    """只实现 diff 写入用到的 spreadsheets().values().get / batchUpdate。"""
+
+    def __init__(self, current):
+        self.current = current
+        self.batch_updates = []
+
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return self
+
+    def get(self, spreadsheetId, range, valueRenderOption=None):
+        assert valueRenderOption == 'FORMULA'
+        return _Call(lambda: {'values': self.current})
+
+    def batchUpdate(self, spreadsheetId, body):
+        self.batch_updates.append(body)
+        return _Call(lambda: {'spreadsheetId': spreadsheetId})
+
+
+def test_only_changed_runs_are_sent_in_one_request():
+    service = FakeSheets([['h1', 'h2', 'h3'], ['a', 'b', 'c'], ['d', 'e', 'f']])
+    result = gsh.write_sheet_data([['h1', 'h2', 'h3'], ['a', 'X', 'Y'], ['d', 'e', 'f']], 'sid', 'Sheet1!A1',
+                                  service_obj=service, diff=True)
+    assert len(service.batch_updates) == 1
+    body = service.batch_updates[0]
+    assert body['valueInputOption'] == 'USER_ENTERED'
+    assert body['data'] == [{'range': 'Sheet1!B2:C2', 'values': [['X', 'Y']]}]
+    assert result['updatedCells'] == 2
+    assert result['clearedCells'] == 0
+
+
+def test_values_are_left_to_value_input_option():
+    service = FakeSheets([['old', 'old', 'old', 'old']])
+    gsh.write_sheet_data([['=SUM(A2:A9)', '50%', 'TRUE', '2024-01-01']], 'sid', 'Sheet1!A1',
+                         service_obj=service, diff=True, value_input_option='RAW')
+    body = service.batch_updates[0]
+    assert body['valueInputOption'] == 'RAW'
+    assert body['data'][0]['values'] == [['=SUM(A2:A9)', '50%', 'TRUE', '2024-01-01']]
+
+
+def test_shorter_rows_and_trailing_rows_are_cleared():
+    service = FakeSheets([['a', 'b', 'c'], ['d', 'e'], ['f']])
+    result = gsh.write_sheet_data([['a', 'b']], 'sid', "My Sheet!B3", service_obj=service,
+                                  diff=True, current_data=[['a', 'b', 'c'], ['d', 'e'], ['f']])
+    data = service.batch_updates[0]['data']
+    assert data == [
+        {'range': "'My Sheet'!D3:D3", 'values': [['']]},
+        {'range': "'My Sheet'!B4:C5", 'values': [['', ''], ['', '']]},
+    ]
+    assert result['clearedCells'] == 4
+
+
+def test_no_changes_sends_nothing():
+    service = FakeSheets([['a', 1.0], ['b', None]])
+    result = gsh.write_sheet_data([['a', 1], ['b', '']], 'sid', 'Sheet1!A1', service_obj=service, diff=True)
+    assert service.batch_updates == []
+    assert result['updatedCells'] == 0
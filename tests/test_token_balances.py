@@ -0,0 +1,100 @@
+import pytest
+
+for _module in ('dotenv', 'requests', 'selenium', 'eth_abi', 'eth_account', 'web3'):
+    pytest.importorskip(_module)
+
+from eth_abi import decode, encode
+
+import hub_selenium as hs
+
+WALLET_A = hs.Web3.to_checksum_address('0x' + 'aa' * 20)
+WALLET_B = hs.Web3.to_checksum_address('0x' + 'bb' * 20)
+USDC = hs.Web3.to_checksum_address('0x' + '01' * 20)
+WETH = hs.Web3.to_checksum_address('0x' + '02' * 20)
+NOT_A_TOKEN = hs.Web3.to_checksum_address('0x' + '03' * 20)
+
+
+class FakeChain:
+    """在 JSON-RPC 替身上按 ABI 模拟 Multicall3.aggregate3/getEthBalance 和 ERC-20 的 balanceOf/decimals。"""
+
+    def __init__(self, server):
+        self.native = {WALLET_A: 5 * 10 ** 18, WALLET_B: 0}
+        self.tokens = {USDC: (6, {WALLET_A: 1_500_000, WALLET_B: 0}), WETH: (18, {WALLET_B: 10 ** 17})}
+        self.aggregate_sizes = []
+        server.methods['eth_call'] = self.eth_call
+
+    def _sub_call(self, target, data):
+        selector, args = data[:4], data[4:]
+        if hs.Web3.to_checksum_address(target) == hs.MULTICALL3_ADDRESS and selector == hs._SELECTOR_GET_ETH_BALANCE:
+            wallet = hs.Web3.to_checksum_address(decode(['address'], args)[0])
+            return True, encode(['uint256'], [self.native.get(wallet, 0)])
+        token = self.tokens.get(hs.Web3.to_checksum_address(target))
+        if token is None:
+            return False, b''
+        if selector == hs._SELECTOR_DECIMALS:
+            return True, encode(['uint8'], [token[0]])
+        if selector == hs._SELECTOR_BALANCE_OF:
+            wallet = hs.Web3.to_checksum_address(decode(['address'], args)[0])
+            return True, encode(['uint256'], [token[1].get(wallet, 0)])
+        return False, b''
+
+    def eth_call(self, params):
+        call = params[0]
+        data = bytes.fromhex(call['data'][2:])
+        assert hs.Web3.to_checksum_address(call['to']) == hs.MULTICALL3_ADDRESS
+        assert data[:4] == hs._SELECTOR_AGGREGATE3
+        sub_calls = decode(['(address,bool,bytes)[]'], data[4:])[0]
+        self.aggregate_sizes.append(len(sub_calls))
+        results = [self._sub_call(target, payload) for target, _, payload in sub_calls]
+        return '0x' + encode(['(bool,bytes)[]'], [results]).hex()
+
+
+@pytest.fixture
+def chain(json_rpc_server):
+    fake = FakeChain(json_rpc_server)
+    fake.url = json_rpc_server.url
+    return fake
+
+
+def test_balances_are_returned_as_compact_table(chain):
+    table = hs.get_token_balances([WALLET_A, WALLET_B], [hs.NATIVE_TOKEN, USDC, WETH], rpc_url=chain.url,
+                                  request_timeout=5)
+
+    assert table['wallets'] == [WALLET_A, WALLET_B]
+    assert table['tokens'] == [hs.NATIVE_TOKEN, USDC, WETH]
+    assert table['decimals'] == [18, 6, 18]
+    assert table['balances'] == [[5 * 10 ** 18, 1_500_000, 0], [0, 0, 10 ** 17]]
+    assert table['errors'] == []
+    assert list(hs.iter_token_holdings(table)) == [
+        (WALLET_A, hs.NATIVE_TOKEN, 5 * 10 ** 18, '5.000000000000000000'),
+        (WALLET_A, USDC, 1_500_000, '1.500000'),
+        (WALLET_B, WETH, 10 ** 17, '0.100000000000000000'),
+    ]
+
+
+def test_calls_are_chunked_by_gas_limit(chain):
+    hs.get_token_balances([WALLET_A, WALLET_B], [hs.NATIVE_TOKEN, USDC, WETH], rpc_url=chain.url,
+                          request_timeout=5, gas_limit=120000, gas_per_call=40000, max_concurrency=1)
+
+    # 一次 decimals 查询 (两个代币)，六个余额调用按每批三个切分
+    assert chain.aggregate_sizes == [2, 3, 3]
+
+
+def test_token_decimals_are_cached(chain):
+    hs.get_token_balances([WALLET_A], [USDC], rpc_url=chain.url, request_timeout=5)
+    chain.aggregate_sizes.clear()
+
+    table = hs.get_token_balances([WALLET_B], [USDC], rpc_url=chain.url, request_timeout=5)
+
+    assert table['decimals'] == [6]
+    assert chain.aggregate_sizes == [1]
+
+
+def test_failing_token_only_affects_its_column(chain):
+    table = hs.get_token_balances([WALLET_A, 'bad-wallet'], [USDC, NOT_A_TOKEN], rpc_url=chain.url,
+                                  request_timeout=5)
+
+    assert table['balances'] == [[1_500_000, None]]
+    assert table['decimals'] == [6, None]
+    assert ('bad-wallet', None, 'Invalid wallet address provided: bad-wallet') in table['errors']
+    assert (WALLET_A, NOT_A_TOKEN, 'balance call reverted or returned no data') in table['errors']
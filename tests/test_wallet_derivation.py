@@ -0,0 +1,39 @@
+import pytest
+
+for _module in ('dotenv', 'requests', 'selenium', 'eth_abi', 'eth_account', 'web3'):
+    pytest.importorskip(_module)
+
+from eth_account import Account
+
+import hub_selenium as hs
+
+MNEMONIC = 'test test test test test test test test test test test junk'
+
+
+@pytest.mark.parametrize('path_template', [
+    hs.DEFAULT_HD_PATH_TEMPLATE,        # 共享父路径，最后一级为普通节点
+    "m/44'/60'/0'/{index}'",            # 共享父路径，最后一级为强化节点
+    "m/44'/60'/{index}'/0/0",           # {index} 不在最后一级，逐个派生完整路径
+])
+def test_derived_wallets_match_account_from_mnemonic(path_template):
+    Account.enable_unaudited_hdwallet_features()
+
+    wallets = hs._derive_wallet_chunk((MNEMONIC, 'secret', path_template, range(3, 8)))
+
+    assert [w['index'] for w in wallets] == [3, 4, 5, 6, 7]
+    for wallet in wallets:
+        expected = Account.from_mnemonic(MNEMONIC, passphrase='secret', account_path=wallet['path'])
+        assert wallet['path'] == path_template.format(index=wallet['index'])
+        assert wallet['address'] == expected.address
+        assert wallet['private_key'] == expected.key.hex()
+
+
+def test_generate_evm_wallets_streams_derived_wallets_in_order():
+    written = []
+
+    stats = hs.generate_evm_wallets(5, written.append, mnemonic=MNEMONIC, start_index=10, processes=1,
+                                    chunk_size=2)
+
+    assert stats['count'] == 5 and stats['mnemonic'] == MNEMONIC
+    assert [w['index'] for w in written] == list(range(10, 15))
+    assert written[0]['address'] == Account.from_mnemonic(MNEMONIC, account_path="m/44'/60'/0'/0/10").address
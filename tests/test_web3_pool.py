@@ -0,0 +1,50 @@
+import pytest
+
+for _module in ('dotenv', 'requests', 'selenium', 'eth_abi', 'eth_account', 'web3'):
+    pytest.importorskip(_module)
+
+import hub_selenium as hs
+
+WALLET = '0x' + '11' * 20
+
+
+def test_get_web3_reuses_instances_per_url_and_timeout(json_rpc_server):
+    first = hs.get_web3(json_rpc_server.url, 5)
+
+    assert hs.get_web3(json_rpc_server.url, 5) is first
+    assert hs.get_web3(json_rpc_server.url, 7) is not first
+    # 不同超时的实例共享同一个连接池
+    assert hs._get_rpc_session(json_rpc_server.url) is hs._get_rpc_session(json_rpc_server.url)
+
+
+def test_get_evm_balance_sends_only_get_balance(json_rpc_server):
+    json_rpc_server.methods['eth_getBalance'] = lambda params: hex(2 * 10 ** 18)
+
+    first = hs.get_evm_balance(WALLET, rpc_url=json_rpc_server.url, request_timeout=5, use_cache=False)
+    second = hs.get_evm_balance(WALLET, rpc_url=json_rpc_server.url, request_timeout=5, use_cache=False)
+
+    assert first == second == {'balance_wei': 2 * 10 ** 18, 'balance_eth': '2', 'error': None}
+    assert json_rpc_server.methods_called() == ['eth_getBalance', 'eth_getBalance']
+    stats = hs.get_rpc_endpoint_stats()[json_rpc_server.url]
+    assert stats['calls'] == 2 and stats['errors'] == 0
+    assert stats['avg_seconds'] is not None
+
+
+def test_get_evm_balance_reports_node_errors(json_rpc_server):
+    def fail(params):
+        raise ValueError('header not found')
+
+    json_rpc_server.methods['eth_getBalance'] = fail
+
+    result = hs.get_evm_balance(WALLET, rpc_url=json_rpc_server.url, request_timeout=5, use_cache=False)
+
+    assert result['balance_wei'] is None
+    assert 'header not found' in result['error']
+    assert hs.get_rpc_endpoint_stats()[json_rpc_server.url]['errors'] == 1
+
+
+def test_get_evm_balance_rejects_invalid_address_without_rpc(json_rpc_server):
+    result = hs.get_evm_balance('not-an-address', rpc_url=json_rpc_server.url, use_cache=False)
+
+    assert result['error'].startswith('Invalid wallet address')
+    assert json_rpc_server.requests == []